@@ -2,8 +2,10 @@ from .base_agents import (
     PDFProcessingAgent, WebSearchAgent, ResearchAgent,
     AnalysisAgent, WriterAgent, ManagerAgent
 )
+from .model_registry import ModelRegistry, model_registry
 
 __all__ = [
     'PDFProcessingAgent', 'WebSearchAgent', 'ResearchAgent',
-    'AnalysisAgent', 'WriterAgent', 'ManagerAgent'
+    'AnalysisAgent', 'WriterAgent', 'ManagerAgent',
+    'ModelRegistry', 'model_registry'
 ]
\ No newline at end of file
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import traceback
 from typing import List, Optional, Type
@@ -5,6 +6,9 @@ from typing import List, Optional, Type
 from crewai import Agent
 from crewai.tools import BaseTool
 
+from .model_registry import model_registry
+from database.extraction_cache import get_extraction_cache
+
 # Set custom storage location for CrewAI memory
 os.environ["CREWAI_STORAGE_DIR"] = "./storage"
 
@@ -21,10 +25,94 @@ class WebSearchTool(BaseTool):
         return response
 
 
+# Model used by the PDF processing tool
+PDF_MODEL_NAME = os.environ.get("PDF_MODEL_NAME", "Qwen/Qwen2.5-VL-7B")
+
+# Number of page prompts generated together in one model.generate call
+PDF_BATCH_SIZE = int(os.environ.get("PDF_BATCH_SIZE", "4"))
+
+
+# Prompt templates and generation limits for PDF analysis
+PAGE_PROMPT_TEMPLATE = "This is page {page_number} of a PDF document. Please extract and summarize the key information from this page.\n\nPage content: {text}"
+QUERY_PAGE_PROMPT_TEMPLATE = "This is page {page_number} of a PDF document. Please answer the following question based on this page: {query}\n\nPage content: {text}"
+SUMMARY_PROMPT_TEMPLATE = "Based on the PDF document, please provide a concise answer to: {query}"
+PDF_MAX_PAGES = 5
+PAGE_MAX_NEW_TOKENS = 500
+SUMMARY_MAX_NEW_TOKENS = 300
+
+# Changes whenever the templates or limits change, invalidating cached extractions
+PDF_PROMPT_VERSION = hashlib.sha256("\x1f".join([
+    PAGE_PROMPT_TEMPLATE, QUERY_PAGE_PROMPT_TEMPLATE, SUMMARY_PROMPT_TEMPLATE,
+    str(PDF_MAX_PAGES), str(PAGE_MAX_NEW_TOKENS), str(SUMMARY_MAX_NEW_TOKENS),
+]).encode("utf-8")).hexdigest()[:16]
+
+
+def purge_stale_extractions() -> int:
+    """Delete cached extractions of another model or prompt version, if either changed.
+    
+    Returns:
+        The number of deleted extractions
+    """
+    try:
+        deleted = get_extraction_cache().purge_if_changed(PDF_MODEL_NAME, PDF_PROMPT_VERSION)
+    except Exception as e:
+        print(f"Error purging stale extractions: {str(e)}")
+        return 0
+    if deleted:
+        print(f"Purged {deleted} cached extractions of another model or prompt version")
+    return deleted
+
+
+def build_page_prompt(page_number: int, text: str, query: Optional[str] = None) -> str:
+    """Build the prompt for analyzing one PDF page.
+    
+    Args:
+        page_number: The 1-based page number
+        text: The text extracted from the page
+        query: Optional query to focus the extraction on specific information
+        
+    Returns:
+        The prompt for the page
+    """
+    if query:
+        return QUERY_PAGE_PROMPT_TEMPLATE.format(page_number=page_number, query=query, text=text)
+    return PAGE_PROMPT_TEMPLATE.format(page_number=page_number, text=text)
+
+
+def generate_batch(tokenizer, model, prompts: List[str], max_new_tokens: int) -> List[str]:
+    """Generate responses for several prompts in a single generate call.
+    
+    Prompts are left-padded to a common length so every sequence continues
+    from its own last token. The tokenizer is shared, so it isn't modified
+    here; load_causal_lm sets its padding up when the model is loaded.
+    
+    Args:
+        tokenizer: The tokenizer for the model, with a pad token
+        model: The causal language model
+        prompts: The prompts to generate responses for
+        max_new_tokens: Maximum number of tokens to generate per prompt
+        
+    Returns:
+        The generated responses, in prompt order
+    """
+    inputs = tokenizer(prompts, return_tensors="pt", padding=True).to(model.device)
+    generated_ids = model.generate(
+        inputs.input_ids,
+        attention_mask=inputs.attention_mask,
+        max_new_tokens=max_new_tokens,
+        do_sample=True,
+        temperature=0.7,
+        pad_token_id=tokenizer.pad_token_id
+    )
+    prompt_length = inputs.input_ids.shape[1]
+    return [tokenizer.decode(ids[prompt_length:], skip_special_tokens=True) for ids in generated_ids]
+
+
 # Custom tool for PDF processing
 class PDFProcessingTool(BaseTool):
     name: str = "pdf_processor"
     description: str = "Extracts and analyzes text and visual content from PDF files"
+    batch_size: int = PDF_BATCH_SIZE
     
     def __init__(self):
         super().__init__()
@@ -59,7 +147,6 @@ class PDFProcessingTool(BaseTool):
             import PyPDF2
             from PIL import Image
             import io
-            from transformers import AutoModelForCausalLM, AutoTokenizer
             
             # Check if the PDF exists
             full_path = pdf_path
@@ -69,66 +156,60 @@ class PDFProcessingTool(BaseTool):
             if not os.path.exists(full_path):
                 return f"Error: PDF file not found at {full_path}"
             
+            header = f"Analysis of PDF: {os.path.basename(full_path)}\n\n"
+            
+            # Answer repeated documents from the content-addressed cache
+            cache = get_extraction_cache()
+            content_hash = cache.file_digest(full_path)
+            try:
+                cached = cache.get(content_hash, query, PDF_MODEL_NAME, PDF_PROMPT_VERSION)
+            except Exception as e:
+                print(f"Error reading extraction cache: {str(e)}")
+                cached = None
+            if cached is not None:
+                return header + cached
+            
             # Extract text from PDF
             with open(full_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
                 num_pages = len(reader.pages)
                 
                 # For simplicity, we'll process just the first few pages
-                max_pages = min(5, num_pages)  # Limit to first 5 pages for demo
+                max_pages = min(PDF_MAX_PAGES, num_pages)
                 
-                # Load the model and tokenizer
-                model_name = "Qwen/Qwen2.5-VL-7B"
-                tokenizer = AutoTokenizer.from_pretrained(model_name)
-                model = AutoModelForCausalLM.from_pretrained(
-                    model_name,
-                    device_map="auto",
-                    trust_remote_code=True
-                )
+                # Get the model and tokenizer (kept resident between calls)
+                tokenizer, model = model_registry.get(PDF_MODEL_NAME)
                 
-                # Process the PDF with the model
-                results = []
+                # Extract text and build a prompt for each page
+                prompts = [
+                    build_page_prompt(i + 1, reader.pages[i].extract_text(), query)
+                    for i in range(max_pages)
+                ]
                 
-                for i in range(max_pages):
-                    # Extract text from page
-                    page = reader.pages[i]
-                    text = page.extract_text()
-                    
-                    # Prepare prompt based on whether a query was provided
-                    if query:
-                        prompt = f"This is page {i+1} of a PDF document. Please answer the following question based on this page: {query}\n\nPage content: {text}"
-                    else:
-                        prompt = f"This is page {i+1} of a PDF document. Please extract and summarize the key information from this page.\n\nPage content: {text}"
-                    
-                    # Generate response
-                    inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-                    generated_ids = model.generate(
-                        inputs.input_ids,
-                        max_new_tokens=500,
-                        do_sample=True,
-                        temperature=0.7
-                    )
-                    response = tokenizer.decode(generated_ids[0][inputs.input_ids.shape[1]:])
-                    results.append(f"Page {i+1} analysis:\n{response}\n")
+                # Process the pages with the model, several pages per generate call
+                results = []
+                batch_size = max(1, self.batch_size)
+                for batch_start in range(0, len(prompts), batch_size):
+                    batch = prompts[batch_start:batch_start + batch_size]
+                    responses = generate_batch(tokenizer, model, batch, max_new_tokens=PAGE_MAX_NEW_TOKENS)
+                    for offset, response in enumerate(responses):
+                        results.append(f"Page {batch_start + offset + 1} analysis:\n{response}\n")
                 
                 # Combine results
-                combined_result = f"Analysis of PDF: {os.path.basename(full_path)}\n\n"
-                combined_result += "\n".join(results)
+                analysis = "\n".join(results)
                 
                 # Add a summary if there was a specific query
                 if query:
-                    summary_prompt = f"Based on the PDF document, please provide a concise answer to: {query}"
-                    inputs = tokenizer(summary_prompt, return_tensors="pt").to(model.device)
-                    generated_ids = model.generate(
-                        inputs.input_ids,
-                        max_new_tokens=300,
-                        do_sample=True,
-                        temperature=0.7
-                    )
-                    summary = tokenizer.decode(generated_ids[0][inputs.input_ids.shape[1]:])
-                    combined_result += f"\n\nSummary answer to query '{query}':\n{summary}"
-                
-                return combined_result
+                    summary_prompt = SUMMARY_PROMPT_TEMPLATE.format(query=query)
+                    summary = generate_batch(tokenizer, model, [summary_prompt], max_new_tokens=SUMMARY_MAX_NEW_TOKENS)[0]
+                    analysis += f"\n\nSummary answer to query '{query}':\n{summary}"
+            
+            try:
+                cache.put(content_hash, query, PDF_MODEL_NAME, PDF_PROMPT_VERSION, analysis)
+            except Exception as e:
+                print(f"Error writing extraction cache: {str(e)}")
+            
+            return header + analysis
                 
         except Exception as e:
             return f"Error processing PDF: {str(e)}\n{traceback.format_exc()}"
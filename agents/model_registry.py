@@ -0,0 +1,236 @@
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Default memory budget for resident models, in gigabytes
+DEFAULT_MEMORY_BUDGET_GB = float(os.environ.get("MODEL_MEMORY_BUDGET_GB", "16"))
+
+
+def load_causal_lm(model_name: str) -> Tuple[Any, Any]:
+    """Load a tokenizer/model pair with transformers.
+
+    The tokenizer is set up for batched generation here, once, because the
+    registry shares it between threads and tasks: prompts are left-padded,
+    with the end-of-sequence token as padding if the model has none.
+
+    Args:
+        model_name: The Hugging Face model name or local path
+
+    Returns:
+        A (tokenizer, model) tuple
+    """
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, padding_side="left")
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        device_map="auto",
+        trust_remote_code=True
+    )
+    return tokenizer, model
+
+
+def checkpoint_size(model_name: str) -> int:
+    """Estimate a model's memory use from its weight files, before loading it.
+
+    Args:
+        model_name: The Hugging Face model name or local path
+
+    Returns:
+        Total size of the weight files in bytes, or 0 if they aren't on disk
+    """
+    if not os.path.isdir(model_name):
+        return 0
+    return sum(
+        os.path.getsize(os.path.join(model_name, name))
+        for name in os.listdir(model_name)
+        if name.endswith((".safetensors", ".bin", ".pt", ".pth"))
+    )
+
+
+def model_memory_footprint(model: Any) -> int:
+    """Estimate the memory used by a model's parameters and buffers.
+
+    Args:
+        model: The loaded model
+
+    Returns:
+        Size in bytes
+    """
+    if hasattr(model, "get_memory_footprint"):
+        return int(model.get_memory_footprint())
+    size = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        size += tensor.numel() * tensor.element_size()
+    return size
+
+
+class ModelRegistry:
+    """Keeps loaded tokenizer/model pairs resident across calls and tasks.
+
+    Models are evicted least-recently-used first when loading another model
+    would exceed the memory budget. Eviction happens before the new model is
+    loaded, based on an estimate of its size (its size when it was last
+    loaded, its weight files, or the size of the last model loaded), so old
+    and new models are not resident at the same time. The most recently
+    requested model is always kept, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, memory_budget_gb: float = DEFAULT_MEMORY_BUDGET_GB,
+                 loader: Callable[[str], Tuple[Any, Any]] = load_causal_lm):
+        """Initialize the registry.
+
+        Args:
+            memory_budget_gb: Total memory resident models may use, in gigabytes
+            loader: Function that loads a (tokenizer, model) pair by name
+        """
+        self.memory_budget = int(memory_budget_gb * 1024 ** 3)
+        self.loader = loader
+        self._models: "OrderedDict[str, Tuple[Any, Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        # Measured size of every model loaded so far, kept after eviction
+        self._sizes: Dict[str, int] = {}
+        self._last_size = 0
+        # Estimated size of models being loaded, counted against the budget
+        self._reserved: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time_total = 0.0
+        self.last_load_time: Optional[float] = None
+
+    def get(self, model_name: str) -> Tuple[Any, Any]:
+        """Get a tokenizer/model pair, loading it if it isn't resident.
+
+        Args:
+            model_name: The model name to load
+
+        Returns:
+            A (tokenizer, model) tuple
+        """
+        with self._lock:
+            entry = self._models.get(model_name)
+            if entry is not None:
+                self._models.move_to_end(model_name)
+                self.hits += 1
+                return entry[0], entry[1]
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Load outside the registry lock so other models stay available;
+        # the per-model lock stops two callers loading the same model
+        with load_lock:
+            with self._lock:
+                entry = self._models.get(model_name)
+                if entry is not None:
+                    self._models.move_to_end(model_name)
+                    self.hits += 1
+                    return entry[0], entry[1]
+                self.misses += 1
+                # Make room before loading, so peak memory stays within the budget
+                estimate = self._estimate_size(model_name)
+                self._evict_for(estimate)
+                self._reserved[model_name] = estimate
+
+            try:
+                start = time.perf_counter()
+                tokenizer, model = self.loader(model_name)
+                elapsed = time.perf_counter() - start
+                size = model_memory_footprint(model)
+            finally:
+                with self._lock:
+                    self._reserved.pop(model_name, None)
+            print(f"Loaded model {model_name} in {elapsed:.1f}s ({size / 1024 ** 3:.2f} GB)")
+
+            with self._lock:
+                self.load_time_total += elapsed
+                self.last_load_time = elapsed
+                self._sizes[model_name] = size
+                self._last_size = size
+                # The estimate may have been low
+                self._evict_for(size)
+                self._models[model_name] = (tokenizer, model, size)
+            return tokenizer, model
+
+    def evict(self, model_name: str) -> bool:
+        """Drop a model from the registry.
+
+        Args:
+            model_name: The model to drop
+
+        Returns:
+            True if the model was resident, False otherwise
+        """
+        with self._lock:
+            if self._models.pop(model_name, None) is None:
+                return False
+            self.evictions += 1
+        self._release_memory()
+        return True
+
+    def clear(self) -> None:
+        """Drop all resident models."""
+        with self._lock:
+            self.evictions += len(self._models)
+            self._models.clear()
+        self._release_memory()
+
+    def memory_used(self) -> int:
+        """Get the memory used by resident models, in bytes."""
+        return sum(entry[2] for entry in self._models.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters and resident models.
+
+        Returns:
+            Dictionary with hit/miss/eviction counts, load times and memory usage
+        """
+        with self._lock:
+            return {
+                "resident": list(self._models),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "load_time_total_s": round(self.load_time_total, 3),
+                "last_load_time_s": round(self.last_load_time, 3) if self.last_load_time is not None else None,
+                "memory_used_bytes": self.memory_used(),
+                "memory_budget_bytes": self.memory_budget,
+            }
+
+    def _estimate_size(self, model_name: str) -> int:
+        """Estimate the memory a model will use once loaded. Caller holds the lock."""
+        if model_name in self._sizes:
+            return self._sizes[model_name]
+        return checkpoint_size(model_name) or self._last_size
+
+    def _evict_for(self, size: int) -> None:
+        """Evict least-recently-used models until ``size`` more bytes fit. Caller holds the lock."""
+        evicted = False
+        reserved = sum(self._reserved.values())
+        while self._models and self.memory_used() + reserved + size > self.memory_budget:
+            name, _ = self._models.popitem(last=False)
+            self.evictions += 1
+            evicted = True
+            print(f"Evicted model {name} to stay within the memory budget")
+        if evicted:
+            self._release_memory()
+
+    @staticmethod
+    def _release_memory() -> None:
+        """Return memory from evicted models to the allocator."""
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+
+# Shared registry used by the PDF processing tool
+model_registry = ModelRegistry()
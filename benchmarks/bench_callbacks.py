@@ -0,0 +1,154 @@
+"""Measure how many agent events per second the interaction callback can emit.
+
+Usage:
+    python benchmarks/bench_callbacks.py [--events 20000] [--threads 2]
+        [--window 100]
+
+Crew worker threads call AgentInteractionCallback.on_step in a tight loop
+while the event loop runs a WebSocket subscriber for each task. The
+benchmark reports the cost per event on the worker thread, the throughput
+until every event has been delivered, the number of WebSocket messages and
+the worst delay between a step and its delivery. It compares the
+EventDispatcher with and without step batching, and the previous
+implementation, which spun up a new event loop on the worker thread for
+every event.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+import warnings
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcaster import Broadcaster
+from callbacks import AgentInteractionCallback, EventDispatcher, STEP_BATCH_WINDOW_MS
+from interaction_log import InteractionLog
+
+
+class FakeAgent:
+    role = "Benchmark Agent"
+
+
+class FakeWebSocket:
+    """WebSocket stand-in that counts received steps and messages.
+
+    Each step carries the perf_counter value at which it was emitted, so the
+    delivery delay can be measured.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.messages = 0
+        self.max_delay = 0.0
+
+    async def send_json(self, message):
+        now = time.perf_counter()
+        self.messages += 1
+        steps = message["steps"] if message["type"] == "agent_step_batch" else [message]
+        for step in steps:
+            self.received += 1
+            self.max_delay = max(self.max_delay, now - float(step["step"]))
+
+    async def close(self):
+        pass
+
+
+class LegacyCallback(AgentInteractionCallback):
+    """The previous emit path: a new event loop per event on the worker thread."""
+
+    def __init__(self, task_id, broadcaster, agent_interactions):
+        super().__init__(task_id, None)
+        self.broadcaster = broadcaster
+        self.agent_interactions = agent_interactions
+
+    def _emit_sync(self, interaction):
+        self.agent_interactions[self.task_id].append(interaction)
+        try:
+            loop = asyncio.get_event_loop()
+            if loop.is_running():
+                loop.create_task(self._broadcast(interaction))
+            else:
+                loop.run_until_complete(self._broadcast(interaction))
+        except RuntimeError:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self._broadcast(interaction))
+            loop.close()
+
+    async def _broadcast(self, interaction):
+        self.broadcaster.publish(self.task_id, interaction.to_dict())
+
+
+async def run(args, legacy, window_ms):
+    broadcaster = Broadcaster(queue_size=args.events)
+    agent_interactions = {}
+    dispatcher = EventDispatcher(broadcaster, agent_interactions, step_batch_window_ms=window_ms)
+    broadcaster.start()
+    dispatcher.start()
+
+    sockets = []
+    callbacks = []
+    for i in range(args.threads):
+        task_id = f"task-{i}"
+        agent_interactions[task_id] = InteractionLog()
+        websocket = FakeWebSocket()
+        broadcaster.subscribe(task_id, websocket)
+        sockets.append(websocket)
+        if legacy:
+            callbacks.append(LegacyCallback(task_id, broadcaster, agent_interactions))
+        else:
+            callbacks.append(AgentInteractionCallback(task_id, dispatcher))
+
+    agent = FakeAgent()
+    emit_times = []
+
+    def worker(callback):
+        start = time.perf_counter()
+        for i in range(args.events):
+            callback.on_step(agent, time.perf_counter())
+        emit_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(callback,)) for callback in callbacks]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        await asyncio.sleep(0.001)
+    total = args.events * args.threads
+    while sum(ws.received for ws in sockets) < total:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+
+    for i, websocket in enumerate(sockets):
+        broadcaster.unsubscribe(f"task-{i}", websocket)
+    per_event_us = sum(emit_times) / total * 1e6
+    messages = sum(ws.messages for ws in sockets)
+    max_delay_ms = max(ws.max_delay for ws in sockets) * 1000
+    return per_event_us, total / elapsed, messages, max_delay_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent event callback benchmark")
+    parser.add_argument("--events", type=int, default=20000, help="Events emitted per worker thread")
+    parser.add_argument("--threads", type=int, default=2, help="Number of concurrent crew threads")
+    parser.add_argument("--window", type=float, default=STEP_BATCH_WINDOW_MS or 100,
+                        help="Step batching window in milliseconds")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only run the dispatcher")
+    args = parser.parse_args()
+    # The legacy path leaks coroutines when it hits a closed loop, as it did in production
+    warnings.filterwarnings("ignore", category=RuntimeWarning)
+
+    print(f"{args.threads} threads x {args.events} events")
+    print(f"{'mode':<12} {'us/event':>10} {'events/s':>12} {'messages':>10} {'max delay ms':>13}")
+    modes = [("unbatched", False, 0), (f"batch {args.window:g}ms", False, args.window)]
+    if not args.skip_legacy:
+        modes.append(("legacy", True, 0))
+    for name, legacy, window_ms in modes:
+        per_event_us, rate, messages, max_delay_ms = asyncio.run(run(args, legacy, window_ms))
+        print(f"{name:<12} {per_event_us:>10.1f} {rate:>12.0f} {messages:>10} {max_delay_ms:>13.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Measure per-task crew setup cost with and without the template registry.
+
+Usage:
+    python benchmarks/bench_crew_setup.py [--iterations 10] [--skip-check]
+
+"cold" builds a new CrewTemplateRegistry for every crew, which matches the
+old behaviour of creating LLM clients, agents and tools (and running the
+LiteLLM connectivity check) on every task. "warm" reuses one registry.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import crew_setup
+from crew_setup import CrewTemplateRegistry, create_crew
+
+
+def time_setups(iterations: int, fresh_registry: bool, check_interval: float) -> list:
+    """Time create_crew over several iterations.
+
+    Args:
+        iterations: Number of crews to create
+        fresh_registry: Build a new registry before every crew
+        check_interval: Connectivity check interval for the registries
+
+    Returns:
+        List of setup times in milliseconds
+    """
+    timings = []
+    crew_setup.crew_templates = CrewTemplateRegistry(check_interval=check_interval)
+    for i in range(iterations):
+        if fresh_registry:
+            crew_setup.crew_templates = CrewTemplateRegistry(check_interval=check_interval)
+        start = time.perf_counter()
+        create_crew(f"bench-{i}", "benchmark topic", [])
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crew setup benchmark")
+    parser.add_argument("--iterations", type=int, default=10, help="Crews to create per mode")
+    parser.add_argument("--skip-check", action="store_true", help="Skip the LiteLLM connectivity check")
+    args = parser.parse_args()
+
+    # A zero interval re-checks on every cold crew, like the old create_crew did
+    check_interval = -1 if args.skip_check else 0
+    cold = time_setups(args.iterations, True, check_interval)
+    warm = time_setups(args.iterations, False, -1 if args.skip_check else crew_setup.OLLAMA_CHECK_INTERVAL)
+
+    print("\nPer-task crew setup (ms)")
+    print(f"{'mode':<6} {'mean':>10} {'median':>10} {'max':>10}")
+    for name, timings in (("cold", cold), ("warm", warm[1:] or warm)):
+        print(f"{name:<6} {statistics.mean(timings):>10.1f} {statistics.median(timings):>10.1f} {max(timings):>10.1f}")
+    print(f"\nFirst warm crew (builds templates): {warm[0]:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Benchmark whole tasks end to end against the fake Ollama server.
+
+Usage:
+    python benchmarks/bench_end_to_end.py [--mode crew|app|both] [--tasks 10]
+        [--concurrency 2] [--latency-ms 200] [--tokens-per-second 50]
+        [--response-tokens 120] [--output results.json]
+        [--baseline previous.json] [--tolerance 0.2]
+
+Starts benchmarks/fake_ollama.py in-process and points OLLAMA_API_BASE (and
+the OpenAI base URL, used for crew memory embeddings) at it, so no GPU or
+network is needed. "crew" runs create_crew and run_crew directly from
+--concurrency threads; "app" starts the FastAPI app with uvicorn and drives
+it over HTTP (POST /submit-task, then polling GET /task/{task_id}).
+
+Reports tasks per minute, p50/p95/p99 end-to-end latency and a per-stage
+breakdown: crew setup, crew run and time spent in LLM calls in crew mode;
+queue wait, processing and LLM time in app mode. With --baseline, the run
+is compared with an earlier --output file and the exit status is 1 if
+throughput dropped or p95 latency grew by more than --tolerance.
+"""
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_ollama import FakeOllamaServer
+
+TOPIC = "benchmark topic"
+
+# Seconds to wait for the web app to start in app mode
+SERVER_START_TIMEOUT = 60.0
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of a list of values (q in 0-100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples: List[Dict[str, Any]], wall_seconds: float) -> Dict[str, Any]:
+    """Aggregate per-task samples into throughput, latency and stage statistics."""
+    completed = [sample for sample in samples if sample["ok"]]
+    latencies = [sample["latency"] for sample in completed]
+    stages: Dict[str, Dict[str, float]] = {}
+    for name in (completed[0]["stages"] if completed else {}):
+        values = [sample["stages"][name] for sample in completed]
+        stages[name] = {"mean": sum(values) / len(values), "p50": percentile(values, 50),
+                        "p95": percentile(values, 95)}
+    return {
+        "tasks": len(samples),
+        "errors": len(samples) - len(completed),
+        "wall_seconds": wall_seconds,
+        "tasks_per_minute": len(completed) / wall_seconds * 60 if wall_seconds > 0 else 0.0,
+        "latency": {f"p{q}": percentile(latencies, q) for q in (50, 95, 99)},
+        "stages": stages,
+    }
+
+
+def run_concurrently(run_task: Callable[[int], Dict[str, Any]], tasks: int,
+                     concurrency: int) -> Dict[str, Any]:
+    """Run tasks from a pool of threads and summarize them."""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(run_task, range(tasks)))
+    return summarize(samples, time.perf_counter() - start)
+
+
+def bench_crew(tasks: int, concurrency: int) -> Dict[str, Any]:
+    """Run crews in this process, timing setup, run and LLM calls."""
+    from crew_setup import create_crew, run_crew, warm_up_crew_templates
+    from token_usage import TokenUsageTracker
+
+    warm_up_crew_templates()
+
+    def run_task(i: int) -> Dict[str, Any]:
+        task_id = f"bench-crew-{i}"
+        start = time.perf_counter()
+        crew = create_crew(task_id, TOPIC, [])
+        setup_done = time.perf_counter()
+        with TokenUsageTracker() as usage:
+            result = run_crew(crew, task_id)
+        end = time.perf_counter()
+        return {
+            "ok": not result.startswith("Error running crew"),
+            "latency": end - start,
+            "stages": {"setup": setup_done - start, "run": end - setup_done,
+                       "llm": usage.summary()["total"]["llm_seconds"]},
+        }
+
+    return run_concurrently(run_task, tasks, concurrency)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def bench_app(tasks: int, concurrency: int, poll_interval: float) -> Dict[str, Any]:
+    """Drive the FastAPI app over HTTP, timing queue wait, processing and LLM calls."""
+    import requests
+    import uvicorn
+
+    # The app mounts its static files and templates relative to the repo root
+    os.chdir(ROOT)
+    from web_interface.web_main import app
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="bench-uvicorn", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("The web app failed to start; see the errors above")
+        if time.monotonic() > deadline:
+            server.should_exit = True
+            raise RuntimeError(f"The web app didn't start within {SERVER_START_TIMEOUT:g}s")
+        time.sleep(0.05)
+    base = f"http://127.0.0.1:{port}"
+
+    def run_task(i: int) -> Dict[str, Any]:
+        start = time.perf_counter()
+        response = requests.post(f"{base}/submit-task", data={"topic": f"{TOPIC} {i}"})
+        response.raise_for_status()
+        task_id = response.json()["task_id"]
+        dequeued = None
+        while True:
+            task = requests.get(f"{base}/task/{task_id}").json()
+            now = time.perf_counter()
+            if dequeued is None and task["status"] != "pending":
+                dequeued = now
+            if task["status"] in ("completed", "error"):
+                break
+            time.sleep(poll_interval)
+        usage = (task.get("token_usage") or {}).get("total") or {}
+        return {
+            "ok": task["status"] == "completed" and not str(task.get("result")).startswith("Error running crew"),
+            "latency": now - start,
+            "stages": {"queue": dequeued - start, "processing": now - dequeued,
+                       "llm": usage.get("llm_seconds", 0.0)},
+        }
+
+    try:
+        return run_concurrently(run_task, tasks, concurrency)
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """List the regressions of a run against a baseline run."""
+    regressions = []
+    for mode, current in results.items():
+        previous = baseline.get(mode)
+        if not previous:
+            continue
+        if current["tasks_per_minute"] < previous["tasks_per_minute"] * (1 - tolerance):
+            regressions.append(f"{mode}: {current['tasks_per_minute']:.2f} tasks/min, "
+                               f"baseline {previous['tasks_per_minute']:.2f}")
+        if current["latency"]["p95"] > previous["latency"]["p95"] * (1 + tolerance):
+            regressions.append(f"{mode}: p95 latency {current['latency']['p95']:.2f}s, "
+                               f"baseline {previous['latency']['p95']:.2f}s")
+    return regressions
+
+
+def print_results(mode: str, summary: Dict[str, Any]) -> None:
+    latency = summary["latency"]
+    print(f"\n{mode}: {summary['tasks']} tasks, {summary['errors']} errors in {summary['wall_seconds']:.1f}s "
+          f"({summary['tasks_per_minute']:.2f} tasks/min)")
+    print(f"  end to end   p50 {latency['p50']:8.2f}s  p95 {latency['p95']:8.2f}s  p99 {latency['p99']:8.2f}s")
+    for name, stage in summary["stages"].items():
+        print(f"  {name:<12} mean {stage['mean']:7.2f}s  p50 {stage['p50']:8.2f}s  p95 {stage['p95']:8.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark with a fake Ollama server")
+    parser.add_argument("--mode", choices=("crew", "app", "both"), default="both")
+    parser.add_argument("--tasks", type=int, default=10, help="Tasks to run per mode")
+    parser.add_argument("--concurrency", type=int, default=2, help="Tasks in flight at once")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Fake LLM delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Fake LLM generation speed")
+    parser.add_argument("--response-tokens", type=int, default=120, help="Tokens per fake completion")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="Seconds between task polls (app mode)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results written earlier by --output")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Show crew and server output")
+    args = parser.parse_args()
+
+    fake = FakeOllamaServer(latency_ms=args.latency_ms, tokens_per_second=args.tokens_per_second,
+                            response_tokens=args.response_tokens).start()
+    # Set before the app modules are imported; they read it at import time
+    os.environ["OLLAMA_API_BASE"] = fake.url
+    os.environ["OPENAI_API_BASE"] = os.environ["OPENAI_BASE_URL"] = f"{fake.url}/v1"
+    print(f"Fake Ollama at {fake.url}: {args.latency_ms:.0f} ms to first token, "
+          f"{args.tokens_per_second:.0f} tokens/s, {args.response_tokens} tokens per completion")
+
+    modes = ("crew", "app") if args.mode == "both" else (args.mode,)
+    results = {}
+    for mode in modes:
+        requests_before = fake.requests
+        with open(os.devnull, "w") as devnull:
+            quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+            with quiet:
+                if mode == "crew":
+                    results[mode] = bench_crew(args.tasks, args.concurrency)
+                else:
+                    results[mode] = bench_app(args.tasks, args.concurrency, args.poll_interval)
+        results[mode]["llm_requests_per_task"] = (fake.requests - requests_before) / max(1, args.tasks)
+        print_results(mode, results[mode])
+    fake.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), **results}, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against the baseline:")
+            for regression in regressions:
+                print(f"- {regression}")
+            sys.exit(1)
+        print("\nNo regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Measure WebSocket fan-out latency for many subscribers to one task.
+
+Usage:
+    python benchmarks/bench_fanout.py [--subscribers 1000] [--messages 50]
+        [--slow 10] [--slow-delay 0.2] [--dead 5]
+
+Subscribers are in-process fake WebSockets. Most of them send instantly, a
+few are slow (each send takes --slow-delay seconds) and a few are dead
+(each send hangs until the send timeout). The benchmark compares the old
+approach (awaiting send_json on each connection in turn) with the
+Broadcaster and reports how long healthy subscribers wait for each message.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcaster import Broadcaster
+
+
+class FakeWebSocket:
+    """WebSocket stand-in that records when each message arrives."""
+
+    def __init__(self, delay: float = 0.0, dead: bool = False):
+        self.delay = delay
+        self.dead = dead
+        self.latencies = []
+
+    async def send_json(self, message):
+        if self.dead:
+            await asyncio.sleep(3600)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.latencies.append(time.perf_counter() - message["sent_at"])
+
+    async def close(self):
+        pass
+
+
+def make_sockets(args):
+    healthy = [FakeWebSocket() for _ in range(args.subscribers - args.slow - args.dead)]
+    slow = [FakeWebSocket(delay=args.slow_delay) for _ in range(args.slow)]
+    dead = [FakeWebSocket(dead=True) for _ in range(args.dead)]
+    # Interleave so slow and dead sockets aren't all at the end of the set
+    sockets = healthy + slow + dead
+    sockets.sort(key=id)
+    return healthy, sockets
+
+
+async def run_sequential(args):
+    healthy, sockets = make_sockets(args)
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        message = {"type": "agent_step", "sent_at": time.perf_counter()}
+        for websocket in sockets:
+            try:
+                await asyncio.wait_for(websocket.send_json(message), timeout=args.send_timeout)
+            except Exception:
+                pass
+    return healthy, time.perf_counter() - start
+
+
+async def run_broadcaster(args):
+    healthy, sockets = make_sockets(args)
+    broadcaster = Broadcaster(send_timeout=args.send_timeout)
+    for websocket in sockets:
+        broadcaster.subscribe("bench", websocket)
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        broadcaster.publish("bench", {"type": "agent_step", "sent_at": time.perf_counter()})
+        await asyncio.sleep(0)
+    while any(len(ws.latencies) < args.messages for ws in healthy):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    for websocket in sockets:
+        broadcaster.unsubscribe("bench", websocket)
+    return healthy, elapsed
+
+
+def report(name, healthy, elapsed):
+    latencies = sorted(l * 1000 for ws in healthy for l in ws.latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<12} {elapsed:>9.2f}s {statistics.median(latencies):>10.2f} {p99:>10.2f} {latencies[-1]:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket fan-out benchmark")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--slow", type=int, default=10, help="Number of slow subscribers")
+    parser.add_argument("--slow-delay", type=float, default=0.2, help="Seconds per send for slow subscribers")
+    parser.add_argument("--dead", type=int, default=5, help="Number of subscribers that never complete a send")
+    parser.add_argument("--send-timeout", type=float, default=1.0)
+    parser.add_argument("--skip-sequential", action="store_true", help="Only run the broadcaster")
+    args = parser.parse_args()
+
+    print(f"{args.subscribers} subscribers ({args.slow} slow, {args.dead} dead), {args.messages} messages")
+    print("Delivery latency to healthy subscribers (ms)")
+    print(f"{'mode':<12} {'total':>10} {'p50':>10} {'p99':>10} {'max':>10}")
+    report("broadcaster", *asyncio.run(run_broadcaster(args)))
+    if not args.skip_sequential:
+        report("sequential", *asyncio.run(run_sequential(args)))
+
+
+if __name__ == "__main__":
+    main()
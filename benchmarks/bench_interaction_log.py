@@ -0,0 +1,75 @@
+"""Measure memory per stored agent interaction.
+
+Usage:
+    python benchmarks/bench_interaction_log.py [--events 100000] [--agents 6]
+
+Compares the previous representation (a list of dicts per task, each with
+a strftime-formatted timestamp string) with InteractionLog, using
+tracemalloc to measure the memory held per event. Step texts are shared
+between both runs so only the per-event overhead is compared.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interaction_log import Interaction, InteractionLog
+
+
+def make_roles(count):
+    return [f"Agent {i} Specialist" for i in range(count)]
+
+
+def build_dicts(events, roles, steps):
+    log = []
+    for i in range(events):
+        log.append({
+            "type": "agent_step",
+            "agent": roles[i % len(roles)],
+            "step": steps[i],
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        })
+    return log
+
+
+def build_log(events, roles, steps):
+    log = InteractionLog(max_size=events)
+    for i in range(events):
+        log.append(Interaction("agent_step", roles[i % len(roles)], steps[i]))
+    return log
+
+
+def measure(builder, events, roles, steps):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    log = builder(events, roles, steps)
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(log) == events
+    return (after - before) / events, elapsed / events * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interaction log memory benchmark")
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--agents", type=int, default=6)
+    args = parser.parse_args()
+
+    roles = make_roles(args.agents)
+    steps = [f"Thought: step {i}" for i in range(args.events)]
+
+    print(f"{args.events} step events from {args.agents} agents")
+    print(f"{'representation':<16} {'bytes/event':>12} {'us/event':>10}")
+    for name, builder in (("list of dicts", build_dicts), ("InteractionLog", build_log)):
+        bytes_per_event, us_per_event = measure(builder, args.events, roles, steps)
+        print(f"{name:<16} {bytes_per_event:>12.1f} {us_per_event:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Measure JSONStorage save, load and listing speed with many records.
+
+Usage:
+    python benchmarks/bench_json_storage.py [--records 20000] [--size 2000]
+        [--codecs json-pretty,json,msgpack,json+gzip,msgpack+zstd]
+
+For each codec, saves --records records of about --size bytes into a
+temporary directory, reports the bytes on disk and the save and load
+throughput, then times listing all records and the newest 100 from the index,
+and compares listing with a scan of the shard directories (what listing cost
+without the index). Codecs whose packages aren't installed are skipped.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.json_storage import JSONStorage, INDEX_FILENAME
+from database.storage_codecs import get_codec, split_filename
+
+
+def scan(storage_dir: str) -> list:
+    """List record IDs by walking the directories."""
+    ids = []
+    for _, _, filenames in os.walk(storage_dir):
+        ids.extend(split[0] for split in map(split_filename, filenames) if split is not None)
+    return ids
+
+
+def disk_bytes(storage_dir: str) -> int:
+    """Total size of the stored files, not counting the index."""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, filenames in os.walk(storage_dir)
+        for name in filenames
+        if name != INDEX_FILENAME
+    )
+
+
+def make_record(page: int, size: int) -> dict:
+    """Build a record shaped like an extraction result, of about size bytes of text."""
+    words = ("invoice total amount page section table figure summary "
+             "revenue quarter report customer").split()
+    text = " ".join(words[(page + i) % len(words)] for i in range(size // 7))[:size]
+    return {
+        "page": page,
+        "text": text,
+        "tables": [{"rows": [[i, i * 1.5, f"cell {i}"] for i in range(10)]}],
+        "entities": [{"type": "amount", "value": page * 10.25}, {"type": "date", "value": "2024-01-31"}],
+    }
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run(codec: str, records: int, size: int, with_listing: bool) -> dict:
+    """Benchmark one codec in a fresh directory."""
+    storage_dir = tempfile.mkdtemp(prefix="bench-json-storage-")
+    try:
+        storage = JSONStorage(storage_dir, codec=codec)
+        ids = [f"record-{i}" for i in range(records)]
+        data = [make_record(i, size) for i in range(records)]
+
+        save_seconds, _ = timed(lambda: [storage.save(record, record_id)
+                                         for record, record_id in zip(data, ids)])
+        load_seconds, _ = timed(lambda: [storage.load(record_id) for record_id in ids])
+        result = {
+            "codec": codec,
+            "bytes": disk_bytes(storage_dir),
+            "save": records / save_seconds,
+            "load": records / load_seconds,
+        }
+
+        if with_listing:
+            # A fresh instance reads the whole index from disk
+            open_seconds, fresh = timed(JSONStorage, storage_dir, codec=codec)
+            first_list_seconds, listed = timed(fresh.list_files)
+            result["list_cold"] = open_seconds + first_list_seconds
+            result["list"], _ = timed(fresh.list_files)
+            result["newest"], _ = timed(fresh.list_files, limit=100)
+            result["scan"], scanned = timed(scan, storage_dir)
+            assert len(listed) == len(scanned) == records
+        return result
+    finally:
+        shutil.rmtree(storage_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON storage benchmark")
+    parser.add_argument("--records", type=int, default=20000, help="Records to save per codec")
+    parser.add_argument("--size", type=int, default=2000, help="Approximate bytes of text per record")
+    parser.add_argument("--codecs", default="json-pretty,json,msgpack,json+gzip,msgpack+zstd",
+                        help="Comma-separated codecs to compare")
+    args = parser.parse_args()
+
+    results = []
+    for codec in args.codecs.split(","):
+        try:
+            get_codec(codec)
+        except ImportError as e:
+            print(f"Skipping {codec}: {e}")
+            continue
+        results.append(run(codec, args.records, args.size, with_listing=not results))
+
+    if not results:
+        return
+    print(f"\n{args.records} records of ~{args.size} bytes of text")
+    print(f"{'codec':<16}{'MB on disk':>12}{'bytes/rec':>12}{'save rec/s':>12}{'load rec/s':>12}")
+    for result in results:
+        print(f"{result['codec']:<16}{result['bytes'] / 1e6:>12.1f}{result['bytes'] / args.records:>12.0f}"
+              f"{result['save']:>12.0f}{result['load']:>12.0f}")
+
+    first = results[0]
+    print(f"\nListing ({first['codec']})")
+    print(f"list (cold)   {first['list_cold'] * 1000:>10.1f} ms  (reads the index)")
+    print(f"list          {first['list'] * 1000:>10.1f} ms")
+    print(f"list newest   {first['newest'] * 1000:>10.3f} ms  (limit=100)")
+    print(f"directory scan{first['scan'] * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
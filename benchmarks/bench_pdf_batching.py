@@ -0,0 +1,77 @@
+"""Compare per-page and batched PDF page inference throughput.
+
+Usage:
+    python benchmarks/bench_pdf_batching.py path/to/file.pdf [--model NAME]
+        [--pages 8] [--batch-sizes 1,2,4,8] [--max-new-tokens 64]
+
+Batch size 1 is the old page-by-page loop (one generate call per page).
+The model is loaded once through the model registry before timing starts.
+Use a small model (e.g. --model sshleifer/tiny-gpt2) for a quick CPU run.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PyPDF2
+
+from agents.base_agents import PDF_MODEL_NAME, build_page_prompt, generate_batch
+from agents.model_registry import model_registry
+
+
+def pages_per_second(tokenizer, model, prompts, batch_size: int, max_new_tokens: int) -> float:
+    """Run all prompts through the model and return the throughput.
+
+    Args:
+        tokenizer: The tokenizer for the model
+        model: The causal language model
+        prompts: One prompt per page
+        batch_size: Number of prompts per generate call
+        max_new_tokens: Maximum number of tokens to generate per page
+
+    Returns:
+        Pages processed per second
+    """
+    start = time.perf_counter()
+    for batch_start in range(0, len(prompts), batch_size):
+        generate_batch(tokenizer, model, prompts[batch_start:batch_start + batch_size], max_new_tokens)
+    return len(prompts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF batched inference benchmark")
+    parser.add_argument("pdf_path", help="PDF file to extract pages from")
+    parser.add_argument("--model", default=PDF_MODEL_NAME, help="Model to benchmark")
+    parser.add_argument("--pages", type=int, default=8, help="Number of pages to process")
+    parser.add_argument("--batch-sizes", default="1,2,4,8", help="Comma-separated batch sizes")
+    parser.add_argument("--max-new-tokens", type=int, default=64, help="Tokens generated per page")
+    args = parser.parse_args()
+
+    with open(args.pdf_path, "rb") as file:
+        reader = PyPDF2.PdfReader(file)
+        texts = [page.extract_text() for page in reader.pages[:args.pages]]
+    texts = [text for text in texts if text and text.strip()]
+    if not texts:
+        sys.exit(f"No text could be extracted from the first {args.pages} pages of {args.pdf_path}")
+    # Repeat short documents so every batch size sees the same page count
+    while len(texts) < args.pages:
+        texts.extend(texts[:args.pages - len(texts)])
+    prompts = [build_page_prompt(i + 1, text) for i, text in enumerate(texts)]
+
+    tokenizer, model = model_registry.get(args.model)
+    # Warm-up run so one-time initialisation isn't counted
+    generate_batch(tokenizer, model, prompts[:1], 4)
+
+    print(f"\n{len(prompts)} pages, {args.max_new_tokens} new tokens per page, model {args.model}")
+    print(f"{'batch size':>10} {'pages/s':>10} {'speedup':>10}")
+    baseline = None
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        rate = pages_per_second(tokenizer, model, prompts, batch_size, args.max_new_tokens)
+        baseline = baseline or rate
+        print(f"{batch_size:>10} {rate:>10.2f} {rate / baseline:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
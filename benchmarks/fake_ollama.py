@@ -0,0 +1,267 @@
+"""Stand-in Ollama server for running crews offline.
+
+Usage:
+    python benchmarks/fake_ollama.py [--port 11435] [--latency-ms 200]
+        [--tokens-per-second 50] [--response-tokens 120]
+
+Serves the Ollama endpoints LiteLLM uses (/api/tags, /api/show,
+/api/generate and /api/chat, streamed as NDJSON or not) plus the OpenAI
+compatible /v1/chat/completions and /v1/embeddings, the latter for crew
+memory. Every completion waits --latency-ms before the first token, then
+generates --response-tokens tokens at --tokens-per-second. Replies are
+shaped as a final answer, so each agent task takes a single LLM call.
+Point the app at it with OLLAMA_API_BASE=http://localhost:11435.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List
+
+# Models reported by /api/tags, so the startup model checks pass
+FAKE_MODELS = ["llama3.2:latest", "deepseek-r1:latest", "qwen2.5vl:latest"]
+
+EMBEDDING_SIZE = 64
+
+FILLER = ("The findings indicate steady progress across the main areas of the topic, "
+          "with several open questions that merit further analysis and review").split()
+
+
+def count_tokens(text: str) -> int:
+    """Approximate a token count as one token per four characters."""
+    return max(1, len(text) // 4)
+
+
+def prompt_text(body: Dict[str, Any]) -> str:
+    """Get the prompt text of a generate or chat request."""
+    if "prompt" in body:
+        return str(body["prompt"])
+    return "\n".join(str(message.get("content") or "") for message in body.get("messages", []))
+
+
+class FakeOllamaServer:
+    """Threaded HTTP server that imitates Ollama with configurable speed."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 200.0,
+                 tokens_per_second: float = 50.0, response_tokens: int = 120):
+        """Initialize the server.
+
+        Args:
+            host: Interface to listen on
+            port: Port to listen on; 0 picks a free port
+            latency_ms: Milliseconds before the first token of each completion
+            tokens_per_second: Generation speed after the first token; 0 or less generates instantly
+            response_tokens: Tokens generated per completion
+        """
+        self.latency = latency_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        """Serve requests from a background thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and close the socket."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def generate(self) -> Iterator[str]:
+        """Produce the tokens of one completion at the configured speed."""
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        yield "Thought: I now know the final answer\nFinal Answer:"
+        delay = 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0
+        for i in range(self.response_tokens):
+            if delay:
+                time.sleep(delay)
+            yield " " + FILLER[i % len(FILLER)]
+
+    def _handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _body(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}") if length else {}
+
+            def _send_json(self, data: Any, status: int = 200) -> None:
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _start_stream(self, content_type: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _send_chunk(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _end_stream(self) -> None:
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.rstrip("/") == "/api/tags":
+                    self._send_json({"models": [{"name": name, "model": name} for name in FAKE_MODELS]})
+                elif self.path.rstrip("/") in ("", "/"):
+                    self.send_response(200)
+                    self.send_header("Content-Length", "17")
+                    self.end_headers()
+                    self.wfile.write(b"Ollama is running")
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                path = self.path.rstrip("/")
+                body = self._body()
+                if path in ("/api/generate", "/api/chat"):
+                    self._ollama_completion(body, chat=path == "/api/chat")
+                elif path == "/api/show":
+                    self._send_json({"modelfile": "", "parameters": "", "template": "{{ .Prompt }}",
+                                     "details": {"family": "llama"}, "model_info": {}})
+                elif path in ("/v1/chat/completions", "/chat/completions"):
+                    self._openai_completion(body)
+                elif path in ("/v1/embeddings", "/embeddings", "/api/embed", "/api/embeddings"):
+                    self._embeddings(body, path)
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def _ollama_completion(self, body: Dict[str, Any], chat: bool) -> None:
+                model = body.get("model", "")
+                prompt_tokens = count_tokens(prompt_text(body))
+                started = time.perf_counter()
+
+                def message(text: str, done: bool, completion_tokens: int = 0) -> Dict[str, Any]:
+                    data = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+                    if chat:
+                        data["message"] = {"role": "assistant", "content": text}
+                    else:
+                        data["response"] = text
+                    if done:
+                        elapsed_ns = int((time.perf_counter() - started) * 1e9)
+                        data.update(done_reason="stop", total_duration=elapsed_ns,
+                                    prompt_eval_count=prompt_tokens, eval_count=completion_tokens,
+                                    eval_duration=elapsed_ns)
+                    return data
+
+                if body.get("stream", True):
+                    self._start_stream("application/x-ndjson")
+                    tokens = 0
+                    for token in server.generate():
+                        tokens += 1
+                        self._send_chunk(json.dumps(message(token, False)).encode() + b"\n")
+                    self._send_chunk(json.dumps(message("", True, tokens)).encode() + b"\n")
+                    self._end_stream()
+                else:
+                    tokens = list(server.generate())
+                    self._send_json(message("".join(tokens), True, len(tokens)))
+
+            def _openai_completion(self, body: Dict[str, Any]) -> None:
+                model = body.get("model", "")
+                prompt_tokens = count_tokens(prompt_text(body))
+                completion_id = f"chatcmpl-{server.requests}"
+                created = int(time.time())
+                if body.get("stream"):
+                    self._start_stream("text/event-stream")
+                    tokens = 0
+                    for token in server.generate():
+                        tokens += 1
+                        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                 "model": model, "choices": [{"index": 0, "delta": {"content": token},
+                                                              "finish_reason": None}]}
+                        self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                    final = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                             "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                             "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": tokens,
+                                       "total_tokens": prompt_tokens + tokens}}
+                    self._send_chunk(f"data: {json.dumps(final)}\n\n".encode())
+                    self._send_chunk(b"data: [DONE]\n\n")
+                    self._end_stream()
+                else:
+                    tokens = list(server.generate())
+                    self._send_json({
+                        "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                                     "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                                  "total_tokens": prompt_tokens + len(tokens)},
+                    })
+
+            def _embeddings(self, body: Dict[str, Any], path: str) -> None:
+                inputs = body.get("input", body.get("prompt", ""))
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                vectors = [embed(str(text)) for text in inputs]
+                if path == "/api/embeddings":
+                    self._send_json({"embedding": vectors[0] if vectors else []})
+                elif path == "/api/embed":
+                    self._send_json({"model": body.get("model", ""), "embeddings": vectors})
+                else:
+                    tokens = sum(count_tokens(str(text)) for text in inputs)
+                    self._send_json({
+                        "object": "list", "model": body.get("model", ""),
+                        "data": [{"object": "embedding", "index": i, "embedding": vector}
+                                 for i, vector in enumerate(vectors)],
+                        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                    })
+
+        return Handler
+
+
+def embed(text: str) -> List[float]:
+    """Deterministic unit-length pseudo-embedding of a text."""
+    digest = hashlib.sha256(text.encode()).digest()
+    values = [(digest[i % len(digest)] - 127.5) / 127.5 for i in range(EMBEDDING_SIZE)]
+    norm = sum(v * v for v in values) ** 0.5 or 1.0
+    return [v / norm for v in values]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="Delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="Generation speed")
+    parser.add_argument("--response-tokens", type=int, default=120, help="Tokens per completion")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.latency_ms, args.tokens_per_second,
+                              args.response_tokens).start()
+    print(f"Fake Ollama listening on {server.url}; set OLLAMA_API_BASE={server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
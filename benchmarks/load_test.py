@@ -0,0 +1,364 @@
+"""Load test the web API and WebSocket layer with a synthetic crew.
+
+Usage:
+    python benchmarks/load_test.py [--tasks 50] [--subscribers 40]
+        [--pollers 20] [--poll-interval 0.5] [--workers 8]
+        [--agents 5] [--steps 20] [--chunks 50] [--task-seconds 5]
+    python benchmarks/load_test.py serve [--port 8089] [--workers 8] ...
+
+The server is web_main.app with run_crew_job replaced by a synthetic crew
+that emits crew, agent, step and streamed LLM events through the normal
+callback and dispatcher at a configurable rate, so only the web layer is
+measured. Unless --url is given, the server is started in a subprocess
+(the "serve" command) so client load doesn't share its event loop.
+
+The client submits --tasks tasks, opens --subscribers WebSockets per task
+as soon as it is submitted and runs --pollers loops polling
+GET /task/{task_id}. It reports request latency of /submit-task,
+/task/{task_id} and WebSocket connects (up to task_info), event delivery
+latency (steps carry the wall-clock time they were emitted), dropped
+message notices and the server's resident memory over the run.
+
+Thousands of WebSockets need a high open file limit (ulimit -n); the
+client raises its soft limit to the hard limit.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+
+class SyntheticCrew:
+    """Stand-in for run_crew_job that emits a crew's events without any LLM."""
+
+    def __init__(self, agents: int = 5, steps: int = 20, chunks: int = 50, task_seconds: float = 5.0):
+        """Initialize the synthetic crew.
+
+        Args:
+            agents: Agents per task
+            steps: Step events per agent
+            chunks: Streamed LLM chunks per agent
+            task_seconds: Duration of each task; events are spread evenly over it
+        """
+        self.agents = agents
+        self.steps = steps
+        self.chunks = chunks
+        self.task_seconds = task_seconds
+
+    def run(self, task_id: str, topic: str, pdf_paths: List[str] = None, dispatcher: Any = None,
+            event_queue: Any = None, profile: bool = False) -> Dict[str, Any]:
+        """Emit the events of one task; has the signature of run_crew_job."""
+        from callbacks import AgentInteractionCallback
+        from token_usage import finalize_usage
+
+        callback = AgentInteractionCallback(task_id, dispatcher)
+        rounds = max(self.steps, self.chunks)
+        delay = self.task_seconds / max(1, self.agents * rounds)
+        crew = SimpleNamespace(name="Synthetic crew")
+        output = f"Synthetic result for {topic}"
+        with callback.activate():
+            callback.on_crew_start_sync(crew, {})
+            for a in range(self.agents):
+                agent = SimpleNamespace(role=f"Synthetic agent {a}")
+                task = SimpleNamespace(description=f"Synthetic task {a} on {topic}")
+                callback.on_agent_start_sync(agent, task, {})
+                callback.on_llm_call_started("synthetic")
+                for i in range(rounds):
+                    if i < self.chunks:
+                        callback.on_llm_chunk(f"token{i} ")
+                    if i < self.steps:
+                        # The emit time lets clients measure delivery latency
+                        callback.on_step(agent, f"Synthetic step {i} @{time.time():.6f}")
+                    time.sleep(delay)
+                callback.on_llm_call_completed()
+                callback.on_agent_finish_sync(agent, task, f"Synthetic output {a}")
+            callback.on_crew_finish_sync(crew, output)
+        return {"result": output, "token_usage": {"models": {}, "total": finalize_usage({})}, "profile": None}
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Run web_main.app with the synthetic crew."""
+    # Synthetic tasks replace the crew in the web process itself
+    os.environ["CREW_EXECUTION_MODE"] = "thread"
+    os.environ["CREW_WORKERS"] = str(args.workers)
+    os.environ.setdefault("OLLAMA_CHECK_INTERVAL", "-1")
+    # The synthetic crew needs no templates; read when web_main builds its scheduler
+    os.environ["CREW_WARM_UP"] = "0"
+    os.chdir(ROOT)
+    import uvicorn
+    from web_interface import web_main
+
+    crew = SyntheticCrew(args.agents, args.steps, args.chunks, args.task_seconds)
+    web_main.run_crew_job = crew.run
+    uvicorn.run(web_main.app, host=args.host, port=args.port, log_level="warning")
+
+
+def percentiles(values: List[float]) -> str:
+    """Format p50/p95/p99/max of latencies given in seconds, in milliseconds."""
+    if not values:
+        return "no samples"
+    ordered = sorted(values)
+
+    def at(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000
+
+    return (f"n={len(ordered):<7} p50 {at(50):8.1f}  p95 {at(95):8.1f}  p99 {at(99):8.1f}  "
+            f"max {ordered[-1] * 1000:8.1f} ms")
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """Resident memory of a process in bytes, if it can be read."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+def raise_file_limit() -> None:
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+class LoadTest:
+    """Client side of the load test."""
+
+    def __init__(self, args: argparse.Namespace, base_url: str, server_pid: Optional[int]):
+        self.args = args
+        self.base_url = base_url
+        self.ws_url = "ws" + base_url[len("http"):]
+        self.server_pid = server_pid
+        self.http = ThreadPoolExecutor(max_workers=max(4, args.pollers + args.submit_concurrency))
+        self.submit_latency: List[float] = []
+        self.poll_latency: List[float] = []
+        self.connect_latency: List[float] = []
+        self.delivery_latency: List[float] = []
+        self.messages = 0
+        self.dropped_notices = 0
+        self.errors: Dict[str, int] = {}
+        self.task_ids: List[str] = []
+        self.memory: List[int] = []
+        self.done = asyncio.Event()
+
+    def _error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    async def _request(self, method: str, path: str, **kwargs: Any) -> Any:
+        import requests
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        response = await loop.run_in_executor(
+            self.http, lambda: requests.request(method, self.base_url + path, timeout=30, **kwargs)
+        )
+        return response, time.perf_counter() - start
+
+    async def subscriber(self, task_id: str) -> None:
+        """Follow a task over a WebSocket until it finishes."""
+        import websockets
+
+        start = time.perf_counter()
+        try:
+            async with websockets.connect(f"{self.ws_url}/ws/{task_id}", open_timeout=30,
+                                          ping_interval=None, max_size=None) as websocket:
+                connected = False
+                async for raw in websocket:
+                    received = time.time()
+                    data = json.loads(raw)
+                    self.messages += 1
+                    kind = data.get("type")
+                    if not connected:
+                        self.connect_latency.append(time.perf_counter() - start)
+                        connected = True
+                    if kind == "agent_step":
+                        self._record_step(data.get("step"), received)
+                    elif kind == "agent_step_batch":
+                        for step in data.get("steps", []):
+                            self._record_step(step.get("step"), received)
+                    elif kind == "messages_dropped":
+                        self.dropped_notices += 1
+                    elif kind in ("task_completed", "task_error"):
+                        return
+                    elif kind == "task_info" and data["task"].get("status") in ("completed", "error"):
+                        # Connected after the task finished
+                        return
+        except Exception as e:
+            self._error(f"websocket: {type(e).__name__}")
+
+    def _record_step(self, step: Optional[str], received: float) -> None:
+        if step and "@" in step:
+            try:
+                self.delivery_latency.append(received - float(step.rsplit("@", 1)[1]))
+            except ValueError:
+                pass
+
+    async def submit(self, i: int, gate: asyncio.Semaphore) -> List[asyncio.Task]:
+        """Submit one task and start its subscribers."""
+        async with gate:
+            try:
+                response, elapsed = await self._request("POST", "/submit-task",
+                                                        data={"topic": f"load test {i}"})
+            except Exception as e:
+                self._error(f"submit: {type(e).__name__}")
+                return []
+        if response.status_code != 200:
+            self._error(f"submit: HTTP {response.status_code}")
+            return []
+        self.submit_latency.append(elapsed)
+        task_id = response.json()["task_id"]
+        self.task_ids.append(task_id)
+        return [asyncio.create_task(self.subscriber(task_id)) for _ in range(self.args.subscribers)]
+
+    async def poller(self) -> None:
+        """Poll random submitted tasks until the test is done."""
+        while not self.done.is_set():
+            if self.task_ids:
+                try:
+                    response, elapsed = await self._request("GET", f"/task/{random.choice(self.task_ids)}")
+                    if response.status_code == 200:
+                        self.poll_latency.append(elapsed)
+                    else:
+                        self._error(f"poll: HTTP {response.status_code}")
+                except Exception as e:
+                    self._error(f"poll: {type(e).__name__}")
+            await asyncio.sleep(self.args.poll_interval)
+
+    async def memory_sampler(self) -> None:
+        while not self.done.is_set() and self.server_pid is not None:
+            rss = read_rss(self.server_pid)
+            if rss is not None:
+                self.memory.append(rss)
+            await asyncio.sleep(0.5)
+
+    async def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        background = [asyncio.create_task(self.poller()) for _ in range(self.args.pollers)]
+        background.append(asyncio.create_task(self.memory_sampler()))
+        gate = asyncio.Semaphore(self.args.submit_concurrency)
+        subscriber_lists = await asyncio.gather(*(self.submit(i, gate) for i in range(self.args.tasks)))
+        subscribers = [task for tasks in subscriber_lists for task in tasks]
+        print(f"Submitted {len(self.task_ids)} tasks with {len(subscribers)} WebSocket subscribers")
+        if subscribers:
+            await asyncio.wait(subscribers, timeout=self.args.timeout)
+        elapsed = time.perf_counter() - start
+        self.done.set()
+        await asyncio.gather(*background)
+        response, _ = await self._request("GET", "/stats")
+        return {"elapsed": elapsed, "stats": response.json() if response.status_code == 200 else {}}
+
+    def report(self, result: Dict[str, Any]) -> None:
+        print(f"\nRun took {result['elapsed']:.1f}s; {self.messages} WebSocket messages received "
+              f"({self.messages / result['elapsed']:.0f}/s)")
+        print("\nRequest latency")
+        print(f"  POST /submit-task     {percentiles(self.submit_latency)}")
+        print(f"  GET /task/{{task_id}}   {percentiles(self.poll_latency)}")
+        print(f"  WebSocket connect     {percentiles(self.connect_latency)}")
+        print("\nEvent delivery latency (emit to client)")
+        print(f"  agent steps           {percentiles(self.delivery_latency)}")
+        print(f"  dropped notices       {self.dropped_notices}")
+        if self.errors:
+            print("\nErrors")
+            for kind, count in sorted(self.errors.items()):
+                print(f"  {kind}: {count}")
+        if self.memory:
+            mib = 1024 * 1024
+            print(f"\nServer RSS: start {self.memory[0] / mib:.1f} MiB, peak {max(self.memory) / mib:.1f} MiB, "
+                  f"end {self.memory[-1] / mib:.1f} MiB")
+        stats = result["stats"]
+        if stats:
+            print(f"Server task state: {json.dumps(stats.get('task_state'))}")
+            print(f"Server WebSockets: {json.dumps(stats.get('websockets'))}")
+            print(f"Server events: {json.dumps(stats.get('events'))}")
+
+
+def wait_for_server(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/stats", timeout=1).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def add_crew_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--workers", type=int, default=8, help="Synthetic crews running at once")
+    parser.add_argument("--agents", type=int, default=5, help="Agents per synthetic task")
+    parser.add_argument("--steps", type=int, default=20, help="Step events per agent")
+    parser.add_argument("--chunks", type=int, default=50, help="Streamed LLM chunks per agent")
+    parser.add_argument("--task-seconds", type=float, default=5.0, help="Duration of each synthetic task")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        parser = argparse.ArgumentParser(description="Web server with a synthetic crew")
+        add_crew_arguments(parser)
+        serve(parser.parse_args(sys.argv[2:]))
+        return
+
+    parser = argparse.ArgumentParser(description="Web API and WebSocket load test")
+    add_crew_arguments(parser)
+    parser.add_argument("--url", help="Test a server already started with the serve command")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, to sample its memory")
+    parser.add_argument("--tasks", type=int, default=50, help="Tasks to submit")
+    parser.add_argument("--submit-concurrency", type=int, default=10, help="Submissions in flight at once")
+    parser.add_argument("--subscribers", type=int, default=40, help="WebSocket subscribers per task")
+    parser.add_argument("--pollers", type=int, default=20, help="Concurrent GET /task/{task_id} loops")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between polls of each loop")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds to wait for all tasks")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    process = None
+    if args.url:
+        base_url, server_pid = args.url.rstrip("/"), args.server_pid
+    else:
+        command = [sys.executable, os.path.abspath(__file__), "serve", "--host", args.host,
+                   "--port", str(args.port), "--workers", str(args.workers), "--agents", str(args.agents),
+                   "--steps", str(args.steps), "--chunks", str(args.chunks),
+                   "--task-seconds", str(args.task_seconds)]
+        process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+        base_url, server_pid = f"http://{args.host}:{args.port}", process.pid
+    try:
+        if process is not None:
+            wait_for_server(base_url, process)
+        test = LoadTest(args, base_url, server_pid)
+        test.report(asyncio.run(test.run()))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
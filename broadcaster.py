@@ -0,0 +1,202 @@
+import asyncio
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+# Messages queued per WebSocket before older ones are dropped
+WS_QUEUE_SIZE = int(os.environ.get("WS_QUEUE_SIZE", "256"))
+
+# Seconds a single send may take before the connection is considered dead
+WS_SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", "10"))
+
+# Message types that are never dropped for slow consumers
+PROTECTED_TYPES = frozenset({"task_info", "task_completed", "task_error", "interactions_replay"})
+
+
+class Subscriber:
+    """A WebSocket with its own bounded outbound queue and writer task."""
+
+    __slots__ = ("task_id", "websocket", "queue", "max_size", "ready", "dropped", "overflowed", "writer")
+
+    def __init__(self, task_id: str, websocket: Any, max_size: int):
+        """Initialize the subscriber.
+
+        Args:
+            task_id: The ID of the task the WebSocket is subscribed to
+            websocket: The WebSocket connection
+            max_size: Maximum number of queued messages
+        """
+        self.task_id = task_id
+        self.websocket = websocket
+        self.queue: deque = deque()
+        self.max_size = max_size
+        self.ready = asyncio.Event()
+        self.dropped = 0
+        self.overflowed = False
+        self.writer: Optional[asyncio.Task] = None
+
+    def put(self, message: Dict[str, Any]) -> None:
+        """Queue a message, dropping the oldest droppable message if the queue is full.
+
+        If the queue is full of messages that can't be dropped, the
+        subscriber is marked as overflowed instead and its writer evicts it,
+        so a stalled client can't grow its queue without bound.
+
+        Args:
+            message: The message to send
+        """
+        if self.overflowed:
+            return
+        if len(self.queue) >= self.max_size:
+            for i, queued in enumerate(self.queue):
+                if queued.get("type") not in PROTECTED_TYPES:
+                    del self.queue[i]
+                    self.dropped += 1
+                    break
+            else:
+                self.overflowed = True
+                self.ready.set()
+                return
+        self.queue.append(message)
+        self.ready.set()
+
+
+class Broadcaster:
+    """Fans messages out to the WebSockets subscribed to each task.
+
+    Publishing never waits on a socket: every subscriber has its own bounded
+    queue drained by its own writer task, so a slow browser only delays
+    itself. When a subscriber falls behind, its oldest queued messages are
+    dropped (except task info, replays and final status messages) and it is
+    told how many it missed. Sockets that fail or time out on a send, or
+    whose queue fills up with messages that can't be dropped, are evicted.
+    """
+
+    def __init__(self, queue_size: int = WS_QUEUE_SIZE, send_timeout: float = WS_SEND_TIMEOUT):
+        """Initialize the broadcaster.
+
+        Args:
+            queue_size: Maximum number of queued messages per WebSocket
+            send_timeout: Seconds a send may take before the WebSocket is evicted
+        """
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.subscribers: Dict[str, Dict[Any, Subscriber]] = {}
+        self.evicted = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+
+    def start(self) -> None:
+        """Bind the broadcaster to the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+
+    def subscribe(self, task_id: str, websocket: Any) -> Subscriber:
+        """Subscribe a WebSocket to a task's messages. Must be called on the event loop.
+
+        Args:
+            task_id: The ID of the task
+            websocket: The WebSocket connection
+
+        Returns:
+            The subscriber for the WebSocket
+        """
+        if self._loop is None:
+            self.start()
+        subscriber = Subscriber(task_id, websocket, self.queue_size)
+        subscriber.writer = asyncio.create_task(self._write(subscriber))
+        self.subscribers.setdefault(task_id, {})[websocket] = subscriber
+        return subscriber
+
+    def unsubscribe(self, task_id: str, websocket: Any) -> None:
+        """Remove a WebSocket from a task's subscribers and stop its writer.
+
+        Args:
+            task_id: The ID of the task
+            websocket: The WebSocket connection
+        """
+        subscribers = self.subscribers.get(task_id)
+        if not subscribers:
+            return
+        subscriber = subscribers.pop(websocket, None)
+        if not subscribers:
+            del self.subscribers[task_id]
+        if subscriber is not None and subscriber.writer is not None:
+            if subscriber.writer is not asyncio.current_task():
+                subscriber.writer.cancel()
+
+    def publish(self, task_id: str, message: Dict[str, Any]) -> None:
+        """Queue a message for every WebSocket subscribed to a task.
+
+        Safe to call from any thread; calls from other threads are handed to
+        the event loop.
+
+        Args:
+            task_id: The ID of the task
+            message: The message to send
+        """
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._publish, task_id, message)
+        else:
+            self._publish(task_id, message)
+
+    def has_subscribers(self, task_id: str) -> bool:
+        """Check whether any WebSocket is subscribed to a task."""
+        return bool(self.subscribers.get(task_id))
+
+    def count(self) -> int:
+        """Get the total number of subscribed WebSockets."""
+        return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Get connection and queue statistics.
+
+        Returns:
+            Dictionary with subscriber counts, queued and dropped messages and evictions
+        """
+        all_subscribers = [s for subscribers in self.subscribers.values() for s in subscribers.values()]
+        return {
+            "tasks": len(self.subscribers),
+            "connections": len(all_subscribers),
+            "queued_messages": sum(len(s.queue) for s in all_subscribers),
+            "dropped_messages": sum(s.dropped for s in all_subscribers),
+            "evicted_connections": self.evicted,
+        }
+
+    def _publish(self, task_id: str, message: Dict[str, Any]) -> None:
+        """Queue a message for a task's subscribers. Runs on the event loop."""
+        for subscriber in list(self.subscribers.get(task_id, {}).values()):
+            subscriber.put(message)
+
+    async def _write(self, subscriber: Subscriber) -> None:
+        """Writer task that drains one subscriber's queue."""
+        reported_drops = 0
+        try:
+            while True:
+                if subscriber.overflowed:
+                    raise BufferError(f"Send queue full of undroppable messages ({subscriber.max_size})")
+                if not subscriber.queue:
+                    subscriber.ready.clear()
+                    await subscriber.ready.wait()
+                    continue
+                if subscriber.dropped > reported_drops:
+                    # Let the client know it missed messages so it can catch up
+                    missed = subscriber.dropped - reported_drops
+                    reported_drops = subscriber.dropped
+                    await self._send(subscriber, {"type": "messages_dropped", "count": missed})
+                await self._send(subscriber, subscriber.queue.popleft())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Evicting WebSocket for task {subscriber.task_id}: {type(e).__name__}: {str(e)}")
+            self.evicted += 1
+            self.unsubscribe(subscriber.task_id, subscriber.websocket)
+            try:
+                await subscriber.websocket.close()
+            except Exception:
+                pass
+
+    async def _send(self, subscriber: Subscriber, message: Dict[str, Any]) -> None:
+        """Send one message, failing if it takes longer than the send timeout."""
+        await asyncio.wait_for(subscriber.websocket.send_json(message), timeout=self.send_timeout)
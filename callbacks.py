@@ -1,25 +1,293 @@
-from datetime import datetime
-from typing import Dict, List, Set, Any, Optional
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterator, Optional
 import asyncio
+import os
+import queue
+import threading
+import time
+
+from broadcaster import Broadcaster
+from interaction_log import Interaction, InteractionLog
+from metrics import Span, metrics
+
+# Window in milliseconds over which consecutive agent_step events of a task
+# are merged into one agent_step_batch message; 0 sends every step on its own
+STEP_BATCH_WINDOW_MS = float(os.environ.get("STEP_BATCH_WINDOW_MS", "100"))
+
+# Maximum number of steps in one batch; a full batch is sent immediately
+STEP_BATCH_MAX = int(os.environ.get("STEP_BATCH_MAX", "50"))
+
+# Streamed LLM tokens are sent as one llm_delta interaction per this many
+# characters or milliseconds, whichever comes first
+STREAM_DELTA_CHARS = int(os.environ.get("STREAM_DELTA_CHARS", "200"))
+STREAM_DELTA_MS = float(os.environ.get("STREAM_DELTA_MS", "50"))
+
+# Interactions that end an agent's turn and repeat its output
+FINISH_TYPES = frozenset({"agent_finish", "subtask_finish", "task_complete"})
+
+# Put on the relay queue by a worker process after a task's last event
+TASK_END = "task_end"
+
+# Seconds to wait for a task's end marker from a worker process before
+# sending its final status anyway (e.g. when the worker process died)
+EVENT_RELAY_END_TIMEOUT = float(os.environ.get("EVENT_RELAY_END_TIMEOUT", "5"))
+
+# Callback of the crew running in the current thread, for CrewAI event bus listeners
+_active = threading.local()
+_event_listeners_installed = False
+_event_listeners_lock = threading.Lock()
+
+# Callbacks of the crews running in this process, and the same callbacks by
+# the IDs of their crews' agents and tasks, for events delivered on another
+# thread than the one that started the crew
+_running: List["AgentInteractionCallback"] = []
+_routes: Dict[str, "AgentInteractionCallback"] = {}
+_routes_lock = threading.Lock()
+_unrouted_reported = False
+
+
+def _event_route_keys(source: Any, event: Any) -> List[str]:
+    """Collect the agent and task IDs an event refers to."""
+    keys = []
+    for name in ("agent_id", "task_id"):
+        value = getattr(event, name, None)
+        if value:
+            keys.append(str(value))
+    for obj in (getattr(event, "from_agent", None), getattr(event, "from_task", None),
+                getattr(event, "agent", None), getattr(event, "task", None),
+                source, getattr(source, "agent", None), getattr(source, "task", None)):
+        value = getattr(obj, "id", None) if obj is not None else None
+        if value:
+            keys.append(str(value))
+    return keys
+
+
+def _callback_for(source: Any, event: Any) -> Optional["AgentInteractionCallback"]:
+    """Find the callback of the crew an event belongs to.
+    
+    The callback activated in the current thread is used first. Otherwise
+    the event is routed by the agent or task it came from, and if only one
+    crew is running, to that crew. Events that can't be routed are dropped,
+    which is reported once per process.
+    """
+    global _unrouted_reported
+    callback = getattr(_active, "callback", None)
+    if callback is not None:
+        return callback
+    with _routes_lock:
+        for key in _event_route_keys(source, event):
+            callback = _routes.get(key)
+            if callback is not None:
+                return callback
+        if len(_running) == 1:
+            return _running[0]
+        if not _running or _unrouted_reported:
+            return None
+        _unrouted_reported = True
+    print(f"WARNING: Could not tell which of {len(_running)} running crews a {type(event).__name__} "
+          f"belongs to; such events are dropped, so streaming and timings may be incomplete")
+    return None
+
+
+def _import_crewai_events() -> Dict[str, Any]:
+    """Import the CrewAI event bus and the events the listeners handle.
+    
+    Newer CrewAI versions moved the events from crewai.utilities.events to crewai.events.
+    """
+    names = ["crewai_event_bus", "LLMCallCompletedEvent", "LLMCallFailedEvent", "LLMCallStartedEvent",
+             "LLMStreamChunkEvent", "ToolUsageErrorEvent", "ToolUsageFinishedEvent", "ToolUsageStartedEvent"]
+    errors = []
+    for module_name in ("crewai.events", "crewai.utilities.events"):
+        try:
+            module = __import__(module_name, fromlist=names)
+            return {name: getattr(module, name) for name in names}
+        except (ImportError, AttributeError) as e:
+            errors.append(f"{module_name}: {e}")
+    raise ImportError("; ".join(errors))
+
+
+def install_event_listeners() -> bool:
+    """Forward CrewAI's LLM and tool events to the callback of the crew they belong to.
+    
+    CrewAI emits these events on its global event bus. Depending on the
+    version, listeners run in the thread that makes the LLM or tool call or
+    on a thread of the event bus, so events are routed by thread first and
+    by agent or task otherwise (see _callback_for). Installed at most once
+    per process.
+    
+    Returns:
+        True if the listeners are installed
+    """
+    global _event_listeners_installed
+    with _event_listeners_lock:
+        if _event_listeners_installed:
+            return True
+        try:
+            events = _import_crewai_events()
+        except ImportError as e:
+            print("WARNING: CrewAI LLM and tool events are not available in this CrewAI version, so agent "
+                  f"output won't be streamed and LLM and tool calls won't be timed ({e}). "
+                  "Install the CrewAI version pinned in requirements.txt.")
+            return False
+        crewai_event_bus = events["crewai_event_bus"]
+        
+        def model_of(source: Any, event: Any) -> Optional[str]:
+            return getattr(event, "model", None) or getattr(source, "model", None)
+        
+        @crewai_event_bus.on(events["LLMStreamChunkEvent"])
+        def on_llm_stream_chunk(source: Any, event: Any) -> None:
+            callback = _callback_for(source, event)
+            if callback is not None:
+                callback.on_llm_chunk(event.chunk)
+        
+        @crewai_event_bus.on(events["LLMCallStartedEvent"])
+        def on_llm_call_started(source: Any, event: Any) -> None:
+            callback = _callback_for(source, event)
+            if callback is not None:
+                callback.on_llm_call_started(model_of(source, event))
+        
+        @crewai_event_bus.on(events["LLMCallCompletedEvent"])
+        @crewai_event_bus.on(events["LLMCallFailedEvent"])
+        def on_llm_call_completed(source: Any, event: Any) -> None:
+            callback = _callback_for(source, event)
+            if callback is not None:
+                callback.on_llm_call_completed()
+        
+        @crewai_event_bus.on(events["ToolUsageStartedEvent"])
+        def on_tool_started(source: Any, event: Any) -> None:
+            callback = _callback_for(source, event)
+            if callback is not None:
+                callback.on_tool_started(event.tool_name)
+        
+        @crewai_event_bus.on(events["ToolUsageFinishedEvent"])
+        @crewai_event_bus.on(events["ToolUsageErrorEvent"])
+        def on_tool_finished(source: Any, event: Any) -> None:
+            callback = _callback_for(source, event)
+            if callback is not None:
+                callback.on_tool_finished(event.tool_name)
+        
+        _event_listeners_installed = True
+        return True
 
 class AgentInteractionCallback:
     """Custom callback handler for tracking agent interactions.
     
     This callback handler captures agent start, finish, and error events,
-    and broadcasts them to connected WebSocket clients.
+    and hands them to an EventDispatcher, which records them and broadcasts
+    them to connected WebSocket clients.
+    
+    While the callback is active in a thread, streamed LLM tokens are
+    coalesced into llm_delta interactions. Finish events of an agent whose
+    output was streamed then refer to the stream instead of repeating the
+    output, and crew_finish refers to the task result.
+    
+    The callback also times the crew run, agent tasks, tool calls and LLM
+    calls and records them as spans in the latency metrics.
     """
     
-    def __init__(self, task_id: str, connections: Dict[str, Set], agent_interactions: Dict[str, List[Dict]]):
+    def __init__(self, task_id: str, dispatcher: Optional["EventDispatcher"]):
         """Initialize the callback handler.
         
         Args:
             task_id: The ID of the task being processed
-            connections: Dictionary mapping task IDs to sets of WebSocket connections
-            agent_interactions: Dictionary mapping task IDs to lists of agent interactions
+            dispatcher: Dispatcher that records interactions and broadcasts them
+                on the web server's event loop
         """
         self.task_id = task_id
-        self.connections = connections
-        self.agent_interactions = agent_interactions
+        self.dispatcher = dispatcher
+        self._agent_role: Optional[str] = None
+        self._agent_streamed = False
+        self._delta_chunks: List[str] = []
+        self._delta_size = 0
+        self._delta_started = 0.0
+        self._agent_model: Optional[str] = None
+        self._span_starts: Dict[str, float] = {}
+        # CrewAI may deliver LLM and tool events on another thread than the crew's
+        self._lock = threading.RLock()
+    
+    @contextmanager
+    def activate(self, crew: Any = None) -> Iterator["AgentInteractionCallback"]:
+        """Route CrewAI LLM and tool events of a crew to this callback.
+        
+        Args:
+            crew: The crew; events delivered on other threads are routed by
+                the IDs of its agents and tasks
+        """
+        keys = []
+        if crew is not None:
+            for item in list(getattr(crew, "agents", [])) + list(getattr(crew, "tasks", [])):
+                if getattr(item, "id", None):
+                    keys.append(str(item.id))
+        previous = getattr(_active, "callback", None)
+        _active.callback = self
+        with _routes_lock:
+            _running.append(self)
+            for key in keys:
+                _routes[key] = self
+        try:
+            yield self
+        finally:
+            with _routes_lock:
+                _running.remove(self)
+                for key in keys:
+                    if _routes.get(key) is self:
+                        del _routes[key]
+            with self._lock:
+                if self._delta_chunks:
+                    self._flush_delta()
+            _active.callback = previous
+    
+    def on_llm_chunk(self, chunk: str) -> None:
+        """Called for each chunk of a streamed LLM response.
+        
+        Args:
+            chunk: The text of the chunk
+        """
+        if not chunk:
+            return
+        with self._lock:
+            if not self._delta_chunks:
+                self._delta_started = time.monotonic()
+            self._delta_chunks.append(chunk)
+            self._delta_size += len(chunk)
+            if (self._delta_size >= STREAM_DELTA_CHARS
+                    or (time.monotonic() - self._delta_started) * 1000 >= STREAM_DELTA_MS):
+                self._flush_delta()
+    
+    def on_llm_call_started(self, model: Optional[str]) -> None:
+        """Called when an LLM call starts.
+        
+        Args:
+            model: The model being called
+        """
+        with self._lock:
+            self._agent_model = model
+            self._span_starts["llm"] = time.monotonic()
+    
+    def on_llm_call_completed(self) -> None:
+        """Called when an LLM call finishes or fails; sends any buffered chunks."""
+        with self._lock:
+            if self._delta_chunks:
+                self._flush_delta()
+            self._end_span("llm", time.monotonic(), model=self._agent_model)
+    
+    def on_tool_started(self, tool_name: str) -> None:
+        """Called when an agent starts using a tool.
+        
+        Args:
+            tool_name: The name of the tool
+        """
+        with self._lock:
+            self._span_starts[f"tool:{tool_name}"] = time.monotonic()
+    
+    def on_tool_finished(self, tool_name: str) -> None:
+        """Called when a tool call finishes or fails.
+        
+        Args:
+            tool_name: The name of the tool
+        """
+        with self._lock:
+            self._end_span(f"tool:{tool_name}", time.monotonic(), tool=tool_name)
     
     async def on_agent_start(self, agent: Any, task: Any, inputs: Dict[str, Any]) -> None:
         """Called when an agent starts processing a task.
@@ -29,37 +297,13 @@ class AgentInteractionCallback:
             task: The task being processed
             inputs: The inputs to the task
         """
-        interaction = {
-            "type": "agent_start",
-            "agent": agent.role,
-            "task": task.description,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("agent_start", agent.role, task.description)
+        await self._emit(interaction)
         
     def on_agent_start_sync(self, agent: Any, task: Any, inputs: Dict[str, Any]) -> None:
         """Synchronous version of on_agent_start."""
-        interaction = {
-            "type": "agent_start",
-            "agent": agent.role,
-            "task": task.description,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("agent_start", agent.role, task.description)
+        self._emit_sync(interaction)
     
     async def on_agent_finish(self, agent: Any, task: Any, output: str) -> None:
         """Called when an agent finishes processing a task.
@@ -69,37 +313,13 @@ class AgentInteractionCallback:
             task: The task that was processed
             output: The output of the task
         """
-        interaction = {
-            "type": "agent_finish",
-            "agent": agent.role,
-            "output": output,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("agent_finish", agent.role, output)
+        await self._emit(interaction)
         
     def on_agent_finish_sync(self, agent: Any, task: Any, output: str) -> None:
         """Synchronous version of on_agent_finish."""
-        interaction = {
-            "type": "agent_finish",
-            "agent": agent.role,
-            "output": output,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("agent_finish", agent.role, output)
+        self._emit_sync(interaction)
     
     async def on_agent_error(self, agent: Any, task: Any, error: Exception) -> None:
         """Called when an agent encounters an error while processing a task.
@@ -109,37 +329,13 @@ class AgentInteractionCallback:
             task: The task being processed
             error: The error that occurred
         """
-        interaction = {
-            "type": "agent_error",
-            "agent": agent.role,
-            "error": str(error),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("agent_error", agent.role, str(error))
+        await self._emit(interaction)
         
     def on_agent_error_sync(self, agent: Any, task: Any, error: Exception) -> None:
         """Synchronous version of on_agent_error."""
-        interaction = {
-            "type": "agent_error",
-            "agent": agent.role,
-            "error": str(error),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("agent_error", agent.role, str(error))
+        self._emit_sync(interaction)
     
     async def on_crew_start(self, crew: Any, inputs: Dict[str, Any]) -> None:
         """Called when a crew starts processing.
@@ -148,35 +344,13 @@ class AgentInteractionCallback:
             crew: The crew that started processing
             inputs: The inputs to the crew
         """
-        interaction = {
-            "type": "crew_start",
-            "crew": crew.name if hasattr(crew, "name") else "Crew",
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("crew_start", crew.name if hasattr(crew, "name") else "Crew")
+        await self._emit(interaction)
         
     def on_crew_start_sync(self, crew: Any, inputs: Dict[str, Any]) -> None:
         """Synchronous version of on_crew_start."""
-        interaction = {
-            "type": "crew_start",
-            "crew": crew.name if hasattr(crew, "name") else "Crew",
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("crew_start", crew.name if hasattr(crew, "name") else "Crew")
+        self._emit_sync(interaction)
     
     async def on_crew_finish(self, crew: Any, output: Any) -> None:
         """Called when a crew finishes processing.
@@ -185,50 +359,98 @@ class AgentInteractionCallback:
             crew: The crew that finished processing
             output: The output of the crew
         """
-        interaction = {
-            "type": "crew_finish",
-            "crew": crew.name if hasattr(crew, "name") else "Crew",
-            "output": str(output),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("crew_finish", crew.name if hasattr(crew, "name") else "Crew", str(output))
+        await self._emit(interaction)
         
     def on_crew_finish_sync(self, crew: Any, output: Any) -> None:
         """Synchronous version of on_crew_finish."""
-        interaction = {
-            "type": "crew_finish",
-            "crew": crew.name if hasattr(crew, "name") else "Crew",
-            "output": str(output),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("crew_finish", crew.name if hasattr(crew, "name") else "Crew", str(output))
+        self._emit_sync(interaction)
     
-    async def _broadcast(self, interaction: Dict[str, Any]) -> None:
-        """Broadcast an interaction to all connected WebSocket clients.
+    async def _emit(self, interaction: Interaction) -> None:
+        """Record an interaction and broadcast it to connected clients.
         
         Args:
-            interaction: The interaction to broadcast
+            interaction: The interaction to record
         """
-        if self.task_id in self.connections:
-            for connection in self.connections[self.task_id]:
-                try:
-                    await connection.send_json(interaction)
-                except Exception as e:
-                    print(f"Error broadcasting to WebSocket: {str(e)}")
+        self._emit_sync(interaction)
+    
+    def _emit_sync(self, interaction: Interaction) -> None:
+        """Synchronous version of _emit, callable from the crew's thread.
+        
+        Only queues the interaction; recording and broadcasting happen on
+        the web server's event loop.
+        
+        Args:
+            interaction: The interaction to record
+        """
+        with self._lock:
+            # Streamed text comes before whatever follows it
+            if self._delta_chunks:
+                self._flush_delta()
+            if interaction.type in ("agent_start", "subtask_start"):
+                self._agent_role = interaction.actor
+                self._agent_streamed = False
+                self._span_starts["agent"] = interaction.ts
+            elif interaction.type == "crew_start":
+                self._span_starts["crew"] = interaction.ts
+            elif interaction.type in ("agent_error", "subtask_error"):
+                self._end_span("agent", interaction.ts, model=self._agent_model)
+            elif interaction.type == "crew_error":
+                self._end_span("crew", interaction.ts)
+            elif interaction.type == "crew_finish":
+                self._end_span("crew", interaction.ts)
+                # The crew output is the task result, which task_completed carries
+                interaction.detail = None
+                interaction.ref = "result"
+            elif interaction.type in FINISH_TYPES:
+                if interaction.type != "task_complete":
+                    self._end_span("agent", interaction.ts, model=self._agent_model)
+                if self._agent_streamed:
+                    interaction.detail = None
+                    interaction.ref = "stream"
+            self._deliver(interaction)
+    
+    def _end_span(self, key: str, end: float, model: Optional[str] = None, tool: Optional[str] = None) -> None:
+        """Finish a span and record it, if it was started.
+        
+        Args:
+            key: The key the span's start time was stored under; its part
+                before any ":" is the span kind ("crew", "agent", "tool" or "llm")
+            end: Monotonic end time
+            model: The LLM model, for agent and LLM spans
+            tool: The tool name, for tool spans
+        """
+        started = self._span_starts.pop(key, None)
+        if started is None:
+            return
+        kind = key.split(":", 1)[0]
+        self._record_span(Span(kind, self._agent_role, tool, model, end - started))
+    
+    def _record_span(self, span: Span) -> None:
+        """Record a span in the latency metrics.
+        
+        Args:
+            span: The span to record
+        """
+        metrics.observe_span(span)
+    
+    def _flush_delta(self) -> None:
+        """Send the buffered LLM chunks as one llm_delta interaction."""
+        text = "".join(self._delta_chunks)
+        self._delta_chunks = []
+        self._delta_size = 0
+        self._agent_streamed = True
+        self._deliver(Interaction("llm_delta", self._agent_role or "Agent", text))
+    
+    def _deliver(self, interaction: Interaction) -> None:
+        """Hand an interaction to the dispatcher.
+        
+        Args:
+            interaction: The interaction to deliver
+        """
+        if self.dispatcher is not None:
+            self.dispatcher.dispatch(self.task_id, interaction)
     
     async def on_crew_error(self, crew: Any, error: Exception) -> None:
         """Called when a crew encounters an error.
@@ -237,37 +459,13 @@ class AgentInteractionCallback:
             crew: The crew that encountered the error
             error: The error that occurred
         """
-        interaction = {
-            "type": "crew_error",
-            "crew": crew.name if hasattr(crew, "name") else "Crew",
-            "error": str(error),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("crew_error", crew.name if hasattr(crew, "name") else "Crew", str(error))
+        await self._emit(interaction)
         
     def on_crew_error_sync(self, crew: Any, error: Exception) -> None:
         """Synchronous version of on_crew_error."""
-        interaction = {
-            "type": "crew_error",
-            "crew": crew.name if hasattr(crew, "name") else "Crew",
-            "error": str(error),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("crew_error", crew.name if hasattr(crew, "name") else "Crew", str(error))
+        self._emit_sync(interaction)
     
     async def on_subtask_start(self, agent: Any, task: Any, inputs: Dict[str, Any]) -> None:
         """Called when an agent starts processing a subtask.
@@ -277,37 +475,13 @@ class AgentInteractionCallback:
             task: The subtask being processed
             inputs: The inputs to the subtask
         """
-        interaction = {
-            "type": "subtask_start",
-            "agent": agent.role,
-            "task": task.description,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("subtask_start", agent.role, task.description)
+        await self._emit(interaction)
         
     def on_subtask_start_sync(self, agent: Any, task: Any, inputs: Dict[str, Any]) -> None:
         """Synchronous version of on_subtask_start."""
-        interaction = {
-            "type": "subtask_start",
-            "agent": agent.role,
-            "task": task.description,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("subtask_start", agent.role, task.description)
+        self._emit_sync(interaction)
     
     async def on_subtask_finish(self, agent: Any, task: Any, output: str) -> None:
         """Called when an agent finishes processing a subtask.
@@ -317,37 +491,13 @@ class AgentInteractionCallback:
             task: The subtask that was processed
             output: The output of the subtask
         """
-        interaction = {
-            "type": "subtask_finish",
-            "agent": agent.role,
-            "output": output,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("subtask_finish", agent.role, output)
+        await self._emit(interaction)
         
     def on_subtask_finish_sync(self, agent: Any, task: Any, output: str) -> None:
         """Synchronous version of on_subtask_finish."""
-        interaction = {
-            "type": "subtask_finish",
-            "agent": agent.role,
-            "output": output,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("subtask_finish", agent.role, output)
+        self._emit_sync(interaction)
     
     async def on_subtask_error(self, agent: Any, task: Any, error: Exception) -> None:
         """Called when an agent encounters an error while processing a subtask.
@@ -357,37 +507,13 @@ class AgentInteractionCallback:
             task: The subtask being processed
             error: The error that occurred
         """
-        interaction = {
-            "type": "subtask_error",
-            "agent": agent.role,
-            "error": str(error),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("subtask_error", agent.role, str(error))
+        await self._emit(interaction)
         
     def on_subtask_error_sync(self, agent: Any, task: Any, error: Exception) -> None:
         """Synchronous version of on_subtask_error."""
-        interaction = {
-            "type": "subtask_error",
-            "agent": agent.role,
-            "error": str(error),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("subtask_error", agent.role, str(error))
+        self._emit_sync(interaction)
     
     async def on_task_complete(self, output: Any) -> None:
         """Called when a task is completed.
@@ -395,35 +521,13 @@ class AgentInteractionCallback:
         Args:
             output: The output of the task
         """
-        interaction = {
-            "type": "task_complete",
-            "output": str(output),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        await self._broadcast(interaction)
+        interaction = Interaction("task_complete", None, str(output))
+        await self._emit(interaction)
         
     def on_task_complete_sync(self, output: Any) -> None:
         """Synchronous version of on_task_complete."""
-        interaction = {
-            "type": "task_complete",
-            "output": str(output),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
-        try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
-            else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
+        interaction = Interaction("task_complete", None, str(output))
+        self._emit_sync(interaction)
             
     def on_step(self, agent: Any, step: str) -> None:
         """Called after each step in an agent's execution process.
@@ -432,23 +536,298 @@ class AgentInteractionCallback:
             agent: The agent that executed the step
             step: The step that was executed
         """
-        interaction = {
-            "type": "agent_step",
-            "agent": agent.role if hasattr(agent, "role") else "Agent",
-            "step": step,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        interaction = Interaction("agent_step", agent.role if hasattr(agent, "role") else "Agent", str(step))
+        self._emit_sync(interaction)
+
+class QueueRelayCallback(AgentInteractionCallback):
+    """Callback handler used inside crew worker processes.
+    
+    Instead of recording and broadcasting interactions itself, it forwards
+    them over a queue to the web process, where an EventRelay delivers them.
+    """
+    
+    def __init__(self, task_id: str, event_queue: Any):
+        """Initialize the callback handler.
+        
+        Args:
+            task_id: The ID of the task being processed
+            event_queue: Queue shared with the web process (e.g. a multiprocessing Manager queue)
+        """
+        super().__init__(task_id, None)
+        self.event_queue = event_queue
+    
+    def _record_span(self, span: Span) -> None:
+        """Forward a span to the web process."""
+        try:
+            self.event_queue.put((self.task_id, span))
+        except Exception as e:
+            print(f"Error relaying span for task {self.task_id}: {str(e)}")
+    
+    def _deliver(self, interaction: Interaction) -> None:
+        """Forward an interaction to the web process."""
+        try:
+            self.event_queue.put((self.task_id, interaction))
+        except Exception as e:
+            print(f"Error relaying interaction for task {self.task_id}: {str(e)}")
+
+
+def relay_task_end(event_queue: Any, task_id: str) -> None:
+    """Tell the web process that a worker process relayed a task's last event.
+    
+    Args:
+        event_queue: Queue shared with the web process
+        task_id: The ID of the task
+    """
+    try:
+        event_queue.put((task_id, TASK_END))
+    except Exception as e:
+        print(f"Error relaying end of task {task_id}: {str(e)}")
+
+
+class EventDispatcher:
+    """Hands interactions from crew threads to the web server's event loop.
+    
+    The dispatcher captures the server's loop once. Crew threads only put
+    interactions on a thread-safe queue and, if the loop isn't already due
+    to drain it, schedule a single wakeup. The loop then records the queued
+    interactions and publishes them to WebSocket subscribers, so the sockets
+    are only ever touched by the loop that owns them.
+    
+    Consecutive agent_step events of a task are held for up to the batch
+    window and sent as a single agent_step_batch message. Any other event of
+    the task sends the held steps first, so ordering is preserved.
+    """
+    
+    def __init__(self, broadcaster: Broadcaster, agent_interactions: Dict[str, InteractionLog],
+                 step_batch_window_ms: float = STEP_BATCH_WINDOW_MS, step_batch_max: int = STEP_BATCH_MAX):
+        """Initialize the dispatcher.
+        
+        Args:
+            broadcaster: Broadcaster for the WebSocket clients subscribed to tasks
+            agent_interactions: Dictionary mapping task IDs to their interaction logs
+            step_batch_window_ms: Longest time a step event is held for batching, 0 to disable
+            step_batch_max: Maximum number of steps in one batch
+        """
+        self.broadcaster = broadcaster
+        self.agent_interactions = agent_interactions
+        self.step_batch_window = max(0.0, step_batch_window_ms) / 1000
+        self.step_batch_max = max(1, step_batch_max)
+        self.dispatched = 0
+        self.wakeups = 0
+        self.messages = 0
+        self._pending_steps: Dict[str, List[Interaction]] = {}
+        self._step_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._drain_scheduled = False
+    
+    def start(self) -> None:
+        """Bind the dispatcher to the running event loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+    
+    def dispatch(self, task_id: str, interaction: Interaction) -> None:
+        """Record and broadcast an interaction. Safe to call from any thread.
+        
+        Args:
+            task_id: The ID of the task the interaction belongs to
+            interaction: The interaction
+        """
+        self.dispatched += 1
+        if self._loop is None or threading.get_ident() == self._loop_thread:
+            self._deliver(task_id, interaction)
+            return
+        self._queue.put((task_id, interaction))
+        if not self._drain_scheduled:
+            self._drain_scheduled = True
+            self.wakeups += 1
+            try:
+                self._loop.call_soon_threadsafe(self._drain)
+            except RuntimeError:
+                # The loop has been closed during shutdown
+                self._drain_scheduled = False
+    
+    def flush(self, task_id: str) -> None:
+        """Deliver everything queued or held for a task. Must be called on the event loop.
+        
+        Call this before publishing a task's final status so that no step
+        arrives after it. In process mode, first wait for the task's events
+        to leave the relay queue with EventRelay.wait_for_end.
+        
+        Args:
+            task_id: The ID of the task
+        """
+        self._drain()
+        self._flush_steps(task_id)
+    
+    def stats(self) -> Dict[str, int]:
+        """Get dispatch statistics.
+        
+        Returns:
+            Dictionary with dispatched interactions, published messages, loop
+            wakeups and pending interactions
+        """
+        return {
+            "dispatched": self.dispatched,
+            "messages": self.messages,
+            "wakeups": self.wakeups,
+            "pending": self._queue.qsize() + sum(len(steps) for steps in self._pending_steps.values()),
         }
-        self.agent_interactions[self.task_id].append(interaction)
-        # Create a new event loop for the async call if needed
+    
+    def _drain(self) -> None:
+        """Deliver every queued interaction. Runs on the event loop."""
+        # Clear the flag first so interactions queued from now on schedule a new drain
+        self._drain_scheduled = False
+        while True:
+            try:
+                task_id, interaction = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(task_id, interaction)
+    
+    def _deliver(self, task_id: str, interaction: Interaction) -> None:
+        """Batch step events and publish everything else. Runs on the event loop."""
+        if interaction.type == "agent_step" and self.step_batch_window > 0 and self._loop is not None:
+            steps = self._pending_steps.setdefault(task_id, [])
+            steps.append(interaction)
+            if len(steps) >= self.step_batch_max:
+                self._flush_steps(task_id)
+            elif task_id not in self._step_timers:
+                self._step_timers[task_id] = self._loop.call_later(
+                    self.step_batch_window, self._flush_steps, task_id
+                )
+            return
+        self._flush_steps(task_id)
+        self._publish(task_id, interaction)
+    
+    def _flush_steps(self, task_id: str) -> None:
+        """Publish the steps held for a task, merged into one message if there are several."""
+        timer = self._step_timers.pop(task_id, None)
+        if timer is not None:
+            timer.cancel()
+        steps = self._pending_steps.pop(task_id, None)
+        if not steps:
+            return
+        if len(steps) == 1:
+            self._publish(task_id, steps[0])
+            return
+        interactions = self.agent_interactions.get(task_id)
+        if interactions is not None:
+            for step in steps:
+                interactions.append(step)
+        step_dicts = [step.to_dict() for step in steps]
+        for step in step_dicts:
+            del step["type"]
+        self.messages += 1
+        batch = {
+            "type": "agent_step_batch",
+            "steps": step_dicts,
+            "timestamp": step_dicts[-1]["timestamp"],
+        }
+        if "seq" in step_dicts[-1]:
+            batch["seq"] = step_dicts[-1]["seq"]
+        self.broadcaster.publish(task_id, batch)
+    
+    def _publish(self, task_id: str, interaction: Interaction) -> None:
+        """Record an interaction and publish it to the task's subscribers."""
+        interactions = self.agent_interactions.get(task_id)
+        if interactions is not None:
+            interactions.append(interaction)
+        self.messages += 1
+        self.broadcaster.publish(task_id, interaction.to_dict())
+
+
+class EventRelay:
+    """Delivers interactions relayed from crew worker processes.
+    
+    A background thread reads (task_id, interaction) pairs from a
+    multiprocessing queue and hands them to the EventDispatcher. Spans
+    timed in the worker processes arrive the same way and are recorded in
+    the web process's metrics. After a task's last event the worker puts a
+    TASK_END marker on the queue, which wait_for_end waits for.
+    """
+    
+    def __init__(self, dispatcher: EventDispatcher):
+        """Initialize the relay.
+        
+        Args:
+            dispatcher: Dispatcher that records and broadcasts the interactions
+        """
+        self.dispatcher = dispatcher
+        self.queue = None
+        self._manager = None
+        self._thread = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ends: Dict[str, asyncio.Future] = {}
+    
+    def start(self) -> None:
+        """Start relaying events from worker processes. Must be called on the event loop."""
+        import multiprocessing
+        
+        self._loop = asyncio.get_running_loop()
+        self._manager = multiprocessing.get_context("spawn").Manager()
+        self.queue = self._manager.Queue()
+        self._thread = threading.Thread(target=self._run, name="event-relay", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the relay thread and the queue manager."""
+        if self._thread is not None:
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+    
+    def expect_end(self, task_id: str) -> None:
+        """Start tracking a task's end marker. Call before the task is sent to a worker.
+        
+        Args:
+            task_id: The ID of the task
+        """
+        self._ends[task_id] = self._loop.create_future()
+    
+    async def wait_for_end(self, task_id: str, timeout: float = EVENT_RELAY_END_TIMEOUT) -> None:
+        """Wait until every event a worker relayed for a task has been dispatched.
+        
+        Returns immediately for tasks that aren't tracked with expect_end.
+        
+        Args:
+            task_id: The ID of the task
+            timeout: Seconds to wait for the end marker
+        """
+        future = self._ends.get(task_id)
+        if future is None:
+            return
         try:
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                loop.create_task(self._broadcast(interaction))
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            print(f"End of task {task_id} wasn't relayed within {timeout:g}s; its last events may arrive late")
+        finally:
+            self._ends.pop(task_id, None)
+    
+    def _end(self, task_id: str) -> None:
+        """Resolve a task's end marker. Runs on the event loop."""
+        future = self._ends.get(task_id)
+        if future is not None and not future.done():
+            future.set_result(None)
+    
+    def _run(self) -> None:
+        """Relay thread loop."""
+        while True:
+            try:
+                item = self.queue.get()
+            except (EOFError, OSError):
+                break
+            if item is None:
+                break
+            task_id, payload = item
+            if isinstance(payload, str) and payload == TASK_END:
+                # Everything the worker relayed before the marker has been dispatched
+                self._loop.call_soon_threadsafe(self._end, task_id)
+            elif isinstance(payload, Span):
+                metrics.observe_span(payload)
             else:
-                loop.run_until_complete(self._broadcast(interaction))
-        except RuntimeError:
-            # If no event loop is available in this thread
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self._broadcast(interaction))
-            loop.close()
\ No newline at end of file
+                self.dispatcher.dispatch(task_id, payload)
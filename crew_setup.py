@@ -23,10 +23,212 @@ from tasks.base_tasks import (
 
 from crewai import LLM
 from litellm import completion
+import threading
+import time
+from contextlib import nullcontext
+
+from token_usage import TokenUsageTracker, UsageRecorder
+from profiling import TaskProfiler
+
+# Ollama server used by all agents
+OLLAMA_API_BASE = os.environ.get("OLLAMA_API_BASE", "http://localhost:11434")
+
+# Seconds between LiteLLM connectivity checks; a negative value disables the check
+OLLAMA_CHECK_INTERVAL = float(os.environ.get("OLLAMA_CHECK_INTERVAL", "300"))
+
+# Model used by each agent, and the model to fall back to if one can't be initialized
+AGENT_MODELS = {
+    "web": "llama3.2",
+    "research": "deepseek-r1",
+    "analysis": "deepseek-r1",
+    "writer": "llama3.2",
+    "manager": "llama3.2",
+    "pdf": "qwen2.5vl",
+}
+FALLBACK_MODEL = "llama3.2"
+
+# Stream LLM responses so agent output reaches clients token by token ("0" disables)
+STREAM_LLM_OUTPUT = os.environ.get("STREAM_LLM_OUTPUT", "1") != "0"
+
+AGENT_FACTORIES = {
+    "web": WebSearchAgent,
+    "research": ResearchAgent,
+    "analysis": AnalysisAgent,
+    "writer": WriterAgent,
+    "manager": ManagerAgent,
+    "pdf": PDFProcessingAgent,
+}
+
+class AccountingLLM(LLM):
+    """LLM client that reports the token usage of each call.
+    
+    The usage is recorded by the TokenUsageTracker active in the calling
+    thread, if any.
+    """
+    
+    def call(self, messages: Any, tools: Optional[List[dict]] = None, callbacks: Optional[List[Any]] = None,
+             available_functions: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        callbacks = list(callbacks or [])
+        callbacks.append(UsageRecorder(self.model))
+        return super().call(messages, tools=tools, callbacks=callbacks,
+                            available_functions=available_functions, **kwargs)
+
+class CrewTemplateRegistry:
+    """Process-wide cache of LLM clients and agent templates.
+    
+    LLM clients and agents (with their tools) are built once per process.
+    Each crew gets copies of the agent templates, which share the template's
+    tools and LLM configuration, so per-task setup only pays for the copies.
+    The LiteLLM connectivity check runs at most once per check interval.
+    """
+    
+    def __init__(self, api_base: str = OLLAMA_API_BASE, check_interval: float = OLLAMA_CHECK_INTERVAL):
+        """Initialize the registry.
+        
+        Args:
+            api_base: The Ollama API base URL
+            check_interval: Seconds between connectivity checks; negative disables them
+        """
+        self.api_base = api_base
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._llms: Dict[str, LLM] = {}
+        self._agents: Dict[str, Agent] = {}
+        self._last_check: Optional[float] = None
+        self._last_check_ok = False
+        self._timings: Dict[str, float] = {}
+    
+    def check_connection(self, force: bool = False) -> bool:
+        """Test the Ollama connection with LiteLLM, reusing a recent result.
+        
+        Args:
+            force: Run the check even if a recent result is cached
+        
+        Returns:
+            True if the last check succeeded
+        """
+        if self.check_interval < 0 and not force:
+            return self._last_check_ok
+        
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_check is not None and now - self._last_check < self.check_interval:
+                return self._last_check_ok
+            
+            try:
+                test_response = completion(
+                    model=f"ollama/{FALLBACK_MODEL}",
+                    messages=[{"content": "Test message. Respond briefly.", "role": "user"}],
+                    api_base=self.api_base
+                )
+                print("LiteLLM direct test successful:", test_response.choices[0].message.content[:50])
+                self._last_check_ok = True
+            except Exception as e:
+                print(f"LiteLLM direct test failed: {str(e)}")
+                self._last_check_ok = False
+            self._last_check = time.monotonic()
+            return self._last_check_ok
+    
+    def get_llm(self, model: str) -> LLM:
+        """Get the shared LLM client for a model, creating it on first use.
+        
+        Args:
+            model: The Ollama model name
+        
+        Returns:
+            The LLM client
+        """
+        llm = self._llms.get(model)
+        if llm is not None:
+            return llm
+        
+        with self._lock:
+            if model not in self._llms:
+                try:
+                    self._llms[model] = AccountingLLM(
+                        provider="ollama",  # Use provider instead of model prefix
+                        model=model,  # Model name without version tag
+                        api_base=self.api_base,
+                        stream=STREAM_LLM_OUTPUT
+                    )
+                except Exception as e:
+                    print(f"Error initializing LLM {model}: {str(e)}")
+                    if model == FALLBACK_MODEL:
+                        raise
+                    print(f"Falling back to {FALLBACK_MODEL} for {model}")
+                    self._llms[model] = self.get_llm(FALLBACK_MODEL)
+            return self._llms[model]
+    
+    def get_agent(self, name: str) -> Agent:
+        """Get a fresh copy of an agent template, building the template on first use.
+        
+        Args:
+            name: The agent name (a key of AGENT_FACTORIES)
+        
+        Returns:
+            A copy of the agent that can be used by one crew
+        """
+        template = self._agents.get(name)
+        if template is None:
+            with self._lock:
+                if name not in self._agents:
+                    self._agents[name] = AGENT_FACTORIES[name](llm=self.get_llm(AGENT_MODELS[name]))
+                template = self._agents[name]
+        return template.copy()
+    
+    def warm_up(self) -> None:
+        """Build all LLM clients and agent templates and run the connectivity check."""
+        start = time.perf_counter()
+        self.check_connection()
+        for name in AGENT_FACTORIES:
+            self.get_agent(name)
+        self._timings["warm_up_ms"] = (time.perf_counter() - start) * 1000
+        print(f"Crew templates ready in {self._timings['warm_up_ms']:.1f} ms")
+    
+    def record_setup(self, elapsed: float) -> None:
+        """Record the setup time of a crew.
+        
+        Args:
+            elapsed: Setup time in seconds
+        """
+        elapsed_ms = elapsed * 1000
+        self._timings.setdefault("first_setup_ms", elapsed_ms)
+        self._timings["last_setup_ms"] = elapsed_ms
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get registry contents and setup timings.
+        
+        Returns:
+            Dictionary with cached models, agents and timings in milliseconds
+        """
+        return {
+            "llms": sorted(self._llms),
+            "agents": sorted(self._agents),
+            "last_check_ok": self._last_check_ok,
+            **self._timings,
+        }
+
+# Process-wide registry used by create_crew
+crew_templates = CrewTemplateRegistry()
+
+def warm_up_crew_templates() -> None:
+    """Build the process-wide crew templates ahead of the first task.
+    
+    Used as the crew workers' initializer, so it never raises: a failing
+    initializer would break the worker pool for every later task. Whatever
+    isn't built here is built by the first crew that needs it.
+    """
+    try:
+        crew_templates.warm_up()
+    except Exception as e:
+        print(f"Error warming up crew templates, building them on first use instead: {str(e)}")
 
 def create_crew(task_id: str, topic: str, pdf_paths: List[str] = None) -> Crew:
     """Creates a crew of agents for processing a task.
     
+    Agents are copied from the process-wide template registry, so only the
+    first crew in a process pays for building LLM clients and tools.
+    
     Args:
         task_id: The ID of the task
         topic: The topic to research
@@ -35,70 +237,17 @@ def create_crew(task_id: str, topic: str, pdf_paths: List[str] = None) -> Crew:
     Returns:
         A Crew object with the specified agents and tasks
     """
-    # Test Ollama connection with LiteLLM directly
-    try:
-        # Test with the correct format
-        test_response = completion(
-            model="ollama/llama3.2", 
-            messages=[{"content": "Test message. Respond briefly.", "role": "user"}], 
-            api_base="http://localhost:11434"
-        )
-        print("LiteLLM direct test successful:", test_response.choices[0].message.content[:50])
-    except Exception as e:
-        print(f"LiteLLM direct test failed: {str(e)}")
-    # Initialize LLMs for each agent with proper Ollama configuration
-    # The key fix: use "ollama/" prefix for the model names
-    try:
-        # Configure LLMs with correct Ollama configuration
-        llm_web = LLM(
-            provider="ollama",  # Use provider instead of model prefix
-            model="llama3.2",  # Model name without version tag
-            api_base="http://localhost:11434"
-        )
-        llm_research = LLM(
-            provider="ollama",
-            model="deepseek-r1", 
-            api_base="http://localhost:11434"
-        )
-        llm_analysis = LLM(
-            provider="ollama",
-            model="deepseek-r1",
-            api_base="http://localhost:11434"
-        )
-        llm_writer = LLM(
-            provider="ollama",
-            model="llama3.2",
-            api_base="http://localhost:11434"
-        )
-        llm_manager = LLM(
-            provider="ollama",
-            model="llama3.2",
-            api_base="http://localhost:11434"
-        )
-        llm_pdf = LLM(
-            provider="ollama",
-            model="qwen2.5vl",
-            api_base="http://localhost:11434"
-        )
-        
-        print("Successfully initialized all LLMs")
-    except Exception as e:
-        print(f"Error initializing LLMs: {str(e)}")
-        # Fallback to a single LLM for all agents
-        print("Falling back to a single LLM for all agents")
-        fallback_llm = LLM(
-            provider="ollama",
-            model="llama3.2",
-            api_base="http://localhost:11434"
-        )
-        llm_web = llm_research = llm_analysis = llm_writer = llm_manager = llm_pdf = fallback_llm
-
-    # Initialize agents with their respective LLMs
-    web_agent = WebSearchAgent(llm=llm_web)
-    research_agent = ResearchAgent(llm=llm_research)
-    analysis_agent = AnalysisAgent(llm=llm_analysis)
-    writer_agent = WriterAgent(llm=llm_writer)
-    manager_agent = ManagerAgent(llm=llm_manager)
+    setup_start = time.perf_counter()
+    
+    # Test Ollama connection with LiteLLM directly (cached between tasks)
+    crew_templates.check_connection()
+
+    # Copy agents from their templates
+    web_agent = crew_templates.get_agent("web")
+    research_agent = crew_templates.get_agent("research")
+    analysis_agent = crew_templates.get_agent("analysis")
+    writer_agent = crew_templates.get_agent("writer")
+    manager_agent = crew_templates.get_agent("manager")
     
     # Create a list of agents for the crew
     agents = [web_agent, research_agent, analysis_agent, writer_agent, manager_agent]
@@ -108,7 +257,7 @@ def create_crew(task_id: str, topic: str, pdf_paths: List[str] = None) -> Crew:
     
     # Add PDF processing task if PDF paths are provided
     if pdf_paths and len(pdf_paths) > 0:
-        pdf_agent = PDFProcessingAgent(llm=llm_pdf)
+        pdf_agent = crew_templates.get_agent("pdf")
         pdf_task = pdf_processing_task(pdf_paths=pdf_paths, agent=pdf_agent, query=topic)
         tasks.append(pdf_task)
         agents.append(pdf_agent)
@@ -142,16 +291,21 @@ def create_crew(task_id: str, topic: str, pdf_paths: List[str] = None) -> Crew:
         memory=True  # Enable memory for the crew
     )
     
+    setup_elapsed = time.perf_counter() - setup_start
+    crew_templates.record_setup(setup_elapsed)
+    print(f"Crew setup for task {task_id} took {setup_elapsed * 1000:.1f} ms")
+    
     return crew
 
-def run_crew(crew: Crew, task_id: str, connections: Dict[str, Any] = None, agent_interactions: Dict[str, List[Dict]] = None) -> str:
+def run_crew(crew: Crew, task_id: str, dispatcher: Any = None, event_queue: Any = None) -> str:
     """Runs a crew and returns the result.
     
     Args:
         crew: The crew to run
         task_id: The ID of the task
-        connections: Optional dictionary of WebSocket connections
-        agent_interactions: Optional dictionary of agent interactions
+        dispatcher: Optional EventDispatcher that records and broadcasts agent interactions
+        event_queue: Optional queue to relay agent interactions to the web process
+            (used instead of a dispatcher in a worker process)
     
     Returns:
         The result of running the crew
@@ -161,13 +315,22 @@ def run_crew(crew: Crew, task_id: str, connections: Dict[str, Any] = None, agent
         print(f"Starting crew for task {task_id}")
         print(f"Crew has {len(crew.agents)} agents and {len(crew.tasks)} tasks")
         
-        # Import and initialize the callback if connections are provided
-        if connections and agent_interactions:
+        # Import and initialize the callback if a dispatcher or a relay queue is provided
+        callback = None
+        if event_queue is not None:
+            from callbacks import QueueRelayCallback
+            callback = QueueRelayCallback(task_id, event_queue)
+        elif dispatcher is not None:
             from callbacks import AgentInteractionCallback
-            callback = AgentInteractionCallback(task_id, connections, agent_interactions)
-            # Register the callback with the crew
+            callback = AgentInteractionCallback(task_id, dispatcher)
+        
+        if callback is not None:
+            # Register the callback with the crew and route LLM and tool events to it
             crew.callbacks = [callback]
-            result = crew.kickoff()
+            from callbacks import install_event_listeners
+            install_event_listeners()
+            with callback.activate(crew):
+                result = crew.kickoff()
         else:
             result = crew.kickoff()
             
@@ -178,4 +341,43 @@ def run_crew(crew: Crew, task_id: str, connections: Dict[str, Any] = None, agent
         print(error_message)
         import traceback
         print(traceback.format_exc())
-        return error_message
\ No newline at end of file
+        return error_message
+
+def run_crew_job(task_id: str, topic: str, pdf_paths: List[str] = None, dispatcher: Any = None,
+                 event_queue: Any = None, profile: bool = False) -> Dict[str, Any]:
+    """Creates and runs a crew for a task.
+    
+    This is the unit of work executed by the crew workers. It is a plain
+    module-level function so that it can also be sent to a worker process.
+    
+    Args:
+        task_id: The ID of the task
+        topic: The topic to research
+        pdf_paths: Optional list of paths to PDF files to process
+        dispatcher: Optional EventDispatcher that records and broadcasts agent interactions
+        event_queue: Optional queue to relay agent interactions to the web process
+        profile: Run the crew (including its setup) under the sampling profiler and tracemalloc
+    
+    Returns:
+        Dictionary with the result of running the crew, its token usage per
+        model and, if requested, the profile report
+    """
+    profiler = TaskProfiler() if profile else None
+    try:
+        with profiler or nullcontext():
+            print(f"Creating crew for task {task_id} on topic: {topic}")
+            crew = create_crew(task_id, topic, pdf_paths)
+            print(f"Crew created with {len(crew.agents)} agents and {len(crew.tasks)} tasks")
+            with TokenUsageTracker() as token_usage:
+                result = run_crew(crew, task_id, dispatcher, event_queue)
+    finally:
+        if event_queue is not None:
+            # Lets the web process send the final status after the last relayed event
+            from callbacks import relay_task_end
+            relay_task_end(event_queue, task_id)
+    usage = token_usage.summary()
+    total = usage["total"]
+    print(f"Task {task_id} used {total['prompt_tokens']} prompt and {total['completion_tokens']} "
+          f"completion tokens in {total['calls']} LLM calls")
+    return {"result": result, "token_usage": usage,
+            "profile": profiler.report() if profiler is not None else None}
@@ -1,3 +1,4 @@
 from .storage_factory import StorageFactory, default_storage
+from .extraction_cache import ExtractionCache, get_extraction_cache
 
-__all__ = ['StorageFactory', 'default_storage']
\ No newline at end of file
+__all__ = ['StorageFactory', 'default_storage', 'ExtractionCache', 'get_extraction_cache']
\ No newline at end of file
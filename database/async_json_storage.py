@@ -0,0 +1,93 @@
+import asyncio
+from typing import Dict, Any, Optional, List
+
+try:
+    from .json_storage import JSONStorage
+except ImportError:
+    # For testing or when imported from a different directory
+    from json_storage import JSONStorage
+
+class AsyncJSONStorage:
+    """JSON-based storage with coroutine methods, for use on an event loop.
+
+    Each operation runs the matching JSONStorage method in a worker thread,
+    so file I/O and JSON encoding never block the loop and the files are
+    laid out exactly as JSONStorage lays them out.
+    """
+
+    def __init__(self, storage_dir: str = "uploads/json", **kwargs: Any):
+        """Initialize the JSON storage.
+
+        Args:
+            storage_dir: The directory to store JSON files in
+            **kwargs: Additional arguments to pass to JSONStorage
+        """
+        self.storage = JSONStorage(storage_dir=storage_dir, **kwargs)
+        self.storage_dir = self.storage.storage_dir
+
+    async def save(self, data: Dict[str, Any], file_id: Optional[str] = None) -> str:
+        """Save data to a JSON file.
+
+        Args:
+            data: The data to save
+            file_id: Optional file ID to use for the filename
+
+        Returns:
+            The ID of the saved file
+        """
+        return await asyncio.to_thread(self.storage.save, data, file_id)
+
+    async def save_many(self, records: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Save a batch of records, one file each.
+
+        Args:
+            records: The data to save, by file ID
+
+        Returns:
+            The IDs of the saved files
+        """
+        return await asyncio.to_thread(self.storage.save_many, records)
+
+    async def load(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Load data from a JSON file.
+
+        Args:
+            file_id: The ID of the file to load
+
+        Returns:
+            The loaded data, or None if the file doesn't exist
+        """
+        return await asyncio.to_thread(self.storage.load, file_id)
+
+    async def load_many(self, file_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Load a batch of files.
+
+        Args:
+            file_ids: The IDs of the files to load
+
+        Returns:
+            The loaded data by file ID; files that don't exist are left out
+        """
+        return await asyncio.to_thread(self.storage.load_many, file_ids)
+
+    async def list_files(self) -> List[str]:
+        """List all JSON files in the storage directory.
+
+        Returns:
+            A list of file IDs
+        """
+        return await asyncio.to_thread(self.storage.list_files)
+
+    async def delete(self, file_id: str) -> bool:
+        """Delete a JSON file.
+
+        Args:
+            file_id: The ID of the file to delete
+
+        Returns:
+            True if the file was deleted, False otherwise
+        """
+        return await asyncio.to_thread(self.storage.delete, file_id)
+
+    async def close(self) -> None:
+        """Nothing to close; present for parity with AsyncPostgresStorage."""
@@ -0,0 +1,202 @@
+import os
+import json
+import asyncio
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+try:
+    from .connection_pool import POSTGRES_POOL_MIN, POSTGRES_POOL_MAX, POSTGRES_POOL_IDLE_TIMEOUT
+except ImportError:
+    # For testing or when imported from a different directory
+    from connection_pool import POSTGRES_POOL_MIN, POSTGRES_POOL_MAX, POSTGRES_POOL_IDLE_TIMEOUT
+
+class AsyncPostgresStorage:
+    """PostgreSQL-based storage with coroutine methods, for use on an event loop.
+
+    Uses asyncpg, so queries don't block the loop. The connection pool and
+    the table are created on first use, on the loop that uses the storage.
+    """
+
+    def __init__(self, connection_string: Optional[str] = None, table_name: str = "pdf_extractions"):
+        """Initialize the PostgreSQL storage.
+
+        Args:
+            connection_string: The PostgreSQL connection string
+            table_name: The name of the table to store data in
+        """
+        self.connection_string = connection_string or os.environ.get("POSTGRES_CONNECTION_STRING")
+        self.table_name = table_name
+        self._pool = None
+        self._pool_lock: Optional[asyncio.Lock] = None
+
+    async def _get_pool(self) -> Any:
+        """Create the connection pool and the table on first use."""
+        if not self.connection_string:
+            raise ValueError("PostgreSQL connection string not provided")
+        if self._pool is not None:
+            return self._pool
+        if asyncpg is None:
+            raise ImportError("asyncpg is required for async PostgreSQL storage")
+        if self._pool_lock is None:
+            self._pool_lock = asyncio.Lock()
+        async with self._pool_lock:
+            if self._pool is None:
+                pool = await asyncpg.create_pool(
+                    self.connection_string,
+                    min_size=POSTGRES_POOL_MIN,
+                    max_size=POSTGRES_POOL_MAX,
+                    max_inactive_connection_lifetime=POSTGRES_POOL_IDLE_TIMEOUT,
+                    init=self._init_connection,
+                )
+                await pool.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {self.table_name} (
+                        id VARCHAR(255) PRIMARY KEY,
+                        data JSONB NOT NULL,
+                        created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                        updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+                    )
+                """)
+                self._pool = pool
+        return self._pool
+
+    @staticmethod
+    async def _init_connection(conn: Any) -> None:
+        """Exchange JSONB values as Python objects."""
+        await conn.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    def _upsert_sql(self) -> str:
+        return (
+            f"INSERT INTO {self.table_name} (id, data, created_at, updated_at) VALUES ($1, $2, NOW(), NOW()) "
+            f"ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, updated_at = NOW()"
+        )
+
+    async def save(self, data: Dict[str, Any], file_id: Optional[str] = None) -> str:
+        """Save data to PostgreSQL.
+
+        Args:
+            data: The data to save
+            file_id: Optional file ID to use as the primary key
+
+        Returns:
+            The ID of the saved record
+        """
+        pool = await self._get_pool()
+
+        # Generate a file ID if not provided
+        if file_id is None:
+            file_id = datetime.now().strftime("%Y%m%d%H%M%S")
+
+        # Add metadata
+        data["_metadata"] = {
+            "id": file_id,
+            "created_at": datetime.now().isoformat(),
+            "updated_at": datetime.now().isoformat()
+        }
+
+        try:
+            await pool.execute(self._upsert_sql(), file_id, data)
+            return file_id
+        except Exception as e:
+            raise Exception(f"Error saving to PostgreSQL: {str(e)}")
+
+    async def save_many(self, records: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Save a batch of records in one transaction.
+
+        Args:
+            records: The data to save, by record ID
+
+        Returns:
+            The IDs of the saved records
+        """
+        if not records:
+            return []
+        pool = await self._get_pool()
+
+        now = datetime.now().isoformat()
+        rows = []
+        for file_id, data in records.items():
+            data["_metadata"] = {"id": file_id, "created_at": now, "updated_at": now}
+            rows.append((file_id, data))
+
+        try:
+            # executemany pipelines the rows and runs them in one transaction
+            await pool.executemany(self._upsert_sql(), rows)
+            return list(records)
+        except Exception as e:
+            raise Exception(f"Error saving batch to PostgreSQL: {str(e)}")
+
+    async def load(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Load data from PostgreSQL.
+
+        Args:
+            file_id: The ID of the record to load
+
+        Returns:
+            The loaded data, or None if the record doesn't exist
+        """
+        pool = await self._get_pool()
+        try:
+            return await pool.fetchval(f"SELECT data FROM {self.table_name} WHERE id = $1", file_id)
+        except Exception as e:
+            raise Exception(f"Error loading from PostgreSQL: {str(e)}")
+
+    async def load_many(self, file_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Load a batch of records with a single query.
+
+        Args:
+            file_ids: The IDs of the records to load
+
+        Returns:
+            The loaded data by record ID; records that don't exist are left out
+        """
+        if not file_ids:
+            return {}
+        pool = await self._get_pool()
+        try:
+            rows = await pool.fetch(
+                f"SELECT id, data FROM {self.table_name} WHERE id = ANY($1::varchar[])", list(file_ids)
+            )
+            return {row["id"]: row["data"] for row in rows}
+        except Exception as e:
+            raise Exception(f"Error loading batch from PostgreSQL: {str(e)}")
+
+    async def list_files(self) -> List[str]:
+        """List all records in the table.
+
+        Returns:
+            A list of record IDs
+        """
+        pool = await self._get_pool()
+        try:
+            rows = await pool.fetch(f"SELECT id FROM {self.table_name} ORDER BY created_at DESC")
+            return [row["id"] for row in rows]
+        except Exception as e:
+            raise Exception(f"Error listing records from PostgreSQL: {str(e)}")
+
+    async def delete(self, file_id: str) -> bool:
+        """Delete a record from PostgreSQL.
+
+        Args:
+            file_id: The ID of the record to delete
+
+        Returns:
+            True if the record was deleted, False otherwise
+        """
+        pool = await self._get_pool()
+        try:
+            status = await pool.execute(f"DELETE FROM {self.table_name} WHERE id = $1", file_id)
+            # The status is "DELETE <count>"
+            return status.split()[-1] != "0"
+        except Exception as e:
+            raise Exception(f"Error deleting from PostgreSQL: {str(e)}")
+
+    async def close(self) -> None:
+        """Close the connection pool."""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
@@ -0,0 +1,260 @@
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+try:
+    import psycopg2
+    from psycopg2 import extensions
+except ImportError:
+    psycopg2 = None
+
+# Connections kept open once created, even when idle
+POSTGRES_POOL_MIN = int(os.environ.get("POSTGRES_POOL_MIN", "1"))
+
+# Maximum connections open at once per database
+POSTGRES_POOL_MAX = int(os.environ.get("POSTGRES_POOL_MAX", "10"))
+
+# Seconds after which idle connections above the minimum are closed
+POSTGRES_POOL_IDLE_TIMEOUT = float(os.environ.get("POSTGRES_POOL_IDLE_TIMEOUT", "300"))
+
+# Connections idle for longer than this many seconds are checked before reuse
+POSTGRES_POOL_HEALTH_CHECK_INTERVAL = float(os.environ.get("POSTGRES_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# Seconds to wait for a free connection when all are in use
+POSTGRES_POOL_TIMEOUT = float(os.environ.get("POSTGRES_POOL_TIMEOUT", "30"))
+
+
+class PostgresConnectionPool:
+    """Thread-safe pool of psycopg2 connections to one database.
+
+    Connections are opened on demand up to ``max_size``; when all are in
+    use, callers wait for one to be returned. Returned connections are
+    rolled back if a transaction was left open. A connection that sat idle
+    for longer than the health check interval is tested with ``SELECT 1``
+    before reuse and replaced if it is broken, and idle connections above
+    ``min_size`` are closed after the idle timeout.
+    """
+
+    def __init__(self, dsn: str, min_size: int = POSTGRES_POOL_MIN, max_size: int = POSTGRES_POOL_MAX,
+                 idle_timeout: float = POSTGRES_POOL_IDLE_TIMEOUT,
+                 health_check_interval: float = POSTGRES_POOL_HEALTH_CHECK_INTERVAL,
+                 timeout: float = POSTGRES_POOL_TIMEOUT):
+        """Initialize the pool.
+
+        Args:
+            dsn: The PostgreSQL connection string
+            min_size: Connections kept open once created, even when idle
+            max_size: Maximum connections open at once
+            idle_timeout: Seconds after which idle connections above min_size are closed
+            health_check_interval: Idle seconds after which a connection is checked before reuse
+            timeout: Seconds to wait for a free connection
+        """
+        self.dsn = dsn
+        self.max_size = max(1, max_size)
+        self.min_size = min(max(0, min_size), self.max_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.closed = False
+        # (connection, time it was returned), least recently used first
+        self._idle: deque = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+        self.waits = 0
+
+    def _connect(self) -> Any:
+        if psycopg2 is None:
+            raise ImportError("psycopg2 is required for PostgreSQL storage")
+        conn = psycopg2.connect(self.dsn)
+        self.created += 1
+        return conn
+
+    @staticmethod
+    def _close(connections: List[Any]) -> None:
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_healthy(conn: Any) -> bool:
+        """Check that a connection still works."""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _take_expired(self, now: float) -> List[Any]:
+        """Remove idle connections past the idle timeout, keeping min_size open. Callers hold the lock."""
+        expired = []
+        while (self._idle and now - self._idle[0][1] > self.idle_timeout
+               and self._in_use + len(self._idle) > self.min_size):
+            expired.append(self._idle.popleft()[0])
+        self.discarded += len(expired)
+        return expired
+
+    def acquire(self) -> Any:
+        """Take a connection from the pool, opening one if needed.
+
+        Returns:
+            An open connection; give it back with release
+
+        Raises:
+            TimeoutError: If no connection became free within the timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        conn, returned_at = None, 0.0
+        expired: List[Any] = []
+        try:
+            with self._cond:
+                while True:
+                    if self.closed:
+                        raise RuntimeError("Connection pool is closed")
+                    now = time.monotonic()
+                    expired.extend(self._take_expired(now))
+                    if self._idle:
+                        # Most recently used first, so surplus connections can age out
+                        conn, returned_at = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._in_use < self.max_size:
+                        self._in_use += 1
+                        break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise TimeoutError(f"No PostgreSQL connection available within {self.timeout}s")
+                    self.waits += 1
+                    self._cond.wait(remaining)
+        finally:
+            self._close(expired)
+
+        try:
+            if conn is not None and (conn.closed or (
+                    now - returned_at > self.health_check_interval and not self._is_healthy(conn))):
+                self._close([conn])
+                self.discarded += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+            else:
+                self.reused += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def release(self, conn: Any, discard: bool = False) -> None:
+        """Give a connection back to the pool.
+
+        Args:
+            conn: A connection returned by acquire
+            discard: Close the connection instead of keeping it, e.g. after a connection error
+        """
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            keep = not discard and not conn.closed and not self.closed
+            if keep:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self.discarded += 1
+            self._cond.notify()
+        if not keep:
+            self._close([conn])
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """Borrow a connection for the duration of a with block.
+
+        A transaction left open by the block is rolled back; commit
+        explicitly to keep changes. Connections that fail with a connection
+        error are closed rather than returned to the pool.
+        """
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard)
+
+    def close(self) -> None:
+        """Close the idle connections; connections in use are closed when released."""
+        with self._cond:
+            self.closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        self._close(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool usage counters.
+
+        Returns:
+            Dictionary with open, idle and in-use connection counts and
+            how many connections were created, reused and discarded
+        """
+        with self._cond:
+            return {
+                "open": self._in_use + len(self._idle),
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max_size": self.max_size,
+                "created": self.created,
+                "reused": self.reused,
+                "discarded": self.discarded,
+                "waits": self.waits,
+            }
+
+
+# One pool per connection string, shared by all PostgresStorage instances
+_pools: Dict[str, PostgresConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(dsn: str) -> PostgresConnectionPool:
+    """Get the process-wide pool for a connection string, creating it on first use.
+
+    Connections can't be shared with forked processes (such as crew worker
+    processes), so a process gets new pools rather than its parent's.
+
+    Args:
+        dsn: The PostgreSQL connection string
+
+    Returns:
+        The shared connection pool
+    """
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None or pool.pid != os.getpid() or pool.closed:
+            pool = _pools[dsn] = PostgresConnectionPool(dsn)
+        return pool
+
+
+def close_connection_pools() -> None:
+    """Close all pools of this process, e.g. on shutdown."""
+    with _pools_lock:
+        pools = [pool for pool in _pools.values() if pool.pid == os.getpid()]
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,213 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .storage_factory import StorageFactory
+
+# Backend used for cached extractions ("json" or "postgres")
+EXTRACTION_CACHE_STORAGE = os.environ.get("EXTRACTION_CACHE_STORAGE", "json")
+
+# Cached results loaded per storage call when purging stale ones
+PURGE_BATCH_SIZE = 500
+
+# Number of file digests remembered by path, size and modification time
+DIGEST_MEMO_SIZE = int(os.environ.get("EXTRACTION_DIGEST_MEMO_SIZE", "1024"))
+
+# Suffix of the file next to an uploaded PDF that holds its SHA-256 digest,
+# written by the upload handler so the PDF isn't hashed a second time
+DIGEST_SUFFIX = ".sha256"
+
+# Key of the record holding the model and prompt version the cache was last purged for
+VERSION_KEY = "_cache_version"
+
+
+class ExtractionCache:
+    """Content-addressed cache of PDF extraction results.
+
+    Results are keyed by the SHA-256 of the PDF's content together with the
+    query, the model name and a version of the prompt templates. Changing the
+    model or the prompts therefore produces new keys, so stale results are
+    never returned; ``purge_stale`` removes them from storage, and
+    ``purge_if_changed`` does so once after each model or prompt change.
+    """
+
+    def __init__(self, storage: Any = None):
+        """Initialize the cache.
+
+        Args:
+            storage: Storage instance to keep results in; by default one is
+                created with StorageFactory according to EXTRACTION_CACHE_STORAGE
+        """
+        if storage is None:
+            if EXTRACTION_CACHE_STORAGE.lower() == "postgres":
+                storage = StorageFactory.create_storage("postgres", table_name="pdf_extraction_cache")
+            else:
+                storage = StorageFactory.create_storage("json", storage_dir="uploads/json/extractions")
+        self.storage = storage
+        self.hits = 0
+        self.misses = 0
+        self._digests: "OrderedDict[Tuple[str, int, float], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def file_digest(self, path: str, chunk_size: int = 1024 * 1024) -> str:
+        """Compute the SHA-256 digest of a file's content.
+
+        Digests are remembered by path, size and modification time so a file
+        is only read once while it is unchanged. A digest written next to
+        the file when it was uploaded is used instead of reading the file.
+
+        Args:
+            path: The path to the file
+            chunk_size: Number of bytes to read at a time
+
+        Returns:
+            The hex digest of the file's content
+        """
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        with self._lock:
+            digest = self._digests.get(memo_key)
+            if digest is not None:
+                self._digests.move_to_end(memo_key)
+                return digest
+
+        digest = self._read_digest_file(path, stat.st_mtime)
+        if digest is None:
+            hasher = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    hasher.update(chunk)
+            digest = hasher.hexdigest()
+        with self._lock:
+            self._digests[memo_key] = digest
+            while len(self._digests) > DIGEST_MEMO_SIZE:
+                self._digests.popitem(last=False)
+        return digest
+
+    @staticmethod
+    def _read_digest_file(path: str, mtime: float) -> Optional[str]:
+        """Read the digest stored next to a file, unless the file changed after it was written."""
+        digest_path = path + DIGEST_SUFFIX
+        try:
+            if os.stat(digest_path).st_mtime < mtime:
+                return None
+            with open(digest_path, "r") as f:
+                digest = f.read().strip()
+        except OSError:
+            return None
+        return digest if len(digest) == 64 else None
+
+    @staticmethod
+    def make_key(content_hash: str, query: Optional[str], model_name: str, prompt_version: str) -> str:
+        """Build the cache key for an extraction.
+
+        Args:
+            content_hash: SHA-256 digest of the PDF's content
+            query: The query the extraction focused on, if any
+            model_name: The model used for the extraction
+            prompt_version: Version of the prompt templates
+
+        Returns:
+            The cache key
+        """
+        parts = [content_hash, query or "", model_name, prompt_version]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, content_hash: str, query: Optional[str], model_name: str, prompt_version: str) -> Optional[str]:
+        """Look up a cached extraction.
+
+        Args:
+            content_hash: SHA-256 digest of the PDF's content
+            query: The query the extraction focused on, if any
+            model_name: The model used for the extraction
+            prompt_version: Version of the prompt templates
+
+        Returns:
+            The cached result, or None if there is none
+        """
+        record = self.storage.load(self.make_key(content_hash, query, model_name, prompt_version))
+        if (record is None or record.get("model_name") != model_name
+                or record.get("prompt_version") != prompt_version):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record["result"]
+
+    def put(self, content_hash: str, query: Optional[str], model_name: str, prompt_version: str, result: str) -> str:
+        """Store an extraction result.
+
+        Args:
+            content_hash: SHA-256 digest of the PDF's content
+            query: The query the extraction focused on, if any
+            model_name: The model used for the extraction
+            prompt_version: Version of the prompt templates
+            result: The extraction result
+
+        Returns:
+            The cache key the result was stored under
+        """
+        key = self.make_key(content_hash, query, model_name, prompt_version)
+        return self.storage.save({
+            "content_hash": content_hash,
+            "query": query,
+            "model_name": model_name,
+            "prompt_version": prompt_version,
+            "result": result,
+        }, key)
+
+    def purge_stale(self, model_name: str, prompt_version: str) -> int:
+        """Delete results produced by another model or prompt version.
+
+        Args:
+            model_name: The current model
+            prompt_version: The current prompt template version
+
+        Returns:
+            The number of deleted results
+        """
+        deleted = 0
+        keys = [key for key in self.storage.list_files() if key != VERSION_KEY]
+        for start in range(0, len(keys), PURGE_BATCH_SIZE):
+            for key, record in self.storage.load_many(keys[start:start + PURGE_BATCH_SIZE]).items():
+                if record.get("model_name") != model_name or record.get("prompt_version") != prompt_version:
+                    deleted += int(self.storage.delete(key))
+        return deleted
+
+    def purge_if_changed(self, model_name: str, prompt_version: str) -> int:
+        """Purge stale results if the model or prompt version changed since the last purge.
+
+        Args:
+            model_name: The current model
+            prompt_version: The current prompt template version
+
+        Returns:
+            The number of deleted results
+        """
+        marker = self.storage.load(VERSION_KEY)
+        if (marker is not None and marker.get("model_name") == model_name
+                and marker.get("prompt_version") == prompt_version):
+            return 0
+        deleted = self.purge_stale(model_name, prompt_version)
+        self.storage.save({"model_name": model_name, "prompt_version": prompt_version}, VERSION_KEY)
+        return deleted
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit and miss counts.
+
+        Returns:
+            Dictionary with hit and miss counts
+        """
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_extraction_cache: Optional[ExtractionCache] = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """Get the shared extraction cache, creating it on first use."""
+    global _extraction_cache
+    if _extraction_cache is None:
+        _extraction_cache = ExtractionCache()
+    return _extraction_cache
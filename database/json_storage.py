@@ -1,19 +1,100 @@
 import os
 import json
+import bisect
+import hashlib
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; the index is then never compacted automatically
+    fcntl = None
+
+try:
+    from .storage_codecs import get_codec, split_filename, codec_for_extension
+except ImportError:
+    # For testing or when imported from a different directory
+    from storage_codecs import get_codec, split_filename, codec_for_extension
+
+# Name of the index file kept in the storage directory
+INDEX_FILENAME = "_index.jsonl"
+
+# Lock file that serializes index compaction with other processes' appends
+INDEX_LOCK_FILENAME = "_index.lock"
+
+# The index is compacted once it has this many times more lines than stored
+# files (and at least JSON_INDEX_COMPACT_MIN_LINES lines)
+JSON_INDEX_COMPACT_FACTOR = float(os.environ.get("JSON_INDEX_COMPACT_FACTOR", "4"))
+JSON_INDEX_COMPACT_MIN_LINES = int(os.environ.get("JSON_INDEX_COMPACT_MIN_LINES", "1000"))
+
+# Codec new files are written with, e.g. "json", "json-pretty", "msgpack" or "msgpack+zstd"
+JSON_STORAGE_CODEC = os.environ.get("JSON_STORAGE_CODEC", "json")
 
 class JSONStorage:
-    """JSON-based storage implementation."""
+    """JSON-based storage implementation.
+    
+    Files are spread over 256 shard directories named after the first two
+    hex digits of a hash of the file ID, so no directory grows too large.
+    Every save and delete is also appended to an index file (one JSON line
+    per change, with the ID, creation time, size and path), which is read instead
+    of the directories to list files. Files are written to a temporary file
+    and renamed into place, so readers never see a partly written file.
     
-    def __init__(self, storage_dir: str = "uploads/json"):
+    Files are written with a codec: compact JSON by default, or
+    pretty-printed JSON, MessagePack, optionally compressed with gzip or
+    zstd. Each codec has its own file extension and files are read with
+    the codec matching their extension, so changing the codec leaves
+    existing files readable.
+    
+    Saving a file again or deleting it appends a line too, so the index is
+    compacted to one line per file whenever it has grown to several times
+    the number of files. Compaction holds an exclusive lock on a lock file,
+    and appends hold a shared one, so no process's changes are lost.
+    
+    Files saved by earlier versions directly in the storage directory are
+    still read, and are indexed the first time the directory is opened.
+    """
+    
+    def __init__(self, storage_dir: str = "uploads/json", codec: str = JSON_STORAGE_CODEC):
         """Initialize the JSON storage.
         
         Args:
             storage_dir: The directory to store JSON files in
+            codec: Codec new files are written with (see database/storage_codecs.py)
         """
         self.storage_dir = storage_dir
+        self.codec = get_codec(codec)
         os.makedirs(storage_dir, exist_ok=True)
+        self.index_path = os.path.join(storage_dir, INDEX_FILENAME)
+        self.lock_path = os.path.join(storage_dir, INDEX_LOCK_FILENAME)
+        self._lock_file = None
+        self._lock = threading.Lock()
+        # File ID -> (created_at, size, path relative to the storage directory) of the indexed files
+        self._entries: Dict[str, Tuple[str, int, str]] = {}
+        # (created_at, file ID) of the indexed files, oldest first
+        self._by_time: List[Tuple[str, str]] = []
+        # How far the index file has been read; other processes may append to it
+        self._index_offset = 0
+        self._index_inode: Optional[int] = None
+        self._index_loaded = False
+        # Lines read from the index file, live or superseded
+        self._index_lines = 0
+    
+    def _relative_path(self, file_id: str) -> str:
+        """Get the path of a file written with this storage's codec, relative to the storage directory."""
+        shard = hashlib.md5(file_id.encode("utf-8")).hexdigest()[:2]
+        return os.path.join(shard, f"{file_id}{self.codec.extension}")
+    
+    def _read(self, relative_path: str) -> Any:
+        """Read a file with the codec matching its extension."""
+        split = split_filename(os.path.basename(relative_path))
+        if split is None:
+            raise ValueError(f"Not a stored file: {relative_path}")
+        with open(os.path.join(self.storage_dir, relative_path), "rb") as f:
+            return codec_for_extension(split[1]).decode(f.read())
     
     def save(self, data: Dict[str, Any], file_id: Optional[str] = None) -> str:
         """Save data to a JSON file.
@@ -21,7 +102,7 @@ class JSONStorage:
         Args:
             data: The data to save
             file_id: Optional file ID to use for the filename
-            
+        
         Returns:
             The ID of the saved file
         """
@@ -36,10 +117,37 @@ class JSONStorage:
             "updated_at": datetime.now().isoformat()
         }
         
-        # Save to file
-        file_path = os.path.join(self.storage_dir, f"{file_id}.json")
-        with open(file_path, "w") as f:
-            json.dump(data, f, indent=2)
+        # Write to a temporary file and rename it into place
+        relative_path = self._relative_path(file_id)
+        file_path = os.path.join(self.storage_dir, relative_path)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        payload = self.codec.encode(data)
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        with self._lock:
+            self._refresh_index()
+            previous = self._entries.get(file_id)
+            # Like the PostgreSQL storage, keep the time the file was first created
+            created_at = previous[0] if previous else data["_metadata"]["created_at"]
+            self._append_index({"id": file_id, "created_at": created_at, "size": len(payload),
+                                "path": relative_path})
+        
+        # Remove the file's previous version if it was written with another
+        # codec or before files were sharded
+        if previous is not None:
+            for previous_path in {previous[2], f"{file_id}.json"} - {relative_path}:
+                try:
+                    os.remove(os.path.join(self.storage_dir, previous_path))
+                except FileNotFoundError:
+                    pass
         
         return file_id
     
@@ -48,41 +156,261 @@ class JSONStorage:
         
         Args:
             file_id: The ID of the file to load
-            
+        
         Returns:
             The loaded data, or None if the file doesn't exist
         """
-        file_path = os.path.join(self.storage_dir, f"{file_id}.json")
-        if not os.path.exists(file_path):
+        try:
+            return self._read(self._relative_path(file_id))
+        except FileNotFoundError:
+            pass
+        
+        # Written with another codec or before files were sharded
+        with self._lock:
+            self._refresh_index()
+            entry = self._entries.get(file_id)
+        if entry is None:
             return None
+        # Index entries from before codecs existed don't record flat files' paths
+        for relative_path in (entry[2], f"{file_id}.json"):
+            try:
+                return self._read(relative_path)
+            except FileNotFoundError:
+                continue
+        return None
+    
+    def save_many(self, records: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Save a batch of records, one file each.
+        
+        Args:
+            records: The data to save, by file ID
+        
+        Returns:
+            The IDs of the saved files
+        """
+        return [self.save(data, file_id) for file_id, data in records.items()]
+    
+    def load_many(self, file_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Load a batch of files.
+        
+        Args:
+            file_ids: The IDs of the files to load
         
-        with open(file_path, "r") as f:
-            return json.load(f)
+        Returns:
+            The loaded data by file ID; files that don't exist are left out
+        """
+        loaded = {}
+        for file_id in file_ids:
+            data = self.load(file_id)
+            if data is not None:
+                loaded[file_id] = data
+        return loaded
     
-    def list_files(self) -> List[str]:
-        """List all JSON files in the storage directory.
+    def list_files(self, since: Optional[str] = None, until: Optional[str] = None,
+                   limit: Optional[int] = None) -> List[str]:
+        """List the stored files, newest first, from the index.
+        
+        Args:
+            since: Only files created at or after this ISO timestamp
+            until: Only files created before this ISO timestamp
+            limit: Maximum number of file IDs to return
         
         Returns:
             A list of file IDs
         """
-        files = []
-        for filename in os.listdir(self.storage_dir):
-            if filename.endswith(".json"):
-                files.append(filename[:-5])  # Remove .json extension
-        return files
+        with self._lock:
+            self._refresh_index()
+            lo = bisect.bisect_left(self._by_time, (since,)) if since else 0
+            hi = bisect.bisect_left(self._by_time, (until,)) if until else len(self._by_time)
+            if limit is not None:
+                lo = max(lo, hi - limit)
+            return [file_id for _, file_id in reversed(self._by_time[lo:hi])]
+    
+    def stat(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Get a file's index entry without reading the file.
+        
+        Args:
+            file_id: The ID of the file
+        
+        Returns:
+            Dictionary with the creation time, size in bytes and path relative
+            to the storage directory, or None if the file isn't stored
+        """
+        with self._lock:
+            self._refresh_index()
+            entry = self._entries.get(file_id)
+        if entry is None:
+            return None
+        return {"id": file_id, "created_at": entry[0], "size": entry[1], "path": entry[2]}
     
     def delete(self, file_id: str) -> bool:
         """Delete a JSON file.
         
         Args:
             file_id: The ID of the file to delete
-            
+        
         Returns:
             True if the file was deleted, False otherwise
         """
-        file_path = os.path.join(self.storage_dir, f"{file_id}.json")
-        if not os.path.exists(file_path):
-            return False
+        with self._lock:
+            self._refresh_index()
+            entry = self._entries.get(file_id)
+        
+        deleted = False
+        paths = {self._relative_path(file_id), f"{file_id}.json"}
+        if entry is not None:
+            paths.add(entry[2])
+        for relative_path in paths:
+            try:
+                os.remove(os.path.join(self.storage_dir, relative_path))
+                deleted = True
+            except FileNotFoundError:
+                pass
         
-        os.remove(file_path)
-        return True
\ No newline at end of file
+        with self._lock:
+            self._refresh_index()
+            if deleted or file_id in self._entries:
+                self._append_index({"id": file_id, "deleted": True})
+        return deleted
+    
+    def compact_index(self) -> None:
+        """Rewrite the index with one line per stored file.
+        
+        This happens automatically as the index grows. Where file locks
+        aren't available (Windows), it only happens when called, and must
+        not be called while other processes write to the same directory;
+        their changes could be lost.
+        """
+        with self._lock:
+            self._compact()
+    
+    def _compact(self) -> None:
+        """Rewrite the index under the exclusive index lock. Callers hold the lock."""
+        with self._index_file_lock(exclusive=True):
+            self._refresh_index()
+            lines = [
+                json.dumps({"id": file_id, "created_at": created_at, "size": self._entries[file_id][1],
+                            "path": self._entries[file_id][2]})
+                for created_at, file_id in self._by_time
+            ]
+            self._write_index(lines)
+    
+    def _maybe_compact(self) -> None:
+        """Compact the index if it has grown well past the number of files. Callers hold the lock."""
+        if fcntl is None:
+            return
+        if self._index_lines > max(JSON_INDEX_COMPACT_MIN_LINES, JSON_INDEX_COMPACT_FACTOR * len(self._entries)):
+            self._compact()
+    
+    @contextmanager
+    def _index_file_lock(self, exclusive: bool) -> Iterator[None]:
+        """Hold the index lock file: shared to append, exclusive to replace the index."""
+        if fcntl is None:
+            yield
+            return
+        if self._lock_file is None:
+            self._lock_file = open(self.lock_path, "a")
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+    
+    def _apply(self, entry: Dict[str, Any]) -> None:
+        """Apply one index line to the in-memory index. Callers hold the lock."""
+        file_id = entry["id"]
+        previous = self._entries.pop(file_id, None)
+        if previous is not None:
+            position = bisect.bisect_left(self._by_time, (previous[0], file_id))
+            if position < len(self._by_time) and self._by_time[position] == (previous[0], file_id):
+                del self._by_time[position]
+        if not entry.get("deleted"):
+            created_at = entry["created_at"]
+            # Entries written before codecs existed have no path
+            path = entry.get("path") or os.path.join(
+                hashlib.md5(file_id.encode("utf-8")).hexdigest()[:2], f"{file_id}.json"
+            )
+            self._entries[file_id] = (created_at, entry.get("size", 0), path)
+            bisect.insort(self._by_time, (created_at, file_id))
+    
+    def _append_index(self, entry: Dict[str, Any]) -> None:
+        """Append a change to the index file and apply it. Callers hold the lock."""
+        # A single append is atomic, so other processes' lines don't interleave;
+        # the shared lock keeps compaction from replacing the file meanwhile
+        with self._index_file_lock(exclusive=False):
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        # Read it back with anything other processes appended before it
+        self._refresh_index()
+        self._maybe_compact()
+    
+    def _refresh_index(self) -> None:
+        """Read index lines appended since the last read. Callers hold the lock."""
+        first_read = not self._index_loaded
+        if first_read:
+            self._index_loaded = True
+            if not os.path.exists(self.index_path):
+                with self._index_file_lock(exclusive=True):
+                    # Another process may have built it in the meantime
+                    if not os.path.exists(self.index_path):
+                        self._rebuild_index()
+                        return
+        try:
+            with open(self.index_path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self._index_inode or stat.st_size < self._index_offset:
+                    # The index was replaced (e.g. compacted); read it from the start
+                    self._entries.clear()
+                    self._by_time.clear()
+                    self._index_offset = 0
+                    self._index_lines = 0
+                    self._index_inode = stat.st_ino
+                f.seek(self._index_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # Leave a line that is still being written for the next read
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+                self._index_lines += 1
+        self._index_offset += end
+        if first_read:
+            # An index left large by earlier runs is compacted when the directory is opened
+            self._maybe_compact()
+    
+    def _rebuild_index(self) -> None:
+        """Index the files already in the directory, e.g. files saved before the index existed."""
+        lines = []
+        with os.scandir(self.storage_dir) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    lines.append(self._scan_entry(entry, ""))
+                elif entry.is_dir() and len(entry.name) == 2 and all(c in "0123456789abcdef" for c in entry.name):
+                    with os.scandir(entry.path) as shard:
+                        lines.extend(self._scan_entry(item, entry.name) for item in shard if item.is_file())
+        self._write_index([line for line in lines if line is not None])
+    
+    @staticmethod
+    def _scan_entry(entry: os.DirEntry, shard: str) -> Optional[str]:
+        """Build an index line for a file found on disk, using its modification time."""
+        split = split_filename(entry.name)
+        if split is None:
+            return None
+        stat = entry.stat()
+        created_at = datetime.fromtimestamp(stat.st_mtime).isoformat()
+        return json.dumps({"id": split[0], "created_at": created_at, "size": stat.st_size,
+                           "path": os.path.join(shard, entry.name)})
+    
+    def _write_index(self, lines: List[str]) -> None:
+        """Replace the index file with the given lines and reload it. Callers hold the lock."""
+        tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.writelines(line + "\n" for line in lines)
+        os.replace(tmp_path, self.index_path)
+        self._entries.clear()
+        self._by_time.clear()
+        self._index_offset = 0
+        self._index_lines = 0
+        self._refresh_index()
@@ -5,25 +5,44 @@ from typing import Dict, Any, Optional, List
 
 try:
     import psycopg2
-    from psycopg2.extras import Json
+    from psycopg2.extras import Json, execute_values
 except ImportError:
     # Define a placeholder class if psycopg2 is not installed
     class Json:
         def __init__(self, obj):
             self.obj = obj
 
+try:
+    from .connection_pool import get_connection_pool
+except ImportError:
+    # For testing or when imported from a different directory
+    from connection_pool import get_connection_pool
+
+# Rows per multi-row INSERT statement in save_many
+POSTGRES_BATCH_SIZE = int(os.environ.get("POSTGRES_BATCH_SIZE", "1000"))
+
 class PostgresStorage:
-    """PostgreSQL-based storage implementation."""
+    """PostgreSQL-based storage implementation.
+    
+    Connections come from a pool shared by all storages using the same
+    connection string, so operations don't pay for a new connection each.
+    """
     
-    def __init__(self, connection_string: Optional[str] = None, table_name: str = "pdf_extractions"):
+    def __init__(self, connection_string: Optional[str] = None, table_name: str = "pdf_extractions",
+                 pool: Any = None):
         """Initialize the PostgreSQL storage.
         
         Args:
             connection_string: The PostgreSQL connection string
             table_name: The name of the table to store data in
+            pool: Connection pool to use; defaults to the process-wide pool
+                for the connection string
         """
         self.connection_string = connection_string or os.environ.get("POSTGRES_CONNECTION_STRING")
         self.table_name = table_name
+        self.pool = pool
+        if self.pool is None and self.connection_string:
+            self.pool = get_connection_pool(self.connection_string)
         
         # Create table if it doesn't exist
         self._create_table_if_not_exists()
@@ -35,22 +54,18 @@ class PostgresStorage:
             return
         
         try:
-            conn = psycopg2.connect(self.connection_string)
-            cursor = conn.cursor()
-            
-            # Create table
-            cursor.execute(f"""
-                CREATE TABLE IF NOT EXISTS {self.table_name} (
-                    id VARCHAR(255) PRIMARY KEY,
-                    data JSONB NOT NULL,
-                    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
-                    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
-                )
-            """)
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    # Create table
+                    cursor.execute(f"""
+                        CREATE TABLE IF NOT EXISTS {self.table_name} (
+                            id VARCHAR(255) PRIMARY KEY,
+                            data JSONB NOT NULL,
+                            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+                            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+                        )
+                    """)
+                conn.commit()
         except Exception as e:
             print(f"Error creating table: {str(e)}")
     
@@ -79,34 +94,58 @@ class PostgresStorage:
         }
         
         try:
-            conn = psycopg2.connect(self.connection_string)
-            cursor = conn.cursor()
-            
-            # Check if record exists
-            cursor.execute(f"SELECT id FROM {self.table_name} WHERE id = %s", (file_id,))
-            exists = cursor.fetchone() is not None
-            
-            if exists:
-                # Update existing record
-                cursor.execute(
-                    f"UPDATE {self.table_name} SET data = %s, updated_at = NOW() WHERE id = %s",
-                    (Json(data), file_id)
-                )
-            else:
-                # Insert new record
-                cursor.execute(
-                    f"INSERT INTO {self.table_name} (id, data, created_at, updated_at) VALUES (%s, %s, NOW(), NOW())",
-                    (file_id, Json(data))
-                )
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    # Insert the record, or update it if it exists, in one statement
+                    cursor.execute(self._upsert_sql("(%s, %s, NOW(), NOW())"), (file_id, Json(data)))
+                conn.commit()
             
             return file_id
         except Exception as e:
             raise Exception(f"Error saving to PostgreSQL: {str(e)}")
     
+    def save_many(self, records: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Save a batch of records in one transaction.
+        
+        Records are written with multi-row upserts of up to
+        POSTGRES_BATCH_SIZE rows, so a batch takes one round-trip per
+        POSTGRES_BATCH_SIZE records instead of one or two per record.
+        
+        Args:
+            records: The data to save, by record ID
+            
+        Returns:
+            The IDs of the saved records
+        """
+        if not self.connection_string:
+            raise ValueError("PostgreSQL connection string not provided")
+        if not records:
+            return []
+        
+        now = datetime.now().isoformat()
+        rows = []
+        for file_id, data in records.items():
+            data["_metadata"] = {"id": file_id, "created_at": now, "updated_at": now}
+            rows.append((file_id, Json(data)))
+        
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    execute_values(cursor, self._upsert_sql("%s"), rows,
+                                   template="(%s, %s, NOW(), NOW())", page_size=POSTGRES_BATCH_SIZE)
+                conn.commit()
+            
+            return list(records)
+        except Exception as e:
+            raise Exception(f"Error saving batch to PostgreSQL: {str(e)}")
+    
+    def _upsert_sql(self, values: str) -> str:
+        """Build the insert-or-update statement for the given VALUES clause."""
+        return (
+            f"INSERT INTO {self.table_name} (id, data, created_at, updated_at) VALUES {values} "
+            f"ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, updated_at = NOW()"
+        )
+    
     def load(self, file_id: str) -> Optional[Dict[str, Any]]:
         """Load data from PostgreSQL.
         
@@ -120,15 +159,11 @@ class PostgresStorage:
             raise ValueError("PostgreSQL connection string not provided")
         
         try:
-            conn = psycopg2.connect(self.connection_string)
-            cursor = conn.cursor()
-            
-            # Query record
-            cursor.execute(f"SELECT data FROM {self.table_name} WHERE id = %s", (file_id,))
-            result = cursor.fetchone()
-            
-            cursor.close()
-            conn.close()
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    # Query record
+                    cursor.execute(f"SELECT data FROM {self.table_name} WHERE id = %s", (file_id,))
+                    result = cursor.fetchone()
             
             if result is None:
                 return None
@@ -137,6 +172,30 @@ class PostgresStorage:
         except Exception as e:
             raise Exception(f"Error loading from PostgreSQL: {str(e)}")
     
+    def load_many(self, file_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Load a batch of records with a single query.
+        
+        Args:
+            file_ids: The IDs of the records to load
+            
+        Returns:
+            The loaded data by record ID; records that don't exist are left out
+        """
+        if not self.connection_string:
+            raise ValueError("PostgreSQL connection string not provided")
+        if not file_ids:
+            return {}
+        
+        try:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SELECT id, data FROM {self.table_name} WHERE id = ANY(%s)", (list(file_ids),))
+                    result = cursor.fetchall()
+            
+            return {row[0]: row[1] for row in result}
+        except Exception as e:
+            raise Exception(f"Error loading batch from PostgreSQL: {str(e)}")
+    
     def list_files(self) -> List[str]:
         """List all records in the table.
         
@@ -147,15 +206,11 @@ class PostgresStorage:
             raise ValueError("PostgreSQL connection string not provided")
         
         try:
-            conn = psycopg2.connect(self.connection_string)
-            cursor = conn.cursor()
-            
-            # Query all IDs
-            cursor.execute(f"SELECT id FROM {self.table_name} ORDER BY created_at DESC")
-            result = cursor.fetchall()
-            
-            cursor.close()
-            conn.close()
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    # Query all IDs
+                    cursor.execute(f"SELECT id FROM {self.table_name} ORDER BY created_at DESC")
+                    result = cursor.fetchall()
             
             return [row[0] for row in result]
         except Exception as e:
@@ -174,16 +229,12 @@ class PostgresStorage:
             raise ValueError("PostgreSQL connection string not provided")
         
         try:
-            conn = psycopg2.connect(self.connection_string)
-            cursor = conn.cursor()
-            
-            # Delete record
-            cursor.execute(f"DELETE FROM {self.table_name} WHERE id = %s", (file_id,))
-            deleted = cursor.rowcount > 0
-            
-            conn.commit()
-            cursor.close()
-            conn.close()
+            with self.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    # Delete record
+                    cursor.execute(f"DELETE FROM {self.table_name} WHERE id = %s", (file_id,))
+                    deleted = cursor.rowcount > 0
+                conn.commit()
             
             return deleted
         except Exception as e:
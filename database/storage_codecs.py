@@ -0,0 +1,176 @@
+import gzip
+import json
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# gzip level used for stored files; favors speed, as zstd does by default
+GZIP_LEVEL = 6
+
+# zstd level used for stored files
+ZSTD_LEVEL = 3
+
+
+def _json_pretty_encode(data: Any) -> bytes:
+    return json.dumps(data, indent=2).encode("utf-8")
+
+
+def _json_encode(data: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def _json_decode(payload: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def _msgpack_encode(data: Any) -> bytes:
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def _msgpack_decode(payload: bytes) -> Any:
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+
+
+def _zstd_compress(payload: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(payload)
+
+
+def _zstd_decompress(payload: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(payload)
+
+
+# Serializer name -> (file extension, encode, decode, module it needs)
+SERIALIZERS: Dict[str, Tuple[str, Callable[[Any], bytes], Callable[[bytes], Any], Optional[str]]] = {
+    "json-pretty": (".json", _json_pretty_encode, _json_decode, None),
+    "json": (".json", _json_encode, _json_decode, None),
+    "msgpack": (".msgpack", _msgpack_encode, _msgpack_decode, "msgpack"),
+}
+
+# Compression name -> (file extension suffix, compress, decompress, module it needs)
+COMPRESSIONS: Dict[str, Tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes], Optional[str]]] = {
+    "gzip": (".gz", lambda payload: gzip.compress(payload, GZIP_LEVEL), gzip.decompress, None),
+    "zstd": (".zst", _zstd_compress, _zstd_decompress, "zstandard"),
+}
+
+_MODULES = {"msgpack": msgpack, "zstandard": zstandard}
+
+
+class Codec:
+    """Serialization format (plus optional compression) of stored files.
+
+    A codec is named by a spec like ``"json"``, ``"msgpack"`` or
+    ``"msgpack+zstd"``. Each codec writes files with its own extension, so
+    the codec of an existing file follows from its name.
+    """
+
+    def __init__(self, spec: str):
+        """Initialize the codec.
+
+        Args:
+            spec: The serializer name, optionally followed by "+" and a compression name
+
+        Raises:
+            ValueError: If the serializer or compression is unknown
+            ImportError: If a package the codec needs is not installed
+        """
+        serializer, _, compression = spec.lower().partition("+")
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown serializer: {serializer}")
+        if compression and compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+
+        self.spec = spec.lower()
+        self.extension, self._encode, self._decode, module = SERIALIZERS[serializer]
+        self._compress = self._decompress = None
+        required = [module]
+        if compression:
+            suffix, self._compress, self._decompress, compression_module = COMPRESSIONS[compression]
+            self.extension += suffix
+            required.append(compression_module)
+        for name in required:
+            if name is not None and _MODULES[name] is None:
+                raise ImportError(f"The {self.spec} codec needs the {name} package (pip install {name})")
+
+    def encode(self, data: Any) -> bytes:
+        """Serialize (and compress) data for a file."""
+        payload = self._encode(data)
+        return self._compress(payload) if self._compress else payload
+
+    def decode(self, payload: bytes) -> Any:
+        """Decode the content of a file written with this codec."""
+        if self._decompress:
+            payload = self._decompress(payload)
+        return self._decode(payload)
+
+
+# Extension -> codec that reads it; JSON files, pretty-printed or not, read the same way
+_READERS: Dict[str, str] = {
+    SERIALIZERS[serializer][0] + (COMPRESSIONS[compression][0] if compression else ""):
+        serializer + (f"+{compression}" if compression else "")
+    for serializer in ("json", "msgpack")
+    for compression in ("", "gzip", "zstd")
+}
+
+# Longest first, so ".json.gz" matches before ".json"
+EXTENSIONS = tuple(sorted(_READERS, key=len, reverse=True))
+
+_codecs: Dict[str, Codec] = {}
+
+
+def get_codec(spec: str) -> Codec:
+    """Get the codec for a spec, creating it on first use.
+
+    Args:
+        spec: The codec spec, e.g. "json" or "msgpack+zstd"
+
+    Returns:
+        The codec
+    """
+    codec = _codecs.get(spec)
+    if codec is None:
+        codec = _codecs[spec] = Codec(spec)
+    return codec
+
+
+def split_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """Split a stored file's name into its ID and extension.
+
+    Args:
+        filename: The file name
+
+    Returns:
+        Tuple of the file ID and the extension, or None if the file isn't a stored file
+    """
+    for extension in EXTENSIONS:
+        if filename.endswith(extension) and len(filename) > len(extension):
+            return filename[:-len(extension)], extension
+    return None
+
+
+def codec_for_extension(extension: str) -> Codec:
+    """Get the codec that reads files with an extension.
+
+    Args:
+        extension: The file extension, e.g. ".msgpack.zst"
+
+    Returns:
+        The codec
+    """
+    return get_codec(_READERS[extension])
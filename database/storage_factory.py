@@ -7,11 +7,15 @@ from datetime import datetime
 try:
     from .json_storage import JSONStorage
     from .postgres_storage import PostgresStorage
+    from .async_json_storage import AsyncJSONStorage
+    from .async_postgres_storage import AsyncPostgresStorage
 except ImportError:
     # For testing or when imported from a different directory
     try:
         from json_storage import JSONStorage
         from postgres_storage import PostgresStorage
+        from async_json_storage import AsyncJSONStorage
+        from async_postgres_storage import AsyncPostgresStorage
     except ImportError:
         # Define placeholder classes if imports fail
         class JSONStorage:
@@ -33,25 +37,32 @@ except ImportError:
             
             def load(self, *args, **kwargs):
                 pass
+        
+        AsyncJSONStorage = JSONStorage
+        AsyncPostgresStorage = PostgresStorage
 
 class StorageFactory:
     """Factory for creating storage instances."""
     
     @staticmethod
-    def create_storage(storage_type: str = "json", **kwargs) -> Union[JSONStorage, PostgresStorage]:
+    def create_storage(storage_type: str = "json", async_: bool = False,
+                       **kwargs) -> Union[JSONStorage, PostgresStorage, AsyncJSONStorage, AsyncPostgresStorage]:
         """Create a storage instance of the specified type.
         
         Args:
             storage_type: The type of storage to create ("json" or "postgres")
-            **kwargs: Additional arguments to pass to the storage constructor
+            async_: Create the async variant, whose methods are coroutines that
+                don't block the event loop (for use in FastAPI handlers)
+            **kwargs: Additional arguments to pass to the storage constructor,
+                e.g. codec="msgpack+zstd" for JSON storage
             
         Returns:
             A storage instance of the specified type
         """
         if storage_type.lower() == "json":
-            return JSONStorage(**kwargs)
+            return AsyncJSONStorage(**kwargs) if async_ else JSONStorage(**kwargs)
         elif storage_type.lower() == "postgres":
-            return PostgresStorage(**kwargs)
+            return AsyncPostgresStorage(**kwargs) if async_ else PostgresStorage(**kwargs)
         else:
             raise ValueError(f"Unknown storage type: {storage_type}")
 
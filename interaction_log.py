@@ -0,0 +1,232 @@
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Maximum number of interactions kept per task; older ones are discarded
+INTERACTION_LOG_SIZE = int(os.environ.get("INTERACTION_LOG_SIZE", "5000"))
+
+# Names of the actor and detail fields of each interaction type
+INTERACTION_FIELDS: Dict[str, Tuple[Optional[str], Optional[str]]] = {
+    "agent_start": ("agent", "task"),
+    "agent_finish": ("agent", "output"),
+    "agent_error": ("agent", "error"),
+    "agent_step": ("agent", "step"),
+    "crew_start": ("crew", None),
+    "crew_finish": ("crew", "output"),
+    "crew_error": ("crew", "error"),
+    "subtask_start": ("agent", "task"),
+    "subtask_finish": ("agent", "output"),
+    "subtask_error": ("agent", "error"),
+    "task_complete": (None, "output"),
+    "llm_delta": ("agent", "delta"),
+}
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Offset from the monotonic clock to wall-clock time, used to format timestamps
+_WALL_CLOCK_OFFSET = time.time() - time.monotonic()
+
+_last_formatted: Tuple[int, str] = (-1, "")
+
+
+def format_timestamp(monotonic_ts: float) -> str:
+    """Format a monotonic timestamp as local wall-clock time.
+
+    Consecutive events usually fall in the same second, so the last
+    formatted second is reused.
+
+    Args:
+        monotonic_ts: A time.monotonic() value
+
+    Returns:
+        The timestamp formatted like the rest of the task information
+    """
+    global _last_formatted
+    second = int(monotonic_ts + _WALL_CLOCK_OFFSET)
+    cached_second, formatted = _last_formatted
+    if second != cached_second:
+        formatted = datetime.fromtimestamp(second).strftime(TIMESTAMP_FORMAT)
+        _last_formatted = (second, formatted)
+    return formatted
+
+
+def parse_timestamp(value: str) -> float:
+    """Convert a formatted timestamp back to a monotonic timestamp.
+
+    Args:
+        value: A timestamp produced by format_timestamp
+
+    Returns:
+        The corresponding time.monotonic() value
+    """
+    return datetime.strptime(value, TIMESTAMP_FORMAT).timestamp() - _WALL_CLOCK_OFFSET
+
+
+class Interaction:
+    """A compact record of one agent interaction.
+
+    Interactions keep a monotonic timestamp and only become dictionaries
+    with a formatted timestamp when they are sent to a client or stored.
+    The sequence number is assigned when the interaction is added to a
+    task's InteractionLog. An interaction whose detail was already sent in
+    another form (e.g. streamed as llm_delta interactions) has no detail
+    and a ``ref`` naming where it went instead.
+    """
+
+    __slots__ = ("type", "actor", "detail", "ts", "seq", "ref")
+
+    def __init__(self, type: str, actor: Optional[str] = None, detail: Optional[str] = None,
+                 ts: Optional[float] = None, seq: Optional[int] = None, ref: Optional[str] = None):
+        """Initialize the interaction.
+
+        Args:
+            type: The interaction type, e.g. "agent_start"
+            actor: The agent role or crew name, if the type has one
+            detail: The task, output, error or step text, if the type has one
+            ts: Monotonic timestamp; defaults to now
+            seq: Sequence number within the task, if already assigned
+            ref: Where the detail was sent instead ("stream" or "result"), if anywhere
+        """
+        self.type = type
+        self.actor = sys.intern(actor) if actor is not None else None
+        self.detail = detail
+        self.ts = time.monotonic() if ts is None else ts
+        self.seq = seq
+        self.ref = ref
+
+    def __reduce__(self):
+        return (Interaction, (self.type, self.actor, self.detail, self.ts, self.seq, self.ref))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the interaction to the dictionary sent to clients.
+
+        Returns:
+            Dictionary with the type, the type's fields, the formatted
+            timestamp and the sequence number
+        """
+        actor_field, detail_field = INTERACTION_FIELDS.get(self.type, ("agent", "detail"))
+        data: Dict[str, Any] = {"type": self.type}
+        if actor_field is not None:
+            data[actor_field] = self.actor
+        if detail_field is not None:
+            if self.ref is not None:
+                data[f"{detail_field}_ref"] = self.ref
+            else:
+                data[detail_field] = self.detail
+        data["timestamp"] = format_timestamp(self.ts)
+        if self.seq is not None:
+            data["seq"] = self.seq
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Interaction":
+        """Rebuild an interaction from a dictionary produced by to_dict.
+
+        Args:
+            data: The interaction dictionary
+
+        Returns:
+            The interaction
+        """
+        actor_field, detail_field = INTERACTION_FIELDS.get(data.get("type"), ("agent", "detail"))
+        timestamp = data.get("timestamp")
+        return cls(
+            data.get("type"),
+            data.get(actor_field) if actor_field else None,
+            data.get(detail_field) if detail_field else None,
+            parse_timestamp(timestamp) if timestamp else None,
+            data.get("seq"),
+            data.get(f"{detail_field}_ref") if detail_field else None,
+        )
+
+
+class InteractionLog:
+    """Ring buffer of a task's interactions.
+
+    Every appended interaction gets the task's next sequence number,
+    starting at 1. Holds at most ``max_size`` interactions; once full, the
+    oldest ones are discarded and counted in ``discarded``. The retained
+    interactions always have consecutive sequence numbers.
+    """
+
+    __slots__ = ("records", "discarded", "next_seq")
+
+    def __init__(self, max_size: int = INTERACTION_LOG_SIZE):
+        """Initialize the log.
+
+        Args:
+            max_size: Maximum number of interactions to keep
+        """
+        self.records: deque = deque(maxlen=max(1, max_size))
+        self.discarded = 0
+        self.next_seq = 1
+
+    def append(self, interaction: Interaction) -> int:
+        """Add an interaction, discarding the oldest one if the log is full.
+
+        Args:
+            interaction: The interaction to add
+
+        Returns:
+            The sequence number assigned to the interaction
+        """
+        if len(self.records) == self.records.maxlen:
+            self.discarded += 1
+        interaction.seq = self.next_seq
+        self.next_seq += 1
+        self.records.append(interaction)
+        return interaction.seq
+
+    def since(self, last_seq: int) -> Tuple[List[Interaction], int]:
+        """Get the interactions after a sequence number.
+
+        Args:
+            last_seq: The last sequence number the caller has seen
+
+        Returns:
+            Tuple of the retained interactions with a higher sequence number,
+            oldest first, and how many interactions after ``last_seq`` were
+            already discarded
+        """
+        if not self.records:
+            return [], 0
+        first_seq = self.records[0].seq
+        missed = max(0, first_seq - last_seq - 1)
+        return list(islice(self.records, max(0, last_seq - first_seq + 1), None)), missed
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self) -> Iterator[Interaction]:
+        return iter(self.records)
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        """Convert the log to a list of dictionaries, e.g. for storage.
+
+        Returns:
+            The interactions as dictionaries, oldest first
+        """
+        return [interaction.to_dict() for interaction in self.records]
+
+    @classmethod
+    def from_dicts(cls, items: List[Dict[str, Any]], max_size: int = INTERACTION_LOG_SIZE) -> "InteractionLog":
+        """Rebuild a log from dictionaries produced by to_dicts.
+
+        Args:
+            items: The interactions as dictionaries
+            max_size: Maximum number of interactions to keep
+
+        Returns:
+            The interaction log
+        """
+        log = cls(max_size)
+        if items:
+            # Keep the original sequence numbers
+            log.next_seq = items[0].get("seq") or 1
+        for item in items:
+            log.append(Interaction.from_dict(item))
+        return log
@@ -1,20 +1,25 @@
 import argparse
+import json
 import os
 import uuid
 import requests
 from typing import Dict, List, Set, Any
-from crew_setup import create_crew, run_crew
+from crew_setup import run_crew_job, OLLAMA_API_BASE
 from check_crewai_version import check_crewai_version
 
 # For CLI mode
-def run_cli():
-    """Run the application in CLI mode."""
+def run_cli(profile: bool = False):
+    """Run the application in CLI mode.
+    
+    Args:
+        profile: Profile the crew run and write the profile to the profiles directory
+    """
     print("CrewAI Multi-Agent System - CLI Mode")
     print("==================================")
     
     # Check if Ollama server is running
     try:
-        response = requests.get("http://localhost:11434/api/tags")
+        response = requests.get(f"{OLLAMA_API_BASE}/api/tags")
         if response.status_code == 200:
             print("Ollama server is running. Available models:")
             models = response.json().get("models", [])
@@ -23,7 +28,7 @@ def run_cli():
         else:
             print("Ollama server is running but returned an unexpected response.")
     except requests.exceptions.ConnectionError:
-        print("Warning: Could not connect to Ollama server at http://localhost:11434.")
+        print(f"Warning: Could not connect to Ollama server at {OLLAMA_API_BASE}.")
         print("Make sure Ollama is running before proceeding.")
         proceed = input("Do you want to proceed anyway? (y/n): ").lower()
         if proceed != 'y':
@@ -60,15 +65,46 @@ def run_cli():
     task_id = str(uuid.uuid4())
     
     # Create and run the crew
-    print(f"\nCreating crew for task {task_id}...")
-    crew = create_crew(task_id, topic, pdf_paths)
-    
-    print("\nRunning crew...")
-    result = run_crew(crew, task_id)
+    print(f"\nRunning crew for task {task_id}...")
+    outcome = run_crew_job(task_id, topic, pdf_paths, profile=profile)
     
     print("\nResult:")
     print("=======\n")
-    print(result)
+    print(outcome["result"])
+    
+    print("\nToken usage:")
+    for model, usage in outcome["token_usage"]["models"].items():
+        print(f"- {model}: {usage['calls']} calls, {usage['prompt_tokens']} prompt tokens "
+              f"(max {usage['max_prompt_tokens']}), {usage['completion_tokens']} completion tokens, "
+              f"{usage['completion_tokens_per_second']} tokens/s")
+    
+    if outcome["profile"] is not None:
+        print_profile(task_id, outcome["profile"])
+
+def print_profile(task_id: str, report: Dict[str, Any]):
+    """Write a crew run's profile to the profiles directory and print its highlights.
+    
+    Args:
+        task_id: The ID of the task
+        report: The profile report of the run
+    """
+    os.makedirs("profiles", exist_ok=True)
+    json_path = os.path.join("profiles", f"{task_id}.json")
+    collapsed_path = os.path.join("profiles", f"{task_id}.collapsed")
+    with open(json_path, "w") as f:
+        json.dump(report, f, indent=2)
+    with open(collapsed_path, "w") as f:
+        f.write(report["collapsed_stacks"])
+    
+    print(f"\nProfile ({report['samples']} samples over {report['elapsed_seconds']}s):")
+    for entry in report["top_cumulative"][:10]:
+        print(f"- {entry['seconds']:>8.3f}s  {entry['function']}")
+    print("\nTop allocation sites:")
+    for entry in report["allocations"][:10]:
+        print(f"- {entry['size_bytes'] / 1024:>10.1f} KiB in {entry['count']} blocks  {entry['site']}")
+    if report["peak_traced_memory_bytes"] is not None:
+        print(f"\nPeak traced memory: {report['peak_traced_memory_bytes'] / (1024 * 1024):.1f} MiB")
+    print(f"Profile written to {json_path}; flame graph stacks to {collapsed_path}")
 
 # For web mode (import and run the FastAPI app)
 def run_web():
@@ -91,9 +127,10 @@ if __name__ == "__main__":
         
     parser = argparse.ArgumentParser(description="CrewAI Multi-Agent System")
     parser.add_argument("--cli", action="store_true", help="Run in CLI mode")
+    parser.add_argument("--profile", action="store_true", help="Profile the crew run (CLI mode)")
     args = parser.parse_args()
     
     if args.cli:
-        run_cli()
+        run_cli(profile=args.profile)
     else:
         run_web()
\ No newline at end of file
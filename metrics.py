@@ -0,0 +1,147 @@
+import bisect
+import threading
+from collections import namedtuple
+from typing import Callable, Dict, List, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+# A timed part of a crew run: kind is "crew", "agent", "tool" or "llm", agent
+# the role of the agent that was working, tool the tool name (tool spans) and
+# model the LLM model (agent and LLM spans)
+Span = namedtuple("Span", ["kind", "agent", "tool", "model", "seconds"])
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """Format a label set, optionally with an extra preformatted label."""
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """A Prometheus-style histogram with a fixed set of label names."""
+
+    def __init__(self, name: str, help: str, label_names: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Initialize the histogram.
+
+        Args:
+            name: The metric name
+            help: Description of the metric
+            label_names: Names of the labels
+            buckets: Upper bounds of the buckets, in increasing order
+        """
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = buckets
+        # Label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Record an observation. Callers hold the registry lock.
+
+        Args:
+            value: The observed value
+            *label_values: Values of the labels, in the order of label_names
+        """
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        """Render the histogram in the Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.label_names, label_values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Latency histograms of crew runs plus gauges read when rendering.
+
+    Spans are recorded from crew threads, so observations are serialized
+    with a lock.
+    """
+
+    def __init__(self):
+        """Initialize the registry with the crew span histograms."""
+        self._lock = threading.Lock()
+        self.crew_seconds = Histogram("crew_run_seconds", "Duration of crew runs")
+        self.agent_seconds = Histogram(
+            "crew_agent_task_seconds", "Duration of agent tasks", ("agent", "model")
+        )
+        self.tool_seconds = Histogram(
+            "crew_tool_call_seconds", "Duration of tool calls", ("agent", "tool")
+        )
+        self.llm_seconds = Histogram(
+            "crew_llm_call_seconds", "Duration of LLM calls", ("agent", "model")
+        )
+        self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def observe_span(self, span: Span) -> None:
+        """Record a span in the histogram for its kind.
+
+        Args:
+            span: The span to record
+        """
+        with self._lock:
+            if span.kind == "crew":
+                self.crew_seconds.observe(span.seconds)
+            elif span.kind == "agent":
+                self.agent_seconds.observe(span.seconds, span.agent or "", span.model or "")
+            elif span.kind == "tool":
+                self.tool_seconds.observe(span.seconds, span.agent or "", span.tool or "")
+            elif span.kind == "llm":
+                self.llm_seconds.observe(span.seconds, span.agent or "", span.model or "")
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> None:
+        """Register a gauge whose value is read when metrics are rendered.
+
+        Args:
+            name: The metric name
+            help: Description of the metric
+            read: Function returning the current value
+        """
+        self._gauges.append((name, help, read))
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics text
+        """
+        lines: List[str] = []
+        for name, help, read in self._gauges:
+            try:
+                value = float(read())
+            except Exception as e:
+                print(f"Error reading gauge {name}: {str(e)}")
+                continue
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value!r}"])
+        with self._lock:
+            for histogram in (self.crew_seconds, self.agent_seconds, self.tool_seconds, self.llm_seconds):
+                lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry; crew worker processes send their spans to the web process
+metrics = MetricsRegistry()
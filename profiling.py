@@ -0,0 +1,192 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Milliseconds between stack samples of a profiled crew
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", "10"))
+
+# Number of functions and allocation sites kept in a profile report
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "30"))
+
+# Frames kept per allocation traceback
+TRACEMALLOC_FRAMES = int(os.environ.get("TRACEMALLOC_FRAMES", "10"))
+
+# Backend for stored profiles ("json" or "postgres")
+PROFILE_STORAGE = os.environ.get("PROFILE_STORAGE", "json")
+
+# tracemalloc is process-wide, so overlapping profiled crews share it
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users: List["TaskProfiler"] = []
+
+
+def _start_tracemalloc(profiler: "TaskProfiler") -> None:
+    with _tracemalloc_lock:
+        if _tracemalloc_users:
+            # The peak can't be told apart for overlapping profiles
+            profiler.overlapped = True
+            for other in _tracemalloc_users:
+                other.overlapped = True
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            tracemalloc.reset_peak()
+        _tracemalloc_users.append(profiler)
+
+
+def _stop_tracemalloc(profiler: "TaskProfiler") -> None:
+    with _tracemalloc_lock:
+        _tracemalloc_users.remove(profiler)
+        if not _tracemalloc_users and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def _frame_label(frame: Any) -> str:
+    """Describe a frame's function as name (file:first line)."""
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+class TaskProfiler:
+    """Sampling profiler and allocation tracer for one crew run.
+
+    Used as a context manager around the run. A background thread samples
+    the stack of the thread that entered the context every sample interval;
+    tracemalloc records where memory was allocated. Nothing runs unless a
+    profiler is entered, so unprofiled tasks pay nothing.
+
+    tracemalloc traces the whole process, so the allocation sites include
+    other threads (in thread mode, other crews and the web server). The peak
+    is only reported when no other profile overlapped the run.
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS, top_n: int = PROFILE_TOP_N):
+        """Initialize the profiler.
+
+        Args:
+            interval_ms: Milliseconds between stack samples
+            top_n: Number of functions and allocation sites in the report
+        """
+        self.interval = max(0.001, interval_ms / 1000)
+        self.top_n = top_n
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._peak_memory = 0
+        self.overlapped = False
+
+    def __enter__(self) -> "TaskProfiler":
+        self._thread_id = threading.get_ident()
+        _start_tracemalloc(self)
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample, name="task-profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._stop.set()
+        self._sampler.join()
+        self._elapsed = time.perf_counter() - self._started
+        try:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            _stop_tracemalloc(self)
+
+    def _sample(self) -> None:
+        """Sampler thread loop."""
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            # Root first, as in collapsed-stack (flame graph) files
+            self._stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed_stacks(self) -> str:
+        """Get the samples in the collapsed-stack format used by flame graph tools.
+
+        Returns:
+            One "frame;frame;... count" line per distinct stack
+        """
+        return "\n".join(
+            f"{';'.join(stack)} {count}" for stack, count in self._stacks.most_common()
+        )
+
+    def report(self) -> Dict[str, Any]:
+        """Build the profile report after the run.
+
+        Returns:
+            Dictionary with the sampled time per function (own and
+            cumulative), the collapsed stacks, the top allocation sites of
+            the process and the peak traced memory (None if another profile
+            overlapped the run)
+        """
+        own: Counter = Counter()
+        cumulative: Counter = Counter()
+        for stack, count in self._stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                cumulative[label] += count
+
+        # Samples can be late when the profiled thread holds the GIL, so
+        # time is estimated from each function's share of the samples
+        seconds_per_sample = self._elapsed / self.samples if self.samples else 0.0
+
+        def top(counter: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"function": label, "samples": count, "seconds": round(count * seconds_per_sample, 3)}
+                for label, count in counter.most_common(self.top_n)
+            ]
+
+        allocations = []
+        if self._snapshot is not None:
+            snapshot = self._snapshot.filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            ])
+            for stat in snapshot.statistics("lineno")[:self.top_n]:
+                frame = stat.traceback[0]
+                allocations.append({
+                    "site": f"{frame.filename}:{frame.lineno}",
+                    "size_bytes": stat.size,
+                    "count": stat.count,
+                })
+
+        return {
+            "elapsed_seconds": round(self._elapsed, 3),
+            "sample_interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "top_own": top(own),
+            "top_cumulative": top(cumulative),
+            "collapsed_stacks": self.collapsed_stacks(),
+            "allocations": allocations,
+            "allocations_scope": "process",
+            "overlapping_profiles": self.overlapped,
+            "peak_traced_memory_bytes": None if self.overlapped else self._peak_memory,
+        }
+
+
+def create_profile_storage(async_: bool = False) -> Any:
+    """Create the storage that profiles are kept in, according to PROFILE_STORAGE.
+
+    Args:
+        async_: Create the async variant of the storage
+    """
+    from database import StorageFactory
+
+    if PROFILE_STORAGE.lower() == "postgres":
+        return StorageFactory.create_storage("postgres", async_=async_, table_name="task_profiles")
+    return StorageFactory.create_storage("json", async_=async_, storage_dir="uploads/json/profiles")
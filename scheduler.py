@@ -0,0 +1,222 @@
+import asyncio
+import functools
+import heapq
+import itertools
+import os
+import time
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class SchedulerQueueFull(Exception):
+    """Raised when a job is submitted while the scheduler queue is full."""
+
+
+class CrewScheduler:
+    """Bounded pool of crew workers fed from a priority queue.
+
+    Jobs are dequeued by priority (higher values first) and in submission
+    order within a priority level. To keep tail latency predictable, a
+    lower-priority job that has been passed over ``fairness_burst`` times in a
+    row is served before any further high-priority work.
+
+    Each worker owns one slot of the scheduler's executor, so at most
+    ``num_workers`` crews run at the same time regardless of how many tasks
+    are submitted. In ``"thread"`` mode the executor is a thread pool inside
+    the web process; in ``"process"`` mode it is a pool of worker processes,
+    which keeps CPU-heavy crew work off the web server's GIL. Functions run
+    in process mode must be picklable (module-level).
+    """
+
+    EXECUTION_MODES = ("thread", "process")
+
+    def __init__(self, num_workers: Optional[int] = None, max_queue_size: Optional[int] = None,
+                 fairness_burst: Optional[int] = None, execution_mode: Optional[str] = None,
+                 initializer: Optional[Callable[[], None]] = None):
+        """Initialize the scheduler.
+
+        Args:
+            num_workers: Number of concurrent crew workers (defaults to ``CREW_WORKERS`` or 2)
+            max_queue_size: Maximum number of queued jobs, 0 for unbounded
+                (defaults to ``CREW_QUEUE_SIZE`` or 0)
+            fairness_burst: Number of consecutive out-of-order dequeues before the
+                oldest waiting job is served (defaults to ``CREW_FAIRNESS_BURST`` or 4)
+            execution_mode: ``"thread"`` or ``"process"`` (defaults to
+                ``CREW_EXECUTION_MODE`` or ``"thread"``)
+            initializer: Optional function run once in each worker thread or process
+                before its first job
+        """
+        self.num_workers = num_workers or int(os.environ.get("CREW_WORKERS", "2"))
+        self.max_queue_size = max_queue_size if max_queue_size is not None else int(os.environ.get("CREW_QUEUE_SIZE", "0"))
+        self.fairness_burst = fairness_burst or int(os.environ.get("CREW_FAIRNESS_BURST", "4"))
+
+        self.execution_mode = (execution_mode or os.environ.get("CREW_EXECUTION_MODE", "thread")).lower()
+        if self.execution_mode not in self.EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {self.execution_mode}")
+
+        self._initializer = initializer
+        self._executor = self._create_executor()
+        self._heap: List[list] = []
+        self._entries: Dict[str, list] = {}
+        self._counter = itertools.count()
+        self._skipped = 0
+        self._active: Dict[str, float] = {}
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Condition] = None
+
+    def _create_executor(self) -> Executor:
+        """Create the executor that runs blocking crew work."""
+        if self.execution_mode == "process":
+            # Spawn rather than fork: the web process holds sockets and threads
+            return ProcessPoolExecutor(max_workers=self.num_workers,
+                                       mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=self._initializer)
+        return ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix="crew-worker",
+                                  initializer=self._initializer)
+
+    def start(self) -> None:
+        """Start the worker coroutines on the running event loop."""
+        if self._workers:
+            return
+        self._wakeup = asyncio.Condition()
+        for i in range(self.num_workers):
+            self._workers.append(asyncio.create_task(self._worker(i)))
+        print(f"Crew scheduler started with {self.num_workers} {self.execution_mode} workers")
+
+    async def shutdown(self) -> None:
+        """Stop the workers and release the executor."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, task_id: str, job: Callable[[], Awaitable[Any]], priority: int = 0) -> int:
+        """Queue a job for execution.
+
+        Args:
+            task_id: The ID of the task the job belongs to
+            job: Coroutine function to run once a worker is free
+            priority: Higher values are dequeued first
+
+        Returns:
+            The 1-based queue position of the job
+
+        Raises:
+            SchedulerQueueFull: If the queue already holds ``max_queue_size`` jobs
+        """
+        if self.max_queue_size and len(self._entries) >= self.max_queue_size:
+            raise SchedulerQueueFull(f"Crew queue is full ({self.max_queue_size} jobs waiting)")
+
+        # Entry layout: [-priority, sequence, task_id, job, enqueued_at]
+        entry = [-priority, next(self._counter), task_id, job, time.monotonic()]
+        heapq.heappush(self._heap, entry)
+        self._entries[task_id] = entry
+        async with self._wakeup:
+            self._wakeup.notify()
+        return self.position(task_id)
+
+    def cancel(self, task_id: str) -> bool:
+        """Remove a queued job before it starts.
+
+        Args:
+            task_id: The ID of the task to cancel
+
+        Returns:
+            True if the job was still queued, False otherwise
+        """
+        entry = self._entries.pop(task_id, None)
+        if entry is None:
+            return False
+        # Lazy deletion: the worker skips entries without a job
+        entry[3] = None
+        return True
+
+    def position(self, task_id: str) -> Optional[int]:
+        """Get the 1-based queue position of a waiting task.
+
+        The position follows priority order; the fairness rule can only move a
+        job forward, so this is an upper bound.
+
+        Args:
+            task_id: The ID of the task
+
+        Returns:
+            The queue position, or None if the task is not waiting
+        """
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return None
+        key = (entry[0], entry[1])
+        return 1 + sum(1 for other in self._entries.values() if (other[0], other[1]) < key)
+
+    def run_blocking(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Awaitable[Any]:
+        """Run a blocking function on the scheduler's executor.
+
+        Args:
+            func: The function to run
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            An awaitable resolving to the function's return value
+        """
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        """Get a snapshot of the scheduler state.
+
+        Returns:
+            Dictionary with worker, queue and active job counts
+        """
+        return {
+            "workers": self.num_workers,
+            "execution_mode": self.execution_mode,
+            "queued": len(self._entries),
+            "active": len(self._active),
+            "max_queue_size": self.max_queue_size,
+        }
+
+    def _pop_next(self) -> Optional[list]:
+        """Pop the next job to run, applying the fairness rule."""
+        while self._heap and self._heap[0][3] is None:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return None
+
+        oldest = min(self._entries.values(), key=lambda e: e[1])
+        if oldest is self._heap[0] or self._skipped < self.fairness_burst:
+            entry = heapq.heappop(self._heap)
+            self._skipped = 0 if oldest is entry else self._skipped + 1
+        else:
+            # The oldest job has waited long enough; serve it out of order
+            entry = oldest
+            self._heap.remove(entry)
+            heapq.heapify(self._heap)
+            self._skipped = 0
+
+        del self._entries[entry[2]]
+        return entry
+
+    async def _worker(self, worker_id: int) -> None:
+        """Worker loop that runs queued jobs one at a time."""
+        while True:
+            async with self._wakeup:
+                entry = self._pop_next()
+                while entry is None:
+                    await self._wakeup.wait()
+                    entry = self._pop_next()
+
+            _, _, task_id, job, enqueued_at = entry
+            self._active[task_id] = time.monotonic()
+            print(f"Worker {worker_id} picked up task {task_id} after {time.monotonic() - enqueued_at:.2f}s in queue")
+            try:
+                await job()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in crew worker {worker_id} for task {task_id}: {str(e)}")
+            finally:
+                self._active.pop(task_id, None)
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Prompts with more tokens than this are reported as large, e.g. to spot
+# agents whose context keeps growing
+PROMPT_TOKEN_WARNING = int(os.environ.get("PROMPT_TOKEN_WARNING", "6000"))
+
+# Tracker of the crew running in the current thread
+_active = threading.local()
+
+
+def _usage_value(usage: Any, name: str) -> int:
+    """Read a token count from a LiteLLM usage object or dictionary."""
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return int(value or 0)
+
+
+class TokenUsageTracker:
+    """Accumulates the token usage of one crew run, per model.
+
+    Use it as a context manager around the crew run; LLM calls made in the
+    same thread report their usage to it through a UsageRecorder.
+    """
+
+    def __init__(self, prompt_token_warning: int = PROMPT_TOKEN_WARNING):
+        """Initialize the tracker.
+
+        Args:
+            prompt_token_warning: Prompt size above which a call counts as a large prompt
+        """
+        self.prompt_token_warning = prompt_token_warning
+        self.models: Dict[str, Dict[str, Any]] = {}
+        self._previous: Optional["TokenUsageTracker"] = None
+
+    def __enter__(self) -> "TokenUsageTracker":
+        self._previous = getattr(_active, "tracker", None)
+        _active.tracker = self
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _active.tracker = self._previous
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, seconds: float) -> None:
+        """Record the usage of one LLM call.
+
+        Args:
+            model: The model that was called
+            prompt_tokens: Number of tokens in the prompt
+            completion_tokens: Number of generated tokens
+            seconds: Duration of the call
+        """
+        stats = self.models.get(model)
+        if stats is None:
+            stats = self.models[model] = {
+                "calls": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "max_prompt_tokens": 0,
+                "large_prompts": 0,
+                "llm_seconds": 0.0,
+            }
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], prompt_tokens)
+        stats["llm_seconds"] += seconds
+        if prompt_tokens > self.prompt_token_warning:
+            stats["large_prompts"] += 1
+            print(f"Large prompt for {model}: {prompt_tokens} tokens")
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarize the usage per model and in total.
+
+        Returns:
+            Dictionary with a "models" entry per model and a "total" entry,
+            each with call and token counts, LLM time and completion tokens
+            per second
+        """
+        models = {model: finalize_usage(dict(stats)) for model, stats in self.models.items()}
+        total: Dict[str, Any] = {}
+        for stats in self.models.values():
+            merge_usage(total, stats)
+        return {"models": models, "total": finalize_usage(total)}
+
+
+def merge_usage(total: Dict[str, Any], stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Add one set of usage counters to another.
+
+    Args:
+        total: The counters to add to; updated in place
+        stats: The counters to add
+
+    Returns:
+        The updated total
+    """
+    for key in ("calls", "prompt_tokens", "completion_tokens", "large_prompts", "llm_seconds"):
+        total[key] = total.get(key, 0) + stats.get(key, 0)
+    total["max_prompt_tokens"] = max(total.get("max_prompt_tokens", 0), stats.get("max_prompt_tokens", 0))
+    return total
+
+
+def finalize_usage(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Add derived totals and throughput to a set of usage counters.
+
+    Args:
+        stats: The counters; updated in place
+
+    Returns:
+        The updated counters
+    """
+    stats.setdefault("calls", 0)
+    stats["total_tokens"] = stats.get("prompt_tokens", 0) + stats.get("completion_tokens", 0)
+    seconds = stats.get("llm_seconds", 0.0)
+    stats["llm_seconds"] = round(seconds, 3)
+    stats["completion_tokens_per_second"] = (
+        round(stats.get("completion_tokens", 0) / seconds, 2) if seconds > 0 else None
+    )
+    return stats
+
+
+class UsageRecorder:
+    """LiteLLM-style callback that reports one LLM call's usage to the active tracker.
+
+    CrewAI passes the usage of a completed call to the ``log_success_event``
+    of the callbacks given to ``LLM.call``, in the calling thread.
+    """
+
+    def __init__(self, model: str):
+        """Initialize the recorder at the start of an LLM call.
+
+        Args:
+            model: The model being called
+        """
+        self.model = model
+        self.tracker: Optional[TokenUsageTracker] = getattr(_active, "tracker", None)
+        self.started = time.monotonic()
+
+    def log_success_event(self, kwargs: Any = None, response_obj: Any = None,
+                          start_time: Any = None, end_time: Any = None) -> None:
+        """Record the usage reported for the call."""
+        if self.tracker is None or not response_obj:
+            return
+        usage = response_obj.get("usage") if isinstance(response_obj, dict) else getattr(response_obj, "usage", None)
+        if usage is None:
+            return
+        self.tracker.record(
+            self.model,
+            _usage_value(usage, "prompt_tokens"),
+            _usage_value(usage, "completion_tokens"),
+            time.monotonic() - self.started,
+        )
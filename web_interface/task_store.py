@@ -0,0 +1,413 @@
+import asyncio
+import base64
+import bisect
+import itertools
+import os
+import sys
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import StorageFactory
+from interaction_log import InteractionLog
+
+# Fields kept in task summaries; large fields like the result are left out
+SUMMARY_FIELDS = ("id", "topic", "status", "created_at", "completed_at")
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can't be decoded."""
+
+
+def parse_timestamp(value: str) -> float:
+    """Parse a task timestamp or an ISO date/datetime into a POSIX timestamp.
+
+    Args:
+        value: The timestamp string
+
+    Returns:
+        Seconds since the epoch
+    """
+    return datetime.fromisoformat(value).timestamp()
+
+
+def encode_cursor(key: Tuple[float, int]) -> str:
+    """Encode an index key as an opaque cursor string."""
+    return base64.urlsafe_b64encode(f"{key[0]!r}:{key[1]}".encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Decode a cursor string produced by encode_cursor.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed
+    """
+    try:
+        created, seq = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":")
+        return float(created), int(seq)
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+
+
+def summarize(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Project a task onto its summary fields.
+
+    Args:
+        task: The task information
+
+    Returns:
+        The task summary
+    """
+    return {field: task.get(field) for field in SUMMARY_FIELDS}
+
+
+class TaskIndex:
+    """In-memory index of task summaries ordered by creation time.
+
+    Every task has a key of (created_at timestamp, insertion sequence). Keys
+    are kept in sorted lists, one for all tasks and one per status, so a
+    page of results costs O(log n + page size) regardless of how many tasks
+    have been created.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self._keys: List[Tuple[float, int]] = []
+        self._by_status: Dict[str, List[Tuple[float, int]]] = {}
+        self._ids: Dict[Tuple[float, int], str] = {}
+        self._key_of: Dict[str, Tuple[float, int]] = {}
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._key_of
+
+    def add(self, task: Dict[str, Any]) -> None:
+        """Add a task to the index.
+
+        Args:
+            task: The task information
+        """
+        task_id = task["id"]
+        if task_id in self._key_of:
+            self.update(task)
+            return
+        key = (parse_timestamp(task["created_at"]), next(self._seq))
+        self._key_of[task_id] = key
+        self._ids[key] = task_id
+        self._summaries[task_id] = summarize(task)
+        # Tasks normally arrive in creation order, so this is usually an append
+        bisect.insort(self._keys, key)
+        bisect.insort(self._by_status.setdefault(task["status"], []), key)
+
+    def update(self, task: Dict[str, Any]) -> None:
+        """Refresh the summary of an indexed task, e.g. after a status change.
+
+        Args:
+            task: The task information
+        """
+        task_id = task["id"]
+        if task_id not in self._key_of:
+            self.add(task)
+            return
+        key = self._key_of[task_id]
+        old_status = self._summaries[task_id]["status"]
+        self._summaries[task_id] = summarize(task)
+        if task["status"] != old_status:
+            self._remove_key(self._by_status[old_status], key)
+            bisect.insort(self._by_status.setdefault(task["status"], []), key)
+
+    def remove(self, task_id: str) -> None:
+        """Remove a task from the index.
+
+        Args:
+            task_id: The ID of the task
+        """
+        key = self._key_of.pop(task_id, None)
+        if key is None:
+            return
+        summary = self._summaries.pop(task_id)
+        del self._ids[key]
+        self._remove_key(self._keys, key)
+        self._remove_key(self._by_status[summary["status"]], key)
+
+    def summary(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get the summary of a task.
+
+        Args:
+            task_id: The ID of the task
+
+        Returns:
+            The task summary, or None if the task isn't indexed
+        """
+        return self._summaries.get(task_id)
+
+    def page(self, limit: int = 20, cursor: Optional[str] = None, status: Optional[str] = None,
+             created_after: Optional[str] = None, created_before: Optional[str] = None) -> Tuple[List[str], Optional[str]]:
+        """Get a page of task IDs, newest first.
+
+        Args:
+            limit: Maximum number of task IDs to return
+            cursor: Cursor returned with the previous page
+            status: Only return tasks with this status
+            created_after: Only return tasks created at or after this time
+            created_before: Only return tasks created before this time
+
+        Returns:
+            A tuple of the task IDs and the cursor for the next page (None on the last page)
+
+        Raises:
+            InvalidCursor: If the cursor can't be decoded
+        """
+        keys = self._keys if status is None else self._by_status.get(status, [])
+
+        # Position just past the newest key that may be returned
+        end = len(keys)
+        if created_before is not None:
+            end = bisect.bisect_left(keys, (parse_timestamp(created_before), -1))
+        if cursor is not None:
+            end = min(end, bisect.bisect_left(keys, decode_cursor(cursor)))
+
+        start = 0
+        if created_after is not None:
+            start = bisect.bisect_left(keys, (parse_timestamp(created_after), -1))
+
+        first = max(start, end - limit)
+        selected = keys[first:end][::-1]
+        next_cursor = encode_cursor(selected[-1]) if selected and first > start else None
+        return [self._ids[key] for key in selected], next_cursor
+
+    @staticmethod
+    def _remove_key(keys: List[Tuple[float, int]], key: Tuple[float, int]) -> None:
+        """Remove a key from a sorted key list."""
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+
+
+# Number of finished tasks kept in memory before older ones are moved to storage
+TASK_CACHE_SIZE = int(os.environ.get("TASK_CACHE_SIZE", "100"))
+
+# Backend finished tasks are moved to ("json" or "postgres")
+TASK_STORAGE = os.environ.get("TASK_STORAGE", "json")
+
+# Task statuses after which a task no longer changes
+FINISHED_STATUSES = ("completed", "error")
+
+# Stored tasks loaded per storage call when rebuilding the index
+RESTORE_BATCH_SIZE = 500
+
+
+def deep_sizeof(obj: Any, seen: Optional[set] = None) -> int:
+    """Approximate the memory used by an object and everything it contains.
+
+    Args:
+        obj: The object to measure
+        seen: IDs of objects already counted
+
+    Returns:
+        Size in bytes
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(type(obj), "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, slot, None), seen) for slot in type(obj).__slots__)
+    return size
+
+
+class TaskStateManager:
+    """Bounded in-memory task state backed by persistent storage.
+
+    Pending and processing tasks are always kept in memory, along with the
+    ``max_recent`` most recently finished or accessed tasks. Older finished
+    tasks and their agent interactions are moved to storage and loaded
+    back on demand. Summaries of all tasks stay in the index so listing
+    never touches storage.
+    """
+
+    def __init__(self, storage: Any = None, max_recent: int = TASK_CACHE_SIZE):
+        """Initialize the manager.
+
+        Args:
+            storage: Storage instance for evicted tasks; by default one is
+                created with StorageFactory according to TASK_STORAGE
+            max_recent: Number of finished tasks to keep in memory
+        """
+        if storage is None:
+            if TASK_STORAGE.lower() == "postgres":
+                storage = StorageFactory.create_storage("postgres", table_name="tasks")
+            else:
+                storage = StorageFactory.create_storage("json", storage_dir="uploads/json/tasks")
+        self.storage = storage
+        self.max_recent = max_recent
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.agent_interactions: Dict[str, InteractionLog] = {}
+        self.index = TaskIndex()
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+        self.evicted = 0
+        self.loaded = 0
+        self._evict_lock = asyncio.Lock()
+
+    def create(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Register a new task.
+
+        Args:
+            task: The task information
+
+        Returns:
+            The registered task
+        """
+        self.tasks[task["id"]] = task
+        self.agent_interactions[task["id"]] = InteractionLog()
+        self.index.add(task)
+        return task
+
+    def update(self, task_id: str, **changes: Any) -> Dict[str, Any]:
+        """Update fields of a resident task.
+
+        Args:
+            task_id: The ID of the task
+            **changes: Fields to set on the task
+
+        Returns:
+            The updated task
+        """
+        task = self.tasks[task_id]
+        task.update(changes)
+        self.index.update(task)
+        return task
+
+    async def finish(self, task_id: str, **changes: Any) -> Dict[str, Any]:
+        """Update a task that has finished and move old finished tasks to storage.
+
+        Args:
+            task_id: The ID of the task
+            **changes: Fields to set on the task, including its final status
+
+        Returns:
+            The updated task
+        """
+        task = self.update(task_id, **changes)
+        self._touch(task_id)
+        await self._evict_old()
+        return task
+
+    def remove(self, task_id: str) -> None:
+        """Forget a task entirely (e.g. one that was never queued).
+
+        Args:
+            task_id: The ID of the task
+        """
+        self.tasks.pop(task_id, None)
+        self.agent_interactions.pop(task_id, None)
+        self._recent.pop(task_id, None)
+        self.index.remove(task_id)
+
+    async def get(self, task_id: str, cache: bool = True) -> Optional[Dict[str, Any]]:
+        """Get a task, loading it from storage if it was evicted.
+
+        Args:
+            task_id: The ID of the task
+            cache: Keep a task loaded from storage in memory as a recent task
+
+        Returns:
+            The task, or None if it doesn't exist
+        """
+        task = self.tasks.get(task_id)
+        if task is not None:
+            if task_id in self._recent:
+                self._recent.move_to_end(task_id)
+            return task
+        if task_id not in self.index:
+            return None
+
+        record = await asyncio.to_thread(self.storage.load, task_id)
+        if record is None:
+            return None
+        self.loaded += 1
+        task = record["task"]
+        if cache:
+            self.tasks[task_id] = task
+            self.agent_interactions[task_id] = InteractionLog.from_dicts(record.get("interactions", []))
+            self._touch(task_id)
+            await self._evict_old()
+        return task
+
+    async def restore(self) -> int:
+        """Rebuild the index from tasks evicted by earlier runs.
+
+        Returns:
+            The number of tasks restored
+        """
+        task_ids = await asyncio.to_thread(self.storage.list_files)
+        missing = [task_id for task_id in task_ids if task_id not in self.index]
+        restored = 0
+        for start in range(0, len(missing), RESTORE_BATCH_SIZE):
+            records = await asyncio.to_thread(self.storage.load_many, missing[start:start + RESTORE_BATCH_SIZE])
+            for record in records.values():
+                if record and "task" in record:
+                    self.index.add(record["task"])
+                    restored += 1
+        return restored
+
+    def memory_footprint(self) -> Dict[str, Any]:
+        """Report how much task state is held in memory.
+
+        Returns:
+            Dictionary with counts and approximate sizes in bytes
+        """
+        return {
+            "resident_tasks": len(self.tasks),
+            "active_tasks": len(self.tasks) - len(self._recent),
+            "recent_tasks": len(self._recent),
+            "indexed_tasks": len(self.index),
+            "evicted_total": self.evicted,
+            "loaded_total": self.loaded,
+            "resident_interactions": sum(len(items) for items in self.agent_interactions.values()),
+            "tasks_bytes": deep_sizeof(self.tasks),
+            "interactions_bytes": deep_sizeof(self.agent_interactions),
+            "index_bytes": deep_sizeof(self.index.__dict__),
+        }
+
+    def _touch(self, task_id: str) -> None:
+        """Mark a finished task as the most recently used."""
+        self._recent[task_id] = None
+        self._recent.move_to_end(task_id)
+
+    async def _evict_old(self) -> None:
+        """Move the least recently used finished tasks to storage."""
+        async with self._evict_lock:
+            await self._evict_old_locked()
+
+    async def _evict_old_locked(self) -> None:
+        """Evict tasks while holding the eviction lock."""
+        while len(self._recent) > self.max_recent:
+            task_id = next(iter(self._recent))
+            task = self.tasks[task_id]
+            if task.get("status") not in FINISHED_STATUSES:
+                # Not finished after all; keep it resident as an active task
+                del self._recent[task_id]
+                continue
+            interactions = self.agent_interactions.get(task_id)
+            record = {"task": task, "interactions": interactions.to_dicts() if interactions is not None else []}
+            try:
+                await asyncio.to_thread(self.storage.save, record, task_id)
+            except Exception as e:
+                print(f"Error moving task {task_id} to storage: {str(e)}")
+                return
+            del self._recent[task_id]
+            self.tasks.pop(task_id, None)
+            self.agent_interactions.pop(task_id, None)
+            self.evicted += 1
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import os
+from typing import Any, Dict, List, Optional
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+
+from database.extraction_cache import DIGEST_SUFFIX
+
+# Size of the chunks read from an upload and written to disk
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Maximum size of a single uploaded file and of all files in one request, in megabytes
+MAX_UPLOAD_SIZE_MB = float(os.environ.get("MAX_UPLOAD_SIZE_MB", "200"))
+MAX_REQUEST_UPLOAD_MB = float(os.environ.get("MAX_REQUEST_UPLOAD_MB", "1000"))
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limits."""
+
+
+class UploadBudget:
+    """Running total of the bytes written by the uploads of one request.
+
+    Shared by the concurrent save_upload calls of a request, so the request
+    limit holds even when the client doesn't send file sizes up front.
+    """
+
+    def __init__(self, limit: int):
+        """Initialize the budget.
+
+        Args:
+            limit: Maximum number of bytes all uploads together may write
+        """
+        self.limit = limit
+        self.used = 0
+
+    def consume(self, size: int) -> None:
+        """Account for bytes about to be written.
+
+        Args:
+            size: Number of bytes
+
+        Raises:
+            UploadTooLarge: If the request would exceed the limit
+        """
+        self.used += size
+        if self.used > self.limit:
+            raise UploadTooLarge(f"Uploads exceed the {self.limit / (1024 * 1024):g} MB request limit")
+
+
+async def save_upload(upload: UploadFile, destination: str, max_size: int,
+                      chunk_size: int = UPLOAD_CHUNK_SIZE, budget: Optional[UploadBudget] = None) -> Dict[str, Any]:
+    """Stream an uploaded file to disk, hashing it on the way.
+
+    The file is written to a temporary ``.part`` file and renamed once it is
+    complete, so readers never see a partially written PDF.
+
+    Args:
+        upload: The uploaded file
+        destination: The path to save the file to
+        max_size: Maximum file size in bytes
+        chunk_size: Number of bytes to read and write at a time
+        budget: Optional running total shared with the other uploads of the request
+
+    Returns:
+        Dictionary with the file's name, path, size and SHA-256 digest
+
+    Raises:
+        UploadTooLarge: If the file is larger than ``max_size`` or the request
+            exceeds its budget
+    """
+    temp_path = f"{destination}.part"
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(
+                        f"File {upload.filename} exceeds the {max_size // (1024 * 1024)} MB upload limit"
+                    )
+                if budget is not None:
+                    budget.consume(len(chunk))
+                hasher.update(chunk)
+                await buffer.write(chunk)
+        await aiofiles.os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+        raise
+    finally:
+        await upload.close()
+
+    return {
+        "filename": upload.filename,
+        "path": destination,
+        "size": size,
+        "sha256": hasher.hexdigest(),
+    }
+
+
+async def save_pdf_uploads(uploads: List[UploadFile], directory: str, prefix: str) -> List[Dict[str, Any]]:
+    """Save all PDF uploads of a request concurrently.
+
+    Files with the same name are saved under distinct names, with a
+    counter added to all but the first. Each file's digest is written next
+    to it, so the extraction cache doesn't hash the file again.
+
+    Args:
+        uploads: The uploaded files; files without a .pdf extension are skipped
+        directory: The directory to save the files in
+        prefix: Prefix for the saved filenames (e.g. the task ID)
+
+    Returns:
+        One dictionary per saved file, as returned by save_upload
+
+    Raises:
+        UploadTooLarge: If a file or the request as a whole exceeds the size limits
+    """
+    pdf_uploads = [upload for upload in uploads if upload.filename and upload.filename.lower().endswith(".pdf")]
+
+    # Reject oversized requests up front when the sizes are known
+    known_total = sum(upload.size or 0 for upload in pdf_uploads)
+    if known_total > MAX_REQUEST_UPLOAD_MB * 1024 * 1024:
+        raise UploadTooLarge(f"Uploads exceed the {MAX_REQUEST_UPLOAD_MB:g} MB request limit")
+
+    # Sizes may be missing, so the request limit is also enforced while streaming
+    budget = UploadBudget(int(MAX_REQUEST_UPLOAD_MB * 1024 * 1024))
+    max_size = int(MAX_UPLOAD_SIZE_MB * 1024 * 1024)
+    saves = []
+    used_names = set()
+    for upload in pdf_uploads:
+        name = os.path.basename(upload.filename)
+        stem, extension = os.path.splitext(name)
+        count = 1
+        while name.lower() in used_names:
+            count += 1
+            name = f"{stem}_{count}{extension}"
+        used_names.add(name.lower())
+        saves.append(save_upload(upload, os.path.join(directory, f"{prefix}_{name}"), max_size, budget=budget))
+    results = await asyncio.gather(*saves, return_exceptions=True)
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        # Don't leave the rest of a failed request behind
+        for result in results:
+            if not isinstance(result, BaseException) and os.path.exists(result["path"]):
+                await aiofiles.os.remove(result["path"])
+        raise errors[0]
+
+    for result in results:
+        async with aiofiles.open(result["path"] + DIGEST_SUFFIX, "w") as digest_file:
+            await digest_file.write(result["sha256"])
+    return results
@@ -1,20 +1,32 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, File, UploadFile, Form, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, File, UploadFile, Form, Request, Query
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import os
 import uuid
 import asyncio
 import requests
-from typing import Dict, List, Set, Any, Optional
+from typing import Dict, List, Any, Optional, Set
 import json
 from datetime import datetime
 
 # Import crew setup
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from crew_setup import create_crew, run_crew
+from crew_setup import run_crew_job, warm_up_crew_templates, crew_templates, OLLAMA_API_BASE
+from agents.model_registry import model_registry
+from agents.base_agents import purge_stale_extractions
+from web_interface.uploads import save_pdf_uploads, UploadTooLarge
+from web_interface.task_store import TaskStateManager
+from callbacks import EventDispatcher, EventRelay
+from broadcaster import Broadcaster
+from interaction_log import InteractionLog
+from metrics import metrics
+from token_usage import finalize_usage, merge_usage
+from profiling import create_profile_storage
+from database.connection_pool import close_connection_pools
 from check_crewai_version import check_crewai_version
+from scheduler import CrewScheduler, SchedulerQueueFull
 
 # Check crewai version
 if not check_crewai_version():
@@ -26,7 +38,7 @@ app = FastAPI(title="CrewAI Multi-Agent System")
 
 # Check if Ollama server is running
 try:
-    response = requests.get("http://localhost:11434/api/tags")
+    response = requests.get(f"{OLLAMA_API_BASE}/api/tags")
     if response.status_code == 200:
         print("Ollama server is running. Available models:")
         models = response.json().get("models", [])
@@ -47,7 +59,7 @@ try:
     else:
         print("Ollama server is running but returned an unexpected response.")
 except requests.exceptions.ConnectionError:
-    print("Warning: Could not connect to Ollama server at http://localhost:11434.")
+    print(f"Warning: Could not connect to Ollama server at {OLLAMA_API_BASE}.")
     print("Make sure Ollama is running for the agents to work properly.")
 
 # Mount static files
@@ -56,15 +68,74 @@ app.mount("/static", StaticFiles(directory="web_interface/static"), name="static
 # Set up templates
 templates = Jinja2Templates(directory="web_interface/templates")
 
-# Store WebSocket connections and task information
-connections: Dict[str, Set[WebSocket]] = {}
-tasks: Dict[str, Dict] = {}
-agent_interactions: Dict[str, List[Dict]] = {}
+# WebSocket subscribers, each with its own outbound queue and writer task
+broadcaster = Broadcaster()
+
+# Number of interactions per message when replaying missed interactions
+WS_REPLAY_CHUNK = int(os.environ.get("WS_REPLAY_CHUNK", "500"))
+
+# Store task information. Only active and recently finished tasks are kept
+# in memory; older ones are moved to storage.
+task_state = TaskStateManager()
+agent_interactions: Dict[str, InteractionLog] = task_state.agent_interactions
+
+# Build the shared LLM clients and agent templates in each crew worker before
+# its first task; 0 builds them on first use instead
+CREW_WARM_UP = os.environ.get("CREW_WARM_UP", "1") != "0"
+
+# Bounded pool of crew workers; size is configured with CREW_WORKERS and
+# CREW_EXECUTION_MODE selects thread or process workers
+scheduler = CrewScheduler(initializer=warm_up_crew_templates if CREW_WARM_UP else None)
+
+# Profiles of tasks submitted with profiling enabled (async storage, used from handlers)
+profile_storage = create_profile_storage(async_=True)
+
+# Token usage per model of the tasks completed since the server started
+token_usage_totals: Dict[str, Dict[str, Any]] = {}
+
+# Gauges reported on /metrics next to the crew latency histograms
+metrics.gauge("crew_queue_depth", "Tasks waiting for a crew worker", lambda: scheduler.stats()["queued"])
+metrics.gauge("crew_active", "Crews currently running", lambda: scheduler.stats()["active"])
+metrics.gauge("crew_workers", "Size of the crew worker pool", lambda: scheduler.stats()["workers"])
+metrics.gauge("websocket_connections", "Connected WebSocket clients", lambda: broadcaster.count())
+
+# Records agent interactions and broadcasts them on the event loop
+dispatcher = EventDispatcher(broadcaster, agent_interactions)
+
+# Relays agent interactions from crew worker processes (process mode only)
+event_relay = EventRelay(dispatcher)
+
+# Tasks started at startup, referenced so they aren't garbage-collected while running
+background_tasks: Set[asyncio.Task] = set()
 
 # Create uploads directories if they don't exist
 os.makedirs("uploads/pdfs", exist_ok=True)
 os.makedirs("uploads/json", exist_ok=True)
 
+@app.on_event("startup")
+async def start_scheduler():
+    """Start the crew workers once the event loop is running."""
+    broadcaster.start()
+    dispatcher.start()
+    if scheduler.execution_mode == "process":
+        event_relay.start()
+    # Workers build the crew templates when they start (the scheduler's initializer)
+    scheduler.start()
+    # Re-index tasks stored by earlier runs and drop extractions the current
+    # model and prompts would never use
+    for coroutine in (task_state.restore(), asyncio.to_thread(purge_stale_extractions)):
+        background_task = asyncio.create_task(coroutine)
+        background_tasks.add(background_task)
+        background_task.add_done_callback(background_tasks.discard)
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    """Stop the crew workers and close pooled database connections."""
+    await scheduler.shutdown()
+    event_relay.stop()
+    await profile_storage.close()
+    close_connection_pools()
+
 # Routes
 @app.get("/", response_class=HTMLResponse)
 async def get_index(request: Request):
@@ -72,12 +143,15 @@ async def get_index(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.post("/submit-task")
-async def submit_task(topic: str = Form(...), files: List[UploadFile] = File([])):
+async def submit_task(topic: str = Form(...), files: List[UploadFile] = File([]), priority: int = Form(0),
+                      profile: bool = Form(False)):
     """Submit a task for processing.
     
     Args:
         topic: The topic to research
         files: Optional list of PDF files to process
+        priority: Scheduling priority; higher values are processed first
+        profile: Profile the crew run; the profile is available from /task/{task_id}/profile
         
     Returns:
         JSON response with task ID and status
@@ -85,29 +159,34 @@ async def submit_task(topic: str = Form(...), files: List[UploadFile] = File([])
     # Generate a task ID
     task_id = str(uuid.uuid4())
     
-    # Save uploaded files
-    pdf_paths = []
-    for file in files:
-        if file.filename.lower().endswith(".pdf"):
-            file_path = os.path.join("uploads/pdfs", f"{task_id}_{file.filename}")
-            with open(file_path, "wb") as buffer:
-                buffer.write(await file.read())
-            pdf_paths.append(file_path)
+    # Stream uploaded files to disk, hashing them on the way
+    try:
+        pdf_files = await save_pdf_uploads(files, "uploads/pdfs", task_id)
+    except UploadTooLarge as e:
+        return JSONResponse(status_code=413, content={"message": str(e)})
+    pdf_paths = [pdf_file["path"] for pdf_file in pdf_files]
     
     # Store task information
-    tasks[task_id] = {
+    task_state.create({
         "id": task_id,
         "topic": topic,
         "pdf_paths": pdf_paths,
+        "pdf_files": pdf_files,
         "status": "pending",
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        "result": None
-    }
+        "result": None,
+        "profile": "requested" if profile else None
+    })
     
-    # Start task processing in the background
-    asyncio.create_task(process_task(task_id, topic, pdf_paths))
+    # Queue the task for the crew workers
+    try:
+        position = await scheduler.submit(task_id, lambda: process_task(task_id, topic, pdf_paths, profile),
+                                         priority=priority)
+    except SchedulerQueueFull as e:
+        task_state.remove(task_id)
+        return JSONResponse(status_code=503, content={"message": str(e)})
     
-    return {"task_id": task_id, "status": "pending"}
+    return {"task_id": task_id, "status": "pending", "queue_position": position}
 
 @app.get("/task/{task_id}")
 async def get_task(task_id: str):
@@ -119,37 +198,128 @@ async def get_task(task_id: str):
     Returns:
         JSON response with task information
     """
-    if task_id in tasks:
-        return tasks[task_id]
+    task = await task_state.get(task_id)
+    if task is not None:
+        position = scheduler.position(task_id)
+        if position is not None:
+            return {**task, "queue_position": position}
+        return task
     return JSONResponse(status_code=404, content={"message": "Task not found"})
 
+@app.get("/task/{task_id}/profile")
+async def get_task_profile(task_id: str, format: str = Query("json", pattern="^(json|collapsed)$")):
+    """Download the profile of a task submitted with profile enabled.
+    
+    Args:
+        task_id: The ID of the task
+        format: "json" for the full report, or "collapsed" for the sampled
+            stacks in the collapsed-stack format read by flame graph tools
+        
+    Returns:
+        The profile as a file download
+    """
+    report = await profile_storage.load(task_id)
+    if report is None:
+        return JSONResponse(status_code=404, content={"message": "Profile not found"})
+    if format == "collapsed":
+        return PlainTextResponse(report["collapsed_stacks"], headers={
+            "Content-Disposition": f'attachment; filename="{task_id}.collapsed"'
+        })
+    return JSONResponse(content=report, headers={
+        "Content-Disposition": f'attachment; filename="{task_id}-profile.json"'
+    })
+
 @app.get("/tasks")
-async def get_tasks():
-    """Get all tasks.
+async def get_tasks(limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                    status: Optional[str] = None, created_after: Optional[str] = None,
+                    created_before: Optional[str] = None, full: bool = False):
+    """Get a page of tasks, newest first.
     
+    Args:
+        limit: Maximum number of tasks to return
+        cursor: The next_cursor value from the previous page
+        status: Only return tasks with this status
+        created_after: Only return tasks created at or after this ISO date/time
+        created_before: Only return tasks created before this ISO date/time
+        full: Return complete tasks instead of summaries without large fields
+        
     Returns:
-        JSON response with all tasks
+        JSON response with the tasks and the cursor for the next page
     """
-    return list(tasks.values())
+    try:
+        task_ids, next_cursor = task_state.index.page(limit, cursor, status, created_after, created_before)
+    except ValueError as e:
+        # InvalidCursor or an unparseable date
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    
+    if full:
+        # Don't let listing pull old tasks back into memory
+        page = [await task_state.get(task_id, cache=False) for task_id in task_ids]
+    else:
+        page = [task_state.index.summary(task_id) for task_id in task_ids]
+    return {"tasks": page, "next_cursor": next_cursor}
+
+@app.get("/stats")
+async def get_stats():
+    """Get runtime statistics.
+    
+    Model and crew template statistics describe the web process; in process
+    execution mode each crew worker process keeps its own.
+    
+    Returns:
+        JSON response with scheduler, task memory, model registry and crew template statistics
+    """
+    return {
+        "scheduler": scheduler.stats(),
+        "task_state": task_state.memory_footprint(),
+        "websockets": broadcaster.stats(),
+        "events": dispatcher.stats(),
+        "models": model_registry.stats(),
+        "crew_templates": crew_templates.stats(),
+        "token_usage": {model: finalize_usage(dict(usage)) for model, usage in token_usage_totals.items()},
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Expose crew latency histograms and queue gauges in the Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.websocket("/ws/{task_id}")
-async def websocket_endpoint(websocket: WebSocket, task_id: str):
+async def websocket_endpoint(websocket: WebSocket, task_id: str, last_seq: Optional[int] = Query(None)):
     """WebSocket endpoint for real-time updates.
     
     Args:
         websocket: The WebSocket connection
         task_id: The ID of the task
+        last_seq: Sequence number of the last interaction the client has seen;
+            when given, the interactions after it are replayed before live updates
     """
     await websocket.accept()
     
-    # Add connection to the task's connections
-    if task_id not in connections:
-        connections[task_id] = set()
-    connections[task_id].add(websocket)
+    # Load the task (and its interactions) before subscribing, so nothing
+    # published from here on is both replayed and sent live
+    task = await task_state.get(task_id)
+    
+    # Subscribe the connection to the task's messages
+    subscriber = broadcaster.subscribe(task_id, websocket)
     
     # Send task information if available
-    if task_id in tasks:
-        await websocket.send_json({"type": "task_info", "task": tasks[task_id]})
+    if task is not None:
+        subscriber.put({"type": "task_info", "task": task})
+    
+    # Replay the interactions the client missed
+    interactions = agent_interactions.get(task_id)
+    if last_seq is not None and interactions is not None:
+        missed_interactions, discarded = interactions.since(last_seq)
+        if discarded:
+            subscriber.put({"type": "interactions_discarded", "count": discarded})
+        for start in range(0, len(missed_interactions), WS_REPLAY_CHUNK):
+            chunk = missed_interactions[start:start + WS_REPLAY_CHUNK]
+            subscriber.put({
+                "type": "interactions_replay",
+                "interactions": [interaction.to_dict() for interaction in chunk],
+                "seq": chunk[-1].seq,
+            })
     
     try:
         # Keep the connection open
@@ -157,69 +327,80 @@ async def websocket_endpoint(websocket: WebSocket, task_id: str):
             # Wait for messages (not used for now, but required to keep the connection open)
             await websocket.receive_text()
     except WebSocketDisconnect:
+        pass
+    finally:
         # Remove connection when disconnected
-        if task_id in connections and websocket in connections[task_id]:
-            connections[task_id].remove(websocket)
+        broadcaster.unsubscribe(task_id, websocket)
 
-async def process_task(task_id: str, topic: str, pdf_paths: List[str]):
+async def process_task(task_id: str, topic: str, pdf_paths: List[str], profile: bool = False):
     """Process a task in the background.
     
     Args:
         task_id: The ID of the task
         topic: The topic to research
         pdf_paths: List of paths to PDF files to process
+        profile: Profile the crew run and store the profile
     """
     # Update task status
-    tasks[task_id]["status"] = "processing"
+    task_state.update(task_id, status="processing")
     
     try:
         # Initialize agent_interactions for this task
         if task_id not in agent_interactions:
-            agent_interactions[task_id] = []
+            agent_interactions[task_id] = InteractionLog()
         
-        # Create the crew
-        print(f"Creating crew for task {task_id} on topic: {topic}")
-        crew = create_crew(task_id, topic, pdf_paths)
-        print(f"Crew created with {len(crew.agents)} agents and {len(crew.tasks)} tasks")
+        # Create and run the crew on a scheduler worker to avoid blocking the event loop
+        if scheduler.execution_mode == "process":
+            event_relay.expect_end(task_id)
+            outcome = await scheduler.run_blocking(run_crew_job, task_id, topic, pdf_paths,
+                                                   event_queue=event_relay.queue, profile=profile)
+        else:
+            outcome = await scheduler.run_blocking(run_crew_job, task_id, topic, pdf_paths,
+                                                   dispatcher=dispatcher, profile=profile)
+        result = outcome["result"]
+        for model, usage in outcome["token_usage"]["models"].items():
+            merge_usage(token_usage_totals.setdefault(model, {}), usage)
         
-        # Run the crew in a separate thread to avoid blocking the event loop
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, lambda: run_crew(crew, task_id, connections, agent_interactions))
+        # Keep the profile out of the task itself; it's served by /task/{task_id}/profile
+        profile_status = None
+        if outcome.get("profile") is not None:
+            try:
+                await profile_storage.save(outcome["profile"], task_id)
+                profile_status = "available"
+            except Exception as e:
+                print(f"Error storing profile for task {task_id}: {str(e)}")
+                profile_status = "error"
         
-        # Update task status and result
-        tasks[task_id]["status"] = "completed"
-        tasks[task_id]["result"] = result
-        tasks[task_id]["completed_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Send any agent steps still relayed or held for batching before the final status
+        await event_relay.wait_for_end(task_id)
+        dispatcher.flush(task_id)
+        
+        # Update task status and result; older finished tasks may be moved to storage
+        await task_state.finish(task_id, status="completed", result=result,
+                                token_usage=outcome["token_usage"], profile=profile_status,
+                                completed_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         
         # Notify connected clients
-        if task_id in connections:
-            for connection in connections[task_id]:
-                try:
-                    await connection.send_json({
-                        "type": "task_completed",
-                        "task_id": task_id,
-                        "result": result
-                    })
-                except Exception as e:
-                    print(f"Error sending completion notification: {str(e)}")
+        broadcaster.publish(task_id, {
+            "type": "task_completed",
+            "task_id": task_id,
+            "result": result
+        })
     except Exception as e:
         error_message = f"Error processing task {task_id}: {str(e)}"
         print(error_message)
         import traceback
         print(traceback.format_exc())
         
+        await event_relay.wait_for_end(task_id)
+        dispatcher.flush(task_id)
+        
         # Update task status to error
-        tasks[task_id]["status"] = "error"
-        tasks[task_id]["error"] = error_message
+        await task_state.finish(task_id, status="error", error=error_message)
         
         # Notify connected clients of the error
-        if task_id in connections:
-            for connection in connections[task_id]:
-                try:
-                    await connection.send_json({
-                        "type": "task_error",
-                        "task_id": task_id,
-                        "error": error_message
-                    })
-                except Exception:
-                    pass
\ No newline at end of file
+        broadcaster.publish(task_id, {
+            "type": "task_error",
+            "task_id": task_id,
+            "error": error_message
+        })